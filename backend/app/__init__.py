@@ -4,11 +4,27 @@ from flask_sqlalchemy import SQLAlchemy
 from flask_migrate import Migrate
 from flask_login import LoginManager
 from flask_cors import CORS
+from app.cache import ResponseCache
+from app.metrics import Metrics
+from app.singleflight import SingleFlight
+from app.warmup import WarmupScheduler
+from app.model_registry import ModelRegistry
+from app.job_queue import JobQueue
+from app.admission import AdmissionControl
+from app.auth_tokens import TokenAuth
 
 db = SQLAlchemy()
 migrate = Migrate()
 login = LoginManager()
 login.login_view = 'login.login'
+cache = ResponseCache()
+metrics = Metrics()
+singleflight = SingleFlight()
+warmup = WarmupScheduler()
+model_registry = ModelRegistry()
+job_queue = JobQueue()
+admission = AdmissionControl()
+token_auth = TokenAuth()
 
 
 def create_app(config_class=Config):
@@ -19,6 +35,19 @@ def create_app(config_class=Config):
     db.init_app(app)
     migrate.init_app(app, db)
     login.init_app(app)
+    token_auth.init_app(app)
+    cache.init_app(app)
+    metrics.init_app(app)
+    singleflight.init_app(app)
+    model_registry.init_app(app)
+    job_queue.init_app(app)
+    admission.init_app(app)
+    metrics.register_collector('response_cache', cache.stats)
+    metrics.register_collector('singleflight', singleflight.stats)
+    metrics.register_collector('model_registry', model_registry.stats)
+    metrics.register_collector('jobs', job_queue.stats)
+    metrics.register_collector('admission', admission.stats)
+    metrics.register_collector('auth', token_auth.stats)
 
     # 注册蓝图
     from app.main import bp as main_bp
@@ -36,6 +65,13 @@ def create_app(config_class=Config):
     from app.predict_climate_variable import bp as predict_climate_variable_bp
     app.register_blueprint(predict_climate_variable_bp, url_prefix='/predict_climate_variable')
 
+    from app.jobs import bp as jobs_bp
+    app.register_blueprint(jobs_bp, url_prefix='/jobs')
+
+    # 背景預熱地圖快取
+    warmup.init_app(app)
+    metrics.register_collector('warmup', warmup.stats)
+
     return app
 
 from app import models
@@ -0,0 +1,194 @@
+"""
+准入控制 - 每個路由池的並行上限與有限長度的等待佇列
+
+尖峰時多出的請求最多等待 ADMISSION_QUEUE_TIMEOUT 秒；等待佇列已滿或等待逾時
+立即回傳 503 + Retry-After，不讓請求堆在 MySQL 上直到全部逾時。
+與 @cache.cached() 一起使用時放在內層：快取命中與合併等待的請求不佔名額，
+只有真正執行查詢的 leader 需要取得名額。
+快取預熱的請求優先權較低：不排隊，只在沒有人等待且保留一個名額給一般請求時才執行
+"""
+import threading
+import time
+from functools import wraps
+
+from flask import current_app, jsonify
+
+from app.warmup import is_warmup_request
+
+# 預設的路由池：名稱 -> (並行上限, 等待佇列長度)
+DEFAULT_POOLS = {
+    "map": (8, 32),         # /formap、/annual 等歷史地圖
+    "ndvi_map": (4, 16),    # NDVI 地圖與 bundle（掃描 NDVITemp）
+    "compute": (4, 8)       # 情境計算、批次預測
+}
+
+
+def parse_pools(value):
+    """解析 'map=8:32,ndvi_map=4:16'，回傳 {name: (limit, queue_size)}"""
+    pools = {}
+    for part in (value or '').split(','):
+        part = part.strip()
+        if not part:
+            continue
+        name, spec = part.split('=', 1)
+        limit, _, queue_size = spec.partition(':')
+        pools[name.strip()] = (int(limit), int(queue_size or 0))
+    return pools
+
+
+class AdmissionRejected(Exception):
+    """等待佇列已滿或等待逾時"""
+
+    def __init__(self, pool, reason):
+        super().__init__(f"Pool {pool!r} is overloaded ({reason})")
+        self.pool = pool
+        self.reason = reason
+
+
+class Pool:
+    """
+    並行上限 + 有限等待佇列
+    等待邏輯與 frontend/Rag_Chatbot/admission.py 的 ConcurrencyLimiter 刻意保持相同，修改時兩邊一起改
+    """
+
+    def __init__(self, name, limit, queue_size):
+        self.name = name
+        self.limit = limit
+        self.queue_size = queue_size
+        self.active = 0
+        self.waiting = 0
+        self.admitted = 0
+        self.queued = 0
+        self.rejected = 0
+        self.timed_out = 0
+        self.deferred = 0
+        self.peak_active = 0
+        self._cond = threading.Condition()
+
+    def acquire(self, timeout):
+        """取得名額，回傳等待秒數；無法取得時拋出 AdmissionRejected"""
+        started = time.monotonic()
+        with self._cond:
+            if self.active < self.limit and self.waiting == 0:
+                self._admit()
+                return 0.0
+            if self.waiting >= self.queue_size:
+                self.rejected += 1
+                raise AdmissionRejected(self.name, 'queue full')
+
+            self.waiting += 1
+            self.queued += 1
+            deadline = started + timeout
+            try:
+                while self.active >= self.limit:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self.timed_out += 1
+                        # 逾時的等待者可能剛好消耗了 release 的通知，轉交給下一個等待者，避免有空位卻沒有人被喚醒
+                        self._cond.notify()
+                        raise AdmissionRejected(self.name, 'queue timeout')
+                    self._cond.wait(remaining)
+            finally:
+                self.waiting -= 1
+            self._admit()
+        return time.monotonic() - started
+
+    def try_acquire_idle(self, reserve=1):
+        """低優先權取得（不等待）：沒有人在等待且保留 reserve 個名額後仍有空位時才取得"""
+        with self._cond:
+            if self.waiting == 0 and self.active < max(self.limit - reserve, 1):
+                self._admit()
+                return True
+            self.deferred += 1
+            return False
+
+    def _admit(self):
+        self.active += 1
+        self.admitted += 1
+        self.peak_active = max(self.peak_active, self.active)
+
+    def release(self):
+        with self._cond:
+            self.active -= 1
+            self._cond.notify()
+
+    def stats(self):
+        with self._cond:
+            return {
+                "limit": self.limit,
+                "queue_size": self.queue_size,
+                "active": self.active,
+                "waiting": self.waiting,
+                "peak_active": self.peak_active,
+                "admitted": self.admitted,
+                "queued": self.queued,
+                "rejected": self.rejected,
+                "timed_out": self.timed_out,
+                "deferred": self.deferred
+            }
+
+
+class AdmissionControl:
+    """依路由池限制並行請求數"""
+
+    def __init__(self, app=None):
+        self.enabled = True
+        self.queue_timeout = 2.0
+        self.retry_after = 2
+        self.pools = {name: Pool(name, *spec) for name, spec in DEFAULT_POOLS.items()}
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.enabled = app.config.get('ADMISSION_ENABLED', self.enabled)
+        self.queue_timeout = app.config.get('ADMISSION_QUEUE_TIMEOUT', self.queue_timeout)
+        self.retry_after = app.config.get('ADMISSION_RETRY_AFTER', self.retry_after)
+        specs = dict(DEFAULT_POOLS)
+        specs.update(parse_pools(app.config.get('ADMISSION_POOLS')))
+        self.pools = {name: Pool(name, *spec) for name, spec in specs.items()}
+        app.extensions['admission'] = self
+
+    def limit(self, pool_name):
+        """限制 view 的並行數；名額不足時回傳 503 + Retry-After"""
+        def decorator(view):
+            @wraps(view)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return view(*args, **kwargs)
+                pool = self.pools[pool_name]
+                metrics = current_app.extensions.get('metrics')
+                if is_warmup_request():
+                    if not pool.try_acquire_idle():
+                        return self._busy_response()
+                    try:
+                        return view(*args, **kwargs)
+                    finally:
+                        pool.release()
+                try:
+                    waited = pool.acquire(self.queue_timeout)
+                except AdmissionRejected as e:
+                    if metrics is not None:
+                        metrics.incr(f'admission.{pool_name}.{e.reason.replace(" ", "_")}')
+                    return self._busy_response()
+
+                if metrics is not None:
+                    metrics.observe(f'admission.{pool_name}.wait_ms', waited * 1000)
+                try:
+                    return view(*args, **kwargs)
+                finally:
+                    pool.release()
+            return wrapper
+        return decorator
+
+    def _busy_response(self):
+        response = jsonify({"error": "Server busy, please retry later 伺服器忙碌中，請稍後再試"})
+        response.status_code = 503
+        response.headers['Retry-After'] = str(self.retry_after)
+        return response
+
+    def stats(self):
+        return {
+            "enabled": self.enabled,
+            "queue_timeout": self.queue_timeout,
+            "pools": {name: pool.stats() for name, pool in self.pools.items()}
+        }
@@ -0,0 +1,136 @@
+"""
+API 身分驗證 - 簽章且會過期的 bearer token，以及 session 使用者的 TTL 快取
+
+token 以 SECRET_KEY 簽章並內含使用者 id 與名稱，驗證只需檢查簽章與時間，不查資料庫；
+session 登入的使用者由 load_user 取得，結果快取 AUTH_USER_CACHE_TTL 秒，
+因此已驗證的地圖請求不會每次都查 user 表
+"""
+import threading
+import time
+
+from flask_login import UserMixin
+from itsdangerous import BadSignature, SignatureExpired, URLSafeTimedSerializer
+
+TOKEN_SALT = 'api-token'
+
+
+class AuthUser(UserMixin):
+    """已驗證使用者的唯讀快照（不綁定資料庫 session）"""
+
+    def __init__(self, id, username, email=None):
+        self.id = id
+        self.username = username
+        self.email = email
+
+    @classmethod
+    def from_model(cls, user):
+        return cls(user.id, user.username, user.email)
+
+    def __repr__(self):
+        return '<AuthUser {}>'.format(self.username)
+
+
+class TokenAuth:
+    """bearer token 的發行與驗證，以及 load_user 的 TTL 快取"""
+
+    def __init__(self, app=None):
+        self.token_ttl = 3600
+        self.user_cache_ttl = 300
+        self._serializer = None
+        self._users = {}        # user_id -> (expires_at, AuthUser 或 None)
+        self._lock = threading.Lock()
+        self.issued = 0
+        self.verified = 0
+        self.expired = 0
+        self.invalid = 0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.token_ttl = app.config.get('AUTH_TOKEN_TTL', self.token_ttl)
+        self.user_cache_ttl = app.config.get('AUTH_USER_CACHE_TTL', self.user_cache_ttl)
+        self._serializer = URLSafeTimedSerializer(app.config['SECRET_KEY'], salt=TOKEN_SALT)
+        app.extensions['token_auth'] = self
+        app.login_manager.request_loader(self.load_from_request)
+
+    # ---------- bearer token ----------
+
+    def issue(self, user):
+        """回傳 (token, 有效秒數)"""
+        token = self._serializer.dumps({"uid": user.id, "name": user.username})
+        with self._lock:
+            self.issued += 1
+        return token, self.token_ttl
+
+    def verify(self, token):
+        """驗證簽章與有效期限；成功回傳 AuthUser，否則回傳 None"""
+        try:
+            claims = self._serializer.loads(token, max_age=self.token_ttl)
+        except SignatureExpired:
+            with self._lock:
+                self.expired += 1
+            return None
+        except BadSignature:
+            with self._lock:
+                self.invalid += 1
+            return None
+        with self._lock:
+            self.verified += 1
+        return AuthUser(claims["uid"], claims["name"])
+
+    def load_from_request(self, request):
+        """Flask-Login request_loader：讀取 Authorization: Bearer <token>"""
+        header = request.headers.get('Authorization', '')
+        scheme, _, token = header.partition(' ')
+        if scheme.lower() != 'bearer' or not token.strip():
+            return None
+        return self.verify(token.strip())
+
+    # ---------- session 使用者快取 ----------
+
+    def load_user(self, user_id, loader):
+        """
+        Flask-Login user_loader 的快取層
+        loader(user_id) 回傳 User 或 None；查無使用者的結果也會快取，避免重複查詢
+        """
+        now = time.monotonic()
+        with self._lock:
+            cached = self._users.get(user_id)
+            if cached is not None and cached[0] > now:
+                self.cache_hits += 1
+                return cached[1]
+            self.cache_misses += 1
+
+        user = loader(user_id)
+        snapshot = AuthUser.from_model(user) if user is not None else None
+        with self._lock:
+            self._users[user_id] = (now + self.user_cache_ttl, snapshot)
+            # 順便清除過期項目，避免快取無限成長
+            if len(self._users) > 1024:
+                self._users = {k: v for k, v in self._users.items() if v[0] > now}
+        return snapshot
+
+    def invalidate(self, user_id=None):
+        """使用者資料變更後清除快取（None 表示全部清除）"""
+        with self._lock:
+            if user_id is None:
+                self._users.clear()
+            else:
+                self._users.pop(user_id, None)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "token_ttl": self.token_ttl,
+                "issued": self.issued,
+                "verified": self.verified,
+                "expired": self.expired,
+                "invalid": self.invalid,
+                "user_cache": {
+                    "entries": len(self._users),
+                    "hits": self.cache_hits,
+                    "misses": self.cache_misses
+                }
+            }
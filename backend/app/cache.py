@@ -0,0 +1,207 @@
+"""
+回應快取 - 在寫入快取時一次產生 gzip / brotli 壓縮版本，
+之後依 Accept-Encoding 直接回傳，請求路徑上不再做任何壓縮
+"""
+import gzip
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+from flask import request, current_app, jsonify
+
+from app.singleflight import SingleFlightTimeout
+from app.warmup import is_warmup_request
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+class CachedBody:
+    """一筆快取內容：原始內容與各種預先壓縮的版本"""
+
+    def __init__(self, status, mimetype, identity, variants=None, headers=None):
+        self.status = status
+        self.mimetype = mimetype
+        self.identity = identity
+        self.variants = variants or {}  # encoding -> bytes
+        self.headers = headers or {}    # 不寫入快取的錯誤回應需保留的標頭（如 Retry-After）
+        self.created = time.monotonic()
+
+    def encodings(self):
+        """可提供的編碼，依偏好排序"""
+        return [enc for enc in ('br', 'gzip') if enc in self.variants] + ['identity']
+
+    def body_for(self, encoding):
+        if encoding == 'identity':
+            return self.identity
+        return self.variants[encoding]
+
+
+class ResponseCache:
+    """以 LRU + TTL 管理的程序內回應快取"""
+
+    def __init__(self, app=None):
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.max_entries = 512
+        self.ttl = 3600
+        self.min_size = 512
+        self.gzip_level = 9
+        self.brotli_quality = 11
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.max_entries = app.config.get('RESPONSE_CACHE_MAX_ENTRIES', self.max_entries)
+        self.ttl = app.config.get('RESPONSE_CACHE_TTL', self.ttl)
+        self.min_size = app.config.get('RESPONSE_CACHE_MIN_COMPRESS_SIZE', self.min_size)
+        self.gzip_level = app.config.get('RESPONSE_CACHE_GZIP_LEVEL', self.gzip_level)
+        self.brotli_quality = app.config.get('RESPONSE_CACHE_BROTLI_QUALITY', self.brotli_quality)
+        app.extensions['response_cache'] = self
+
+    # ---------- 快取存取 ----------
+
+    def get(self, key, touch=True):
+        """touch=False 時不更新 LRU 順序（預熱檢查用）"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if self.ttl and time.monotonic() - entry.created > self.ttl:
+                del self._entries[key]
+                return None
+            if touch:
+                self._entries.move_to_end(key)
+            return entry
+
+    def set(self, key, entry, cold=False):
+        """
+        cold=True（預熱）時放在 LRU 最舊的一端：容量不足時先淘汰預熱的內容，
+        不會把真實流量的快取擠出去；被請求命中後才移到最新的一端
+        """
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key, last=not cold)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def invalidate(self, endpoint, **view_args):
+        """移除指定端點中路由參數符合的快取，回傳移除筆數"""
+        with self._lock:
+            keys = [
+                key for key in self._entries
+                if key[0] == endpoint and all(
+                    dict(key[1]).get(name) == value for name, value in view_args.items()
+                )
+            ]
+            for key in keys:
+                del self._entries[key]
+        return len(keys)
+
+    def stats(self):
+        with self._lock:
+            entries = list(self._entries.values())
+        return {
+            "entries": len(entries),
+            "identity_bytes": sum(len(e.identity) for e in entries),
+            "compressed_bytes": {
+                enc: sum(len(e.variants[enc]) for e in entries if enc in e.variants)
+                for enc in ('gzip', 'br')
+            },
+            "brotli_available": brotli is not None
+        }
+
+    # ---------- 壓縮 ----------
+
+    def compress(self, status, mimetype, body):
+        """只在寫入快取時呼叫一次，產生所有壓縮版本"""
+        variants = {}
+        if len(body) >= self.min_size:
+            variants['gzip'] = gzip.compress(body, compresslevel=self.gzip_level, mtime=0)
+            if brotli is not None:
+                variants['br'] = brotli.compress(body, quality=self.brotli_quality)
+        return CachedBody(status, mimetype, body, variants)
+
+    @staticmethod
+    def make_key():
+        """以端點、路由參數與查詢字串組成快取鍵"""
+        view_args = tuple(sorted((request.view_args or {}).items()))
+        query = tuple(sorted(request.args.items(multi=True)))
+        return (request.endpoint, view_args, query)
+
+    @staticmethod
+    def choose_encoding(entry):
+        best = request.accept_encodings.best_match(entry.encodings())
+        return best or 'identity'
+
+    def build_response(self, entry, hit):
+        encoding = self.choose_encoding(entry)
+        response = current_app.response_class(
+            entry.body_for(encoding),
+            status=entry.status,
+            mimetype=entry.mimetype
+        )
+        response.headers.update(entry.headers)
+        if encoding != 'identity':
+            response.headers['Content-Encoding'] = encoding
+        if entry.variants:
+            response.vary.add('Accept-Encoding')
+        response.headers['X-Cache'] = 'HIT' if hit else 'MISS'
+        return response
+
+    # ---------- 裝飾器 ----------
+
+    def cached(self):
+        """
+        快取成功 (200) 的 JSON 回應；錯誤回應不寫入快取
+        快取未命中時以 single-flight 合併相同鍵的並行請求，只有一個請求會執行 view
+        """
+        def decorator(view):
+            @wraps(view)
+            def wrapper(*args, **kwargs):
+                key = self.make_key()
+                warmup = is_warmup_request()
+                entry = self.get(key, touch=not warmup)
+                if entry is not None:
+                    return self.build_response(entry, hit=True)
+
+                def render():
+                    # 可能在等待期間已由前一個 leader 寫入
+                    entry = self.get(key, touch=not warmup)
+                    if entry is not None:
+                        return entry
+                    response = current_app.make_response(view(*args, **kwargs))
+                    if response.status_code != 200 or response.direct_passthrough:
+                        headers = {
+                            name: response.headers[name] for name in ('Retry-After',) if name in response.headers
+                        }
+                        return CachedBody(response.status_code, response.mimetype, response.get_data(), headers=headers)
+                    entry = self.compress(response.status_code, response.mimetype, response.get_data())
+                    self.set(key, entry, cold=warmup)
+                    return entry
+
+                flights = current_app.extensions.get('singleflight')
+                if flights is None:
+                    return self.build_response(render(), hit=False)
+
+                try:
+                    # 非 200 計為錯誤；503（准入控制拒絕）只屬於 leader，followers 自行重試
+                    entry, leader = flights.do(key, render,
+                                               is_error=lambda e: e.status != 200,
+                                               shareable=lambda e: e.status != 503)
+                except SingleFlightTimeout:
+                    return jsonify({"error": "Timed out waiting for data 等待資料逾時"}), 504
+
+                response = self.build_response(entry, hit=False)
+                if not leader:
+                    response.headers['X-Cache'] = 'COALESCED'
+                return response
+            return wrapper
+        return decorator
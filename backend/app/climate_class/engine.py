@@ -0,0 +1,171 @@
+"""
+熱島分類引擎 - 由 HistoryData 一次向量化計算每個網格、每個月的區域類型
+
+每個 (年, 月) 內：
+  溫度距平 = 網格均溫 - 全區平均，並換算成全區百分位
+  日較差 (DTR) = 最高溫 - 最低溫，並換算成全區百分位
+  水體覆蓋率換算成全區百分位（不受單位影響）
+依序套用規則：Mountain → Coast → City → Suburb，其餘為 Other
+"""
+import threading
+import time
+
+import numpy as np
+
+from app import db, singleflight
+from app.dataset import dataset_version
+from app.models import HistoryData
+
+CLASSES = ["Other", "Mountain", "Coast", "City", "Suburb"]
+
+# 分類門檻（百分位 0-100，植被覆蓋率 0-1）
+MOUNTAIN_MAX_ANOMALY_PCT = 10
+COAST_MAX_DTR_PCT = 10
+COAST_MIN_WATER_PCT = 50
+CITY_MIN_ANOMALY_PCT = 85
+CITY_MAX_VEGETATION = 0.9
+SUBURB_MIN_DTR_PCT = 90
+
+_lock = threading.Lock()
+_result = {"value": None}
+
+
+def percentile_rank(values):
+    """
+    沿 axis=1 計算 0-100 的百分位排名，NaN 保持 NaN
+    相同的值取平均排名，同值的網格一定落在門檻的同一側
+    """
+    valid = ~np.isnan(values)
+    ranks = np.full(values.shape, np.nan)
+    for i, row in enumerate(values):
+        present = row[valid[i]]
+        ordered = np.sort(present)
+        # 同值區間 [left, right) 的平均排名
+        left = np.searchsorted(ordered, present, side='left')
+        right = np.searchsorted(ordered, present, side='right')
+        ranks[i, valid[i]] = (left + right - 1) / 2
+    n_valid = valid.sum(axis=1, keepdims=True)
+    return ranks / np.maximum(n_valid - 1, 1) * 100
+
+
+def classify(anomaly_pct, dtr_pct, vegetation, water, water_pct):
+    """所有陣列形狀相同，回傳類別索引（對應 CLASSES）"""
+    labels = np.zeros(anomaly_pct.shape, dtype=np.int8)
+    unassigned = ~np.isnan(anomaly_pct)
+
+    rules = [
+        ("Mountain", anomaly_pct <= MOUNTAIN_MAX_ANOMALY_PCT),
+        ("Coast", (dtr_pct <= COAST_MAX_DTR_PCT) & (water > 0) & (water_pct >= COAST_MIN_WATER_PCT)),
+        ("City", (anomaly_pct >= CITY_MIN_ANOMALY_PCT) & (vegetation <= CITY_MAX_VEGETATION)),
+        ("Suburb", dtr_pct >= SUBURB_MIN_DTR_PCT),
+    ]
+    for name, mask in rules:
+        hit = unassigned & mask
+        labels[hit] = CLASSES.index(name)
+        unassigned &= ~hit
+    return labels
+
+
+class Classification:
+    """所有期間的分類結果，陣列形狀皆為 (P, C)"""
+
+    def __init__(self, version, periods, cells, fields, labels, compute_seconds):
+        self.version = version
+        self.periods = periods      # [(year, month), ...]
+        self.cells = cells          # (C, 2)
+        self.fields = fields        # name -> (P, C)
+        self.labels = labels        # (P, C) 類別索引
+        self.compute_seconds = compute_seconds
+        self.period_index = {p: i for i, p in enumerate(periods)}
+        self.cell_index = {(int(c), int(r)): i for i, (c, r) in enumerate(cells)}
+
+    def info(self):
+        return {
+            "dataset_version": self.version,
+            "classes": CLASSES,
+            "cells": len(self.cells),
+            "periods": len(self.periods),
+            "compute_seconds": round(self.compute_seconds, 4)
+        }
+
+
+def compute(rows, version):
+    """rows: [(column_id, row_id, Year, Month, Temperature, High_Temp, Low_Temp, Vegetation, Water), ...]"""
+    started = time.perf_counter()
+    data = np.array(rows, dtype=np.float64)
+    cells, cell_idx = np.unique(data[:, 0:2], axis=0, return_inverse=True)
+    periods, period_idx = np.unique(data[:, 2:4], axis=0, return_inverse=True)
+    cell_idx, period_idx = cell_idx.reshape(-1), period_idx.reshape(-1)
+
+    P, C = len(periods), len(cells)
+    grid = np.full((5, P, C), np.nan)
+    grid[:, period_idx, cell_idx] = data[:, 4:9].T
+    temperature, high, low, vegetation, water = grid
+
+    with np.errstate(invalid='ignore'):
+        regional_mean = np.nanmean(temperature, axis=1, keepdims=True)
+    anomaly = temperature - regional_mean
+    dtr = high - low
+
+    anomaly_pct = percentile_rank(anomaly)
+    dtr_pct = percentile_rank(dtr)
+    # 缺少水體資料的網格不參與排名、也不會被分成 Coast；輸出時保持 NaN（null）
+    water_pct = percentile_rank(water)
+    labels = classify(
+        anomaly_pct,
+        np.nan_to_num(dtr_pct, nan=50.0),
+        np.nan_to_num(vegetation),
+        np.nan_to_num(water),
+        water_pct
+    )
+
+    return Classification(
+        version=version,
+        periods=[(int(y), int(m)) for y, m in periods],
+        cells=cells.astype(np.int64),
+        fields={
+            "temperature": temperature,
+            "anomaly": anomaly,
+            "anomaly_percentile": anomaly_pct,
+            "dtr": dtr,
+            "dtr_percentile": dtr_pct,
+            "vegetation": vegetation,
+            "water_body": water
+        },
+        labels=labels,
+        compute_seconds=time.perf_counter() - started
+    )
+
+
+def get_classification():
+    """取得目前資料集版本的分類結果；版本改變時重新計算（並行請求只計算一次）"""
+    version = dataset_version()
+    with _lock:
+        result = _result["value"]
+    if result is not None and result.version == version:
+        return result
+
+    def build():
+        rows = db.session.query(
+            HistoryData.column_id,
+            HistoryData.row_id,
+            HistoryData.Year,
+            HistoryData.Month,
+            HistoryData.Temperature,
+            HistoryData.High_Temp,
+            HistoryData.Low_Temp,
+            HistoryData.Vegetation_Coverage,
+            HistoryData.Water_Body_Coverage
+        ).filter(
+            HistoryData.Year.isnot(None),
+            HistoryData.Month.isnot(None)
+        ).all()
+        if not rows:
+            return None
+        computed = compute(rows, version)
+        with _lock:
+            _result["value"] = computed
+        return computed
+
+    result, _ = singleflight.do(('climate-class', version), build)
+    return result
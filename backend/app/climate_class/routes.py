@@ -1,7 +1,155 @@
-from flask import render_template
+import math
+
+import numpy as np
+from flask import render_template, jsonify
 from app.climate_class import bp
+from app.climate_class.engine import CLASSES, get_classification
+from app.singleflight import SingleFlightTimeout
+
+
+def _value(x):
+    return None if x is None or math.isnan(x) else round(float(x), 3)
+
+
+def _mean(values):
+    """忽略 NaN 的平均，沒有資料時為 None"""
+    values = values[~np.isnan(values)]
+    return _value(values.mean()) if values.size else None
+
 
 @bp.route('/')
 def index():
     # 介绍热岛效应和气候知识的页面
     return "这是气候课堂页面"
+
+
+@bp.route('/status', methods=['GET'])
+def status():
+    """分類結果狀態"""
+    try:
+        result = get_classification()
+        if result is None:
+            return jsonify({"error": "Data not found 查無資料"}), 404
+        return jsonify(result.info())
+    except SingleFlightTimeout:
+        return jsonify({"error": "Timed out waiting for classification 等待分類計算逾時"}), 504
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+@bp.route('/formap/<int:year>/<int:month>', methods=['GET'])
+def get_class_map(year, month):
+    """
+    全網格的區域類型，格式與 /formap 相同（值為類型名稱）
+    路由格式: /climate_class/formap/<year>/<month>
+    """
+    try:
+        result = get_classification()
+        if result is None or (year, month) not in result.period_index:
+            return jsonify({"error": "Data not found 查無資料"}), 404
+
+        p = result.period_index[(year, month)]
+        valid = ~np.isnan(result.fields["temperature"][p])
+
+        # 建立回應數據
+        payload = {}
+        for (column_id, row_id), label, ok in zip(result.cells, result.labels[p].tolist(), valid):
+            if not ok:
+                continue
+            col_key = str(column_id)
+            if col_key not in payload:
+                payload[col_key] = {}
+            payload[col_key][str(row_id)] = CLASSES[label]
+
+        return jsonify(payload)
+
+    except SingleFlightTimeout:
+        return jsonify({"error": "Timed out waiting for classification 等待分類計算逾時"}), 504
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+@bp.route('/cell/<int:year>/<string:colrow>', methods=['GET'])
+def get_cell_classes(year, colrow):
+    """
+    單一網格全年各月的類型與分類依據
+    路由格式: /climate_class/cell/<year>/<column_id>+<row_id>
+    """
+    try:
+        # 檢查 column_id+row_id 格式
+        if '+' not in colrow:
+            return jsonify({"error": "Invalid format, expected column_id+row_id 無效格式，請輸入column ID+row ID"}), 400
+
+        column_id_str, row_id_str = colrow.split('+', 1)
+        try:
+            column_id = int(column_id_str)
+            row_id = int(row_id_str)
+        except ValueError:
+            return jsonify({"error": "Invalid column_id or row_id format 無效的行列格式"}), 400
+
+        result = get_classification()
+        if result is None or (column_id, row_id) not in result.cell_index:
+            return jsonify({"error": "Data not found 查無資料"}), 404
+
+        c = result.cell_index[(column_id, row_id)]
+        payload = {}
+        for month in range(1, 13):
+            p = result.period_index.get((year, month))
+            if p is None or math.isnan(result.fields["temperature"][p, c]):
+                continue
+            payload[str(month)] = {
+                "type": CLASSES[result.labels[p, c]],
+                **{name: _value(values[p, c]) for name, values in result.fields.items()}
+            }
+
+        if not payload:
+            return jsonify({"error": "Data not found 查無資料"}), 404
+
+        return jsonify(payload)
+
+    except SingleFlightTimeout:
+        return jsonify({"error": "Timed out waiting for classification 等待分類計算逾時"}), 504
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+@bp.route('/summary/<int:year>/<int:month>', methods=['GET'])
+def get_class_summary(year, month):
+    """
+    各類型的網格數與平均值，以及熱島強度（City 與 Other 平均溫差）
+    路由格式: /climate_class/summary/<year>/<month>
+    """
+    try:
+        result = get_classification()
+        if result is None or (year, month) not in result.period_index:
+            return jsonify({"error": "Data not found 查無資料"}), 404
+
+        p = result.period_index[(year, month)]
+        labels = result.labels[p]
+        valid = ~np.isnan(result.fields["temperature"][p])
+
+        classes = {}
+        for k, name in enumerate(CLASSES):
+            mask = valid & (labels == k)
+            count = int(mask.sum())
+            classes[name] = {
+                "cells": count,
+                **{
+                    f"mean_{field}": _mean(result.fields[field][p][mask])
+                    for field in ("temperature", "anomaly", "dtr", "vegetation", "water_body")
+                }
+            }
+
+        city, other = classes["City"]["mean_temperature"], classes["Other"]["mean_temperature"]
+        return jsonify({
+            "year": year,
+            "month": month,
+            "cells": int(valid.sum()),
+            "classes": classes,
+            "heat_island_intensity": round(city - other, 3) if city is not None and other is not None else None
+        })
+
+    except SingleFlightTimeout:
+        return jsonify({"error": "Timed out waiting for classification 等待分類計算逾時"}), 504
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
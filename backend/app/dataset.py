@@ -0,0 +1,99 @@
+"""
+資料集版本 - 以各期間的 (筆數, 最大 id) 作為指紋，用來偵測資料匯入與快取失效
+
+指紋需要對整個資料表 GROUP BY；有背景執行緒定期更新時（WarmupScheduler），
+請求路徑只讀取快取的版本，不在請求中查詢
+"""
+import hashlib
+import threading
+import time
+
+from sqlalchemy import func
+
+from app import db
+from app.models import HistoryData, NDVITemp
+
+_lock = threading.Lock()
+_version = {"value": None, "checked": 0.0, "background": False}
+
+# 沒有背景更新時，版本檢查的最短間隔（秒），避免每個請求都查詢資料庫；也是背景更新的預設間隔
+VERSION_TTL = 30
+
+
+def period_fingerprints():
+    """
+    回傳各期間的指紋
+    {"history": {(year, month): (count, max_id)}, "ndvi": {month: (count, max_id)}}
+    需在 app context 中呼叫
+    """
+    history = db.session.query(
+        HistoryData.Year,
+        HistoryData.Month,
+        func.count(HistoryData.id),
+        func.max(HistoryData.id)
+    ).group_by(HistoryData.Year, HistoryData.Month).all()
+
+    ndvi = db.session.query(
+        NDVITemp.Month,
+        func.count(NDVITemp.id),
+        func.max(NDVITemp.id)
+    ).group_by(NDVITemp.Month).all()
+
+    return {
+        "history": {(y, m): (count, max_id) for y, m, count, max_id in history},
+        "ndvi": {m: (count, max_id) for m, count, max_id in ndvi}
+    }
+
+
+def fingerprint_version(fingerprints):
+    """將指紋轉成短版本字串"""
+    digest = hashlib.sha1()
+    for key in sorted(fingerprints["history"]):
+        digest.update(repr((key, fingerprints["history"][key])).encode())
+    digest.update(b'|')
+    for key in sorted(fingerprints["ndvi"]):
+        digest.update(repr((key, fingerprints["ndvi"][key])).encode())
+    return digest.hexdigest()[:16]
+
+
+def diff_fingerprints(old, new):
+    """比較兩份指紋，回傳有變動的 (history 期間, NDVI 月份)"""
+    history = {
+        key for key in set(old["history"]) | set(new["history"])
+        if old["history"].get(key) != new["history"].get(key)
+    }
+    ndvi = {
+        key for key in set(old["ndvi"]) | set(new["ndvi"])
+        if old["ndvi"].get(key) != new["ndvi"].get(key)
+    }
+    return sorted(history), sorted(ndvi)
+
+
+def dataset_version(max_age=VERSION_TTL):
+    """
+    目前資料集版本
+    有背景更新時直接回傳快取的值；否則（或尚未算出第一個版本時）最多每 max_age 秒重新查詢一次
+    """
+    now = time.monotonic()
+    with _lock:
+        if _version["value"] is not None and (_version["background"] or now - _version["checked"] < max_age):
+            return _version["value"]
+
+    value = fingerprint_version(period_fingerprints())
+    with _lock:
+        _version["value"] = value
+        _version["checked"] = now
+    return value
+
+
+def set_dataset_version(value):
+    """由已計算好的指紋直接更新版本（warm-up 輪詢時使用）"""
+    with _lock:
+        _version["value"] = value
+        _version["checked"] = time.monotonic()
+
+
+def set_background_refresh(enabled):
+    """背景執行緒開始 / 停止定期更新版本時呼叫"""
+    with _lock:
+        _version["background"] = enabled
@@ -0,0 +1,227 @@
+"""
+背景工作佇列 - 全區匯出、多年預測、大量情境掃描等耗時計算交給固定大小的執行緒池，
+請求端立即拿到 job ID（202），再以狀態 / 進度 / 結果端點查詢
+
+結果保存在記憶體中，完成後超過 JOB_RESULT_TTL 秒自動清除，
+已完成的工作超過 JOB_MAX_RETAINED 個時先清除最早完成的；
+取消為合作式：排隊中的工作直接取消，執行中的工作在下一次 check_cancelled() 時停止
+"""
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+QUEUED = 'queued'
+RUNNING = 'running'
+SUCCEEDED = 'succeeded'
+FAILED = 'failed'
+CANCELLED = 'cancelled'
+
+FINISHED = (SUCCEEDED, FAILED, CANCELLED)
+
+
+class JobQueueFull(Exception):
+    """排隊中的工作已達上限"""
+
+
+class JobCancelled(Exception):
+    """工作已被取消"""
+
+
+class Job:
+    """一個背景工作的狀態、進度與結果"""
+
+    def __init__(self, kind, params):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.params = params
+        self.status = QUEUED
+        self.progress = 0.0
+        self.message = None
+        self.result = None
+        self.error = None
+        self.created = time.time()
+        self.started = None
+        self.finished = None
+        self.future = None
+        self._cancel = threading.Event()
+
+    @property
+    def cancelled(self):
+        return self._cancel.is_set()
+
+    def check_cancelled(self):
+        """由工作函式在各階段之間呼叫，已取消時中止執行"""
+        if self._cancel.is_set():
+            raise JobCancelled(self.id)
+
+    def set_progress(self, done, total, message=None):
+        self.progress = round(min(max(done / total, 0.0), 1.0), 4) if total else 1.0
+        if message is not None:
+            self.message = message
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "kind": self.kind,
+            "status": self.status,
+            "progress": self.progress,
+            "message": self.message,
+            "error": self.error,
+            "params": self.params,
+            "created": self.created,
+            "started": self.started,
+            "finished": self.finished
+        }
+
+
+class JobQueue:
+    """固定大小的背景執行緒池與工作登記表"""
+
+    def __init__(self, app=None):
+        self.app = None
+        self.max_workers = 2
+        self.max_pending = 32
+        self.result_ttl = 3600
+        self.max_retained = 100
+        self._handlers = {}     # kind -> (fn(job, params), validate(params))
+        self._jobs = {}         # id -> Job
+        self._executor = None
+        self._lock = threading.Lock()
+        self.submitted = 0
+        self.rejected = 0
+        self.completed = {SUCCEEDED: 0, FAILED: 0, CANCELLED: 0}
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.max_workers = app.config.get('JOB_WORKERS', self.max_workers)
+        self.max_pending = app.config.get('JOB_MAX_PENDING', self.max_pending)
+        self.result_ttl = app.config.get('JOB_RESULT_TTL', self.result_ttl)
+        self.max_retained = app.config.get('JOB_MAX_RETAINED', self.max_retained)
+        app.extensions['job_queue'] = self
+
+    def task(self, kind, validate=None):
+        """
+        註冊工作類型
+        fn(job, params) 的回傳值即為結果（需可 JSON 序列化）；
+        validate(params) 在送出時檢查參數，回傳正規化後的參數或拋出 ValueError
+        """
+        def decorator(fn):
+            self._handlers[kind] = (fn, validate)
+            return fn
+        return decorator
+
+    @property
+    def kinds(self):
+        return sorted(self._handlers)
+
+    # ---------- 送出與查詢 ----------
+
+    def submit(self, kind, params=None):
+        """建立並排入工作；未知類型拋出 KeyError，參數無效拋出 ValueError，佇列已滿拋出 JobQueueFull"""
+        fn, validate = self._handlers[kind]
+        params = params or {}
+        if validate is not None:
+            params = validate(params)
+
+        job = Job(kind, params)
+        with self._lock:
+            self._purge()
+            pending = sum(1 for j in self._jobs.values() if j.status == QUEUED)
+            if pending >= self.max_pending:
+                self.rejected += 1
+                raise JobQueueFull(f"Job queue is full ({self.max_pending} pending) 工作佇列已滿")
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='job')
+            self._jobs[job.id] = job
+            self.submitted += 1
+            job.future = self._executor.submit(self._run, job, fn)
+        return job
+
+    def get(self, job_id):
+        """已過期或不存在時回傳 None"""
+        with self._lock:
+            self._purge()
+            return self._jobs.get(job_id)
+
+    def list(self, kind=None):
+        with self._lock:
+            self._purge()
+            jobs = [j for j in self._jobs.values() if kind is None or j.kind == kind]
+        return sorted(jobs, key=lambda j: j.created, reverse=True)
+
+    def cancel(self, job_id):
+        """要求取消；回傳工作（不存在時為 None）"""
+        job = self.get(job_id)
+        if job is None or job.status in FINISHED:
+            return job
+        job._cancel.set()
+        if job.future is not None and job.future.cancel():
+            # 尚未開始執行
+            self._finish(job, CANCELLED)
+        return job
+
+    # ---------- 執行 ----------
+
+    def _run(self, job, fn):
+        if job.cancelled:
+            self._finish(job, CANCELLED)
+            return
+        job.status = RUNNING
+        job.started = time.time()
+        try:
+            with self.app.app_context():
+                result = fn(job, job.params)
+            job.check_cancelled()
+            job.result = result
+            job.set_progress(1, 1)
+            self._finish(job, SUCCEEDED)
+        except JobCancelled:
+            self._finish(job, CANCELLED)
+        except Exception as e:
+            job.error = str(e)
+            self._finish(job, FAILED)
+
+        metrics = self.app.extensions.get('metrics')
+        if metrics is not None:
+            metrics.observe(f'jobs.{job.kind}.run_ms', (job.finished - job.started) * 1000)
+
+    def _finish(self, job, status):
+        with self._lock:
+            if job.status in FINISHED:
+                return
+            job.status = status
+            job.finished = time.time()
+            self.completed[status] += 1
+            self._purge()
+
+    def _purge(self):
+        """清除過期的已完成工作，並只保留最近 max_retained 個已完成工作（呼叫端需持有 _lock）"""
+        cutoff = time.time() - self.result_ttl
+        finished = sorted(
+            (job for job in self._jobs.values() if job.status in FINISHED),
+            key=lambda job: job.finished
+        )
+        excess = len(finished) - self.max_retained
+        for i, job in enumerate(finished):
+            if i < excess or job.finished < cutoff:
+                del self._jobs[job.id]
+
+    def stats(self):
+        with self._lock:
+            counts = {}
+            for job in self._jobs.values():
+                counts[job.status] = counts.get(job.status, 0) + 1
+            return {
+                "workers": self.max_workers,
+                "max_pending": self.max_pending,
+                "max_retained": self.max_retained,
+                "queued": counts.get(QUEUED, 0),
+                "running": counts.get(RUNNING, 0),
+                "retained": len(self._jobs),
+                "submitted": self.submitted,
+                "rejected": self.rejected,
+                "completed": dict(self.completed)
+            }
@@ -0,0 +1,106 @@
+from flask import jsonify, request, url_for
+from app import job_queue
+from app.jobs import bp
+from app.job_queue import JobQueueFull, SUCCEEDED, FAILED, CANCELLED
+
+
+def _job_payload(job):
+    payload = job.to_dict()
+    payload["status_url"] = url_for('jobs.get_job', job_id=job.id)
+    payload["result_url"] = url_for('jobs.get_job_result', job_id=job.id)
+    return payload
+
+
+@bp.route('/', methods=['GET'])
+def list_jobs():
+    """
+    目前保存中的工作與可用的工作類型
+    路由格式: /jobs/?kind=export
+    """
+    try:
+        jobs = job_queue.list(request.args.get('kind'))
+        return jsonify({
+            "kinds": job_queue.kinds,
+            "jobs": [_job_payload(job) for job in jobs]
+        })
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+@bp.route('/<string:kind>', methods=['POST'])
+def submit_job(kind):
+    """
+    送出背景工作，立即回傳 202 與 job ID
+    路由格式: POST /jobs/<kind>，參數放在 JSON body
+    例如: POST /jobs/export {"year": 2022, "types": ["Temperature"], "months": "1-12"}
+    """
+    try:
+        if kind not in job_queue.kinds:
+            return jsonify({
+                "error": f"Unknown job kind. Must be one of: {', '.join(job_queue.kinds)}"
+            }), 404
+
+        params = request.get_json(silent=True) or {}
+        if not isinstance(params, dict):
+            return jsonify({"error": "Invalid parameters, expected a JSON object 參數格式無效"}), 400
+
+        try:
+            job = job_queue.submit(kind, params)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        except JobQueueFull as e:
+            response = jsonify({"error": str(e)})
+            response.headers['Retry-After'] = '5'
+            return response, 503
+
+        response = jsonify(_job_payload(job))
+        response.headers['Location'] = url_for('jobs.get_job', job_id=job.id)
+        return response, 202
+
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+@bp.route('/<string:job_id>', methods=['GET'])
+def get_job(job_id):
+    """工作狀態與進度"""
+    try:
+        job = job_queue.get(job_id)
+        if job is None:
+            return jsonify({"error": "Job not found or expired 查無工作或已過期"}), 404
+        return jsonify(_job_payload(job))
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+@bp.route('/<string:job_id>/result', methods=['GET'])
+def get_job_result(job_id):
+    """
+    工作結果；尚未完成時回傳 202 與目前狀態
+    失敗回傳 500，已取消回傳 409
+    """
+    try:
+        job = job_queue.get(job_id)
+        if job is None:
+            return jsonify({"error": "Job not found or expired 查無工作或已過期"}), 404
+        if job.status == SUCCEEDED:
+            return jsonify(job.result)
+        if job.status == FAILED:
+            return jsonify({"error": job.error}), 500
+        if job.status == CANCELLED:
+            return jsonify({"error": "Job was cancelled 工作已取消"}), 409
+        return jsonify(_job_payload(job)), 202
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+@bp.route('/<string:job_id>', methods=['DELETE'])
+def cancel_job(job_id):
+    """取消工作：排隊中的工作立即取消，執行中的工作在下一個階段停止"""
+    try:
+        job = job_queue.cancel(job_id)
+        if job is None:
+            return jsonify({"error": "Job not found or expired 查無工作或已過期"}), 404
+        return jsonify(_job_payload(job)), 202
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
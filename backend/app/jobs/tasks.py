@@ -0,0 +1,220 @@
+"""
+背景工作類型：全區匯出、多年預測、植被覆蓋率情境掃描
+每個工作以月份 / 年份為單位分段執行，段與段之間回報進度並檢查取消
+"""
+import numpy as np
+
+from app import db, job_queue
+from app.models import HistoryData
+from app.main.routes import MAP_TYPES
+from app.main.params import MAX_BUNDLE_FRAMES, parse_types, parse_months, parse_coverages, round_value, round_list
+from app.main.scenario import SCENARIO_FIELDS, cell_keys, resolve_coverage, latest_year, baseline
+from app.predict_future_climate.engine import VARIABLES, get_model
+from app.predict_future_climate.routes import MAX_YEARS_AHEAD
+
+
+def _as_arg(value):
+    """參數可以是 list 或與 GET 相同的字串格式"""
+    if value is None or isinstance(value, str):
+        return value
+    if isinstance(value, (list, tuple)):
+        return ','.join(str(v) for v in value)
+    return str(value)
+
+
+def _int(params, name, default=None):
+    """整數參數：只接受 int 或剛好是整數的字串（不接受 bool、小數）"""
+    value = params.get(name, default)
+    if value is None:
+        raise ValueError(f"Missing {name} 缺少參數 {name}")
+    if isinstance(value, int) and not isinstance(value, bool):
+        return value
+    if isinstance(value, str) and value.strip().lstrip('+-').isdigit():
+        return int(value)
+    raise ValueError(f"Invalid {name} 參數 {name} 格式無效")
+
+
+# ---------- 全區匯出 ----------
+
+def _validate_export(params):
+    types = parse_types(_as_arg(params.get('types')), MAP_TYPES, "Temperature")
+    if types is None:
+        raise ValueError(f"Invalid temperature type. Must be one of: {', '.join(MAP_TYPES)}")
+    months = parse_months(_as_arg(params.get('months')))
+    if months is None:
+        raise ValueError("Invalid months, expected e.g. 1-12 or 1,4,7 月份格式無效")
+    if len(types) * len(months) > MAX_BUNDLE_FRAMES:
+        raise ValueError(f"Too many frames, at most {MAX_BUNDLE_FRAMES} per job 請求的圖層過多")
+    return {"year": _int(params, 'year'), "types": types, "months": months}
+
+
+@job_queue.task('export', validate=_validate_export)
+def export_maps(job, params):
+    """全區多月份、多溫度類型的地圖資料，格式與 /formap/bundle 相同"""
+    year, types, months = params["year"], params["types"], params["months"]
+    columns = [getattr(HistoryData, t) for t in types]
+
+    cells = {}
+    by_month = {}
+    for i, month in enumerate(months):
+        job.check_cancelled()
+        rows = db.session.query(
+            HistoryData.column_id,
+            HistoryData.row_id,
+            *columns
+        ).filter(
+            HistoryData.Year == year,
+            HistoryData.Month == month
+        ).all()
+        by_month[month] = {(row[0], row[1]): row[2:] for row in rows}
+        cells.update(dict.fromkeys(by_month[month]))
+        job.set_progress(i + 1, len(months), f"month {month}")
+
+    if not cells:
+        raise ValueError("Data not found 查無資料")
+
+    cells = sorted(cells)
+    frames = []
+    for t, type_name in enumerate(types):
+        for month in months:
+            found = by_month[month]
+            frames.append({
+                "type": type_name,
+                "year": year,
+                "month": month,
+                "values": [found[cell][t] if cell in found else None for cell in cells]
+            })
+
+    return {"cells": [[c, r] for c, r in cells], "frames": frames}
+
+
+# ---------- 多年預測 ----------
+
+def _validate_forecast(params):
+    types = parse_types(_as_arg(params.get('types')), VARIABLES, "Temperature")
+    if types is None:
+        raise ValueError(f"Invalid temperature type. Must be one of: {', '.join(VARIABLES)}")
+    months = parse_months(_as_arg(params.get('months')))
+    if months is None:
+        raise ValueError("Invalid months, expected e.g. 1-12 or 1,4,7 月份格式無效")
+    start_year = _int(params, 'start_year')
+    end_year = _int(params, 'end_year', start_year)
+    if end_year < start_year or end_year - start_year > MAX_YEARS_AHEAD:
+        raise ValueError(f"Year out of range, at most {MAX_YEARS_AHEAD} years ahead 年份超出範圍")
+    return {"start_year": start_year, "end_year": end_year, "types": types, "months": months}
+
+
+@job_queue.task('forecast', validate=_validate_forecast)
+def forecast_years(job, params):
+    """全區多年逐月預測，每年一次矩陣乘法"""
+    model = get_model()
+    if model is None:
+        raise ValueError("Data not found 查無資料")
+    if params["end_year"] > model.last_period[0] + MAX_YEARS_AHEAD:
+        raise ValueError(f"Year out of range, at most {MAX_YEARS_AHEAD} years ahead 年份超出範圍")
+
+    years = list(range(params["start_year"], params["end_year"] + 1))
+    type_index = [VARIABLES.index(t) for t in params["types"]]
+    frames = []
+    for i, year in enumerate(years):
+        job.check_cancelled()
+        values = model.predict([(year, m) for m in params["months"]])
+        for t, v in zip(params["types"], type_index):
+            rounded = round_list(values[:, :, v])
+            for j, month in enumerate(params["months"]):
+                frames.append({"type": t, "year": year, "month": month, "values": rounded[j]})
+        job.set_progress(i + 1, len(years), f"year {year}")
+
+    return {
+        "dataset_version": model.version,
+        "cells": model.cells.tolist(),
+        "frames": frames
+    }
+
+
+# ---------- 情境掃描 ----------
+
+def _validate_sweep(params):
+    months = parse_months(_as_arg(params.get('months')))
+    if months is None:
+        raise ValueError("Invalid months, expected e.g. 1-12 or 1,4,7 月份格式無效")
+    levels = parse_coverages(_as_arg(params.get('veg')))
+    if levels is None or any(not 0 <= level <= 1 for level in levels):
+        raise ValueError(f"Invalid vegetation coverage value, at most {MAX_BUNDLE_FRAMES} levels 植被覆蓋率格式無效")
+    method = params.get('method', 'interpolate')
+    if method not in ('interpolate', 'nearest'):
+        raise ValueError("Invalid method, expected interpolate or nearest 無效的查表方式")
+    year = params.get('year')
+    return {
+        "months": months,
+        "veg": levels,
+        "method": method,
+        "year": _int(params, 'year') if year is not None else None,
+        "include_cells": bool(params.get('include_cells', False))
+    }
+
+
+@job_queue.task('scenario_sweep', validate=_validate_sweep)
+def scenario_sweep(job, params):
+    """
+    全區所有網格套用同一植被覆蓋率，掃描多個覆蓋率與月份，回傳各覆蓋率相對基準的統計
+    每個月份只查一次 NDVITemp：所有 (覆蓋率, 網格) 組合一起向量化解析
+    """
+    names = list(SCENARIO_FIELDS.values())
+    levels = np.array(params["veg"], dtype=np.float64)
+    results = []
+    for i, month in enumerate(params["months"]):
+        job.check_cancelled()
+        year = params["year"] or latest_year(month)
+        rows = db.session.query(HistoryData.column_id, HistoryData.row_id).filter(
+            HistoryData.Year == year,
+            HistoryData.Month == month
+        ).all() if year else []
+        if not rows:
+            results.append({"month": month, "baseline_year": year, "cells": 0, "levels": []})
+            job.set_progress(i + 1, len(params["months"]), f"month {month}")
+            continue
+
+        cells = sorted({(c, r) for c, r in rows})
+        keys = cell_keys([c for c, _ in cells], [r for _, r in cells])
+        base_values, _, base_found = baseline(year, month, keys)
+
+        # (L * N) 組合一次解析
+        scenario_values, scenario_found = resolve_coverage(
+            month, np.tile(keys, len(levels)), np.repeat(levels, len(keys)), params["method"]
+        )
+        scenario_values = scenario_values.reshape(len(levels), len(keys), len(names))
+        scenario_found = scenario_found.reshape(len(levels), len(keys))
+        delta = scenario_values - base_values[None]
+
+        level_results = []
+        for l, level in enumerate(levels.tolist()):
+            both = scenario_found[l] & base_found
+            entry = {"vegetation": level, "cells": int(both.sum())}
+            if both.any():
+                entry.update({
+                    "mean_scenario": {name: round_value(scenario_values[l, both, k].mean()) for k, name in enumerate(names)},
+                    "mean_delta": {name: round_value(delta[l, both, k].mean()) for k, name in enumerate(names)},
+                    "min_delta": {name: round_value(delta[l, both, k].min()) for k, name in enumerate(names)},
+                    "max_delta": {name: round_value(delta[l, both, k].max()) for k, name in enumerate(names)}
+                })
+            if params["include_cells"]:
+                entry["delta"] = {name: round_list(delta[l, :, k]) for k, name in enumerate(names)}
+            level_results.append(entry)
+
+        month_result = {
+            "month": month,
+            "baseline_year": year,
+            "cells": len(cells),
+            "mean_baseline": {
+                name: round_value(base_values[base_found, k].mean()) if base_found.any() else None
+                for k, name in enumerate(names)
+            },
+            "levels": level_results
+        }
+        if params["include_cells"]:
+            month_result["cell_ids"] = [[c, r] for c, r in cells]
+        results.append(month_result)
+        job.set_progress(i + 1, len(params["months"]), f"month {month}")
+
+    return {"method": params["method"], "results": results}
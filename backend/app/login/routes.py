@@ -1,6 +1,6 @@
-from flask import render_template, flash, redirect, url_for, request
+from flask import render_template, flash, redirect, url_for, request, jsonify
 from flask_login import current_user, login_user, logout_user, login_required
-from app import db
+from app import db, token_auth
 from app.login import bp
 from app.login.forms import LoginForm, RegistrationForm
 from app.models import User
@@ -38,6 +38,43 @@ def register():
         user.set_password(form.password.data)
         db.session.add(user)
         db.session.commit()
+        token_auth.invalidate(user.id)
         flash('Congratulations, you are now a registered user!')
         return redirect(url_for('auth.login'))
     return render_template('login/register.html', title='Register', form=form)
+
+
+@bp.route('/token', methods=['POST'])
+def issue_token():
+    """
+    API 用戶端以帳號密碼換取 bearer token，之後以 Authorization: Bearer <token> 呼叫 API
+    請求格式: {"username": "...", "password": "..."}
+    """
+    try:
+        data = request.get_json(silent=True) or {}
+        username = data.get('username')
+        password = data.get('password')
+        if not username or not password:
+            return jsonify({"error": "Missing username or password 請輸入帳號與密碼"}), 400
+
+        user = User.query.filter_by(username=username).first()
+        if user is None or not user.check_password(password):
+            return jsonify({"error": "Invalid username or password 帳號或密碼錯誤"}), 401
+
+        token, expires_in = token_auth.issue(user)
+        return jsonify({
+            "access_token": token,
+            "token_type": "Bearer",
+            "expires_in": expires_in
+        })
+
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+@bp.route('/me', methods=['GET'])
+def me():
+    """目前的使用者（session 或 bearer token）"""
+    if not current_user.is_authenticated:
+        return jsonify({"error": "Authentication required 請先登入"}), 401
+    return jsonify({"id": current_user.id, "username": current_user.username})
@@ -0,0 +1,84 @@
+"""
+查詢參數解析與數值輸出 - bundle 路由與背景工作共用
+解析函式在展開成 list 之前先檢查範圍與個數，無效時回傳 None
+"""
+import math
+
+import numpy as np
+
+# 單次 bundle 請求（及每個背景工作）最多的 frame / 覆蓋率數
+MAX_BUNDLE_FRAMES = 120
+
+
+def round_value(x):
+    return None if np.isnan(x) else round(float(x), 3)
+
+
+def round_list(values):
+    """ndarray → 巢狀 list，NaN 轉成 None"""
+    rounded = np.round(values, 3).astype(object)
+    rounded[np.isnan(values)] = None
+    return rounded.tolist()
+
+
+def parse_types(arg, valid_types, default):
+    """解析以逗號分隔的溫度類型，無效時回傳 None"""
+    if not arg:
+        return [default]
+    types = [t.strip() for t in arg.split(',') if t.strip()]
+    if not types or any(t not in valid_types for t in types):
+        return None
+    return list(dict.fromkeys(types))
+
+
+def parse_months(arg):
+    """解析月份：'1-12' 或 '1,4,7'，無效時回傳 None（範圍先檢查再展開）"""
+    if not arg:
+        return list(range(1, 13))
+    months = set()
+    try:
+        for part in arg.split(','):
+            part = part.strip()
+            if '-' in part:
+                start, end = (int(x) for x in part.split('-', 1))
+                if not 1 <= start <= end <= 12:
+                    return None
+                months.update(range(start, end + 1))
+            elif part:
+                month = int(part)
+                if not 1 <= month <= 12:
+                    return None
+                months.add(month)
+    except (ValueError, OverflowError):
+        return None
+    if not months:
+        return None
+    return sorted(months)
+
+
+def parse_coverages(arg, max_levels=MAX_BUNDLE_FRAMES):
+    """
+    解析植被覆蓋率：'0,0.3,0.6' 或 'start:stop:step'（含 stop），無效時回傳 None
+    超過 max_levels 個覆蓋率也視為無效（展開前先算出個數）
+    """
+    if not arg:
+        return [round(i / 10, 2) for i in range(11)]
+    try:
+        if ':' in arg:
+            start, stop, step = (float(x) for x in arg.split(':', 2))
+            if not all(math.isfinite(x) for x in (start, stop, step)) or step <= 0 or stop < start:
+                return None
+            count = int(round((stop - start) / step)) + 1
+            if count > max_levels:
+                return None
+            levels = [round(start + i * step, 4) for i in range(count)]
+        else:
+            parts = [x for x in arg.split(',') if x.strip()]
+            if len(parts) > max_levels:
+                return None
+            levels = [float(x) for x in parts]
+    except (ValueError, OverflowError):
+        return None
+    if not levels or not all(math.isfinite(level) for level in levels):
+        return None
+    return list(dict.fromkeys(levels))
@@ -1,8 +1,34 @@
-from flask import render_template, jsonify
+from flask import render_template, jsonify, request
 from app.main import bp
-from app import db
+from app import db, cache, metrics, admission
 from app.models import HistoryData, NDVITemp, IndexTable
+from app.main.scenario import SCENARIO_FIELDS, cell_keys, resolve_coverage, latest_year, has_year, baseline
+from app.main.params import MAX_BUNDLE_FRAMES, parse_types, parse_months, parse_coverages, round_value, round_list
 from sqlalchemy import func
+import numpy as np
+
+# 地圖可用的溫度欄位
+MAP_TYPES = [
+    "Temperature",
+    "Low_Temp",
+    "High_Temp",
+    "Apparent_Temperature",
+    "Apparent_Temperature_High",
+    "Apparent_Temperature_Low"
+]
+
+NDVI_MAP_TYPES = [
+    "Temperature_Predicted",
+    "High_Temp_Predicted",
+    "Low_Temp_Predicted",
+    "Apparent_Temperature",
+    "Apparent_Temperature_High",
+    "Apparent_Temperature_Low"
+]
+
+# 單次 scenario 請求最多的網格數
+MAX_SCENARIO_CELLS = 20000
+
 
 @bp.route('/')
 @bp.route('/index')
@@ -10,7 +36,14 @@ def index():
     return render_template('index.html', title='主頁')
 
 
+@bp.route('/metrics', methods=['GET'])
+def get_metrics():
+    """程序內指標：快取、請求合併等"""
+    return jsonify(metrics.snapshot())
+
+
 @bp.route('/NDVI/<int:month>/<path:veg>/<string:colrow>', methods=['GET'])
+@admission.limit('ndvi_map')
 def get_ndvi_data(month, veg, colrow):
     try:
         # 檢查 vegetation_coverage 是否為有效的浮點數
@@ -114,6 +147,8 @@ def get_ndvi_data(month, veg, colrow):
 
 
 @bp.route('/annual/<string:weather_conditions>/<int:year>/<string:colrow>', methods=['GET'])
+@cache.cached()
+@admission.limit('map')
 def get_yearly_weather_data(weather_conditions, year, colrow):
     try:
         # 檢查天氣條件是否有效
@@ -154,6 +189,8 @@ def get_yearly_weather_data(weather_conditions, year, colrow):
         return jsonify({"error": str(e)}), 500
 
 @bp.route('/annual/temp/<int:year>/<string:colrow>', methods=['GET'])
+@cache.cached()
+@admission.limit('map')
 def get_yearly_temperature_data(year, colrow):
     try:
         # 檢查 column_id+row_id 格式
@@ -205,17 +242,12 @@ def get_yearly_temperature_data(year, colrow):
         return jsonify({"error": str(e)}), 500
 
 @bp.route('/formap/<string:type>/<int:year>/<int:month>', methods=['GET'])
+@cache.cached()
+@admission.limit('map')
 def get_temperature_map(type, year, month):
     try:
         # 檢查溫度類型是否有效
-        valid_types = [
-            "Temperature",
-            "Low_Temp",
-            "High_Temp",
-            "Apparent_Temperature",
-            "Apparent_Temperature_High",
-            "Apparent_Temperature_Low"
-        ]
+        valid_types = MAP_TYPES
         if type not in valid_types:
             return jsonify({
                 "error": f"Invalid temperature type. Must be one of: {', '.join(valid_types)}"
@@ -245,17 +277,12 @@ def get_temperature_map(type, year, month):
         return jsonify({"error": str(e)}), 500
 
 @bp.route('/formap/NDVI/<string:type>/<path:veg>/<int:month>', methods=['GET'])
+@cache.cached()
+@admission.limit('ndvi_map')
 def get_ndvi_temperature_map(type, veg, month):
     try:
         # 檢查溫度類型是否有效
-        valid_types = [
-            "Temperature_Predicted",
-            "High_Temp_Predicted",
-            "Low_Temp_Predicted",
-            "Apparent_Temperature",
-            "Apparent_Temperature_High",
-            "Apparent_Temperature_Low"
-        ]
+        valid_types = NDVI_MAP_TYPES
         if type not in valid_types:
             return jsonify({
                 "error": f"Invalid temperature type. Must be one of: {', '.join(valid_types)}"
@@ -313,7 +340,150 @@ def get_ndvi_temperature_map(type, veg, month):
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+
+@bp.route('/formap/bundle/<int:year>', methods=['GET'])
+@cache.cached()
+@admission.limit('map')
+def get_temperature_map_bundle(year):
+    """
+    一次回傳多個地圖 frame（多個月份 × 多個溫度類型），只掃描一次 HistoryData
+    路由格式: /formap/bundle/<year>?types=Temperature,High_Temp&months=1-12
+    回應格式: {"cells": [[column_id, row_id], ...], "frames": [{"type", "month", "values": [...]}]}
+    """
+    try:
+        types = parse_types(request.args.get('types'), MAP_TYPES, "Temperature")
+        if types is None:
+            return jsonify({
+                "error": f"Invalid temperature type. Must be one of: {', '.join(MAP_TYPES)}"
+            }), 400
+
+        months = parse_months(request.args.get('months'))
+        if months is None:
+            return jsonify({"error": "Invalid months, expected e.g. 1-12 or 1,4,7 月份格式無效"}), 400
+
+        if len(types) * len(months) > MAX_BUNDLE_FRAMES:
+            return jsonify({"error": f"Too many frames, at most {MAX_BUNDLE_FRAMES} per request 請求的圖層過多"}), 400
+
+        # 只選需要的欄位，一次查出所有月份
+        columns = [getattr(HistoryData, t) for t in types]
+        rows = db.session.query(
+            HistoryData.column_id,
+            HistoryData.row_id,
+            HistoryData.Month,
+            *columns
+        ).filter(
+            HistoryData.Year == year,
+            HistoryData.Month.in_(months)
+        ).order_by(HistoryData.column_id, HistoryData.row_id).all()
+
+        if not rows:
+            return jsonify({"error": "Data not found 查無資料"}), 404
+
+        # 共用的網格順序
+        cells = sorted({(row[0], row[1]) for row in rows})
+        cell_index = {cell: i for i, cell in enumerate(cells)}
+        month_index = {m: i for i, m in enumerate(months)}
+
+        values = [[[None] * len(cells) for _ in months] for _ in types]
+        for row in rows:
+            i = cell_index[(row[0], row[1])]
+            j = month_index[row[2]]
+            for t in range(len(types)):
+                values[t][j][i] = row[3 + t]
+
+        frames = []
+        for t, type_name in enumerate(types):
+            for j, month in enumerate(months):
+                frames.append({
+                    "type": type_name,
+                    "year": year,
+                    "month": month,
+                    "values": values[t][j]
+                })
+
+        return jsonify({
+            "cells": [[c, r] for c, r in cells],
+            "frames": frames
+        })
+
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+@bp.route('/formap/NDVI/bundle/<int:month>', methods=['GET'])
+@cache.cached()
+@admission.limit('ndvi_map')
+def get_ndvi_temperature_map_bundle(month):
+    """
+    一次回傳多個植被覆蓋率（及多個溫度類型）的地圖 frame，只掃描一次 NDVITemp
+    每個網格取最接近的植被覆蓋率，規則與 /formap/NDVI 相同
+    路由格式: /formap/NDVI/bundle/<month>?types=Temperature_Predicted&veg=0:1:0.1
+    """
+    try:
+        types = parse_types(request.args.get('types'), NDVI_MAP_TYPES, "Temperature_Predicted")
+        if types is None:
+            return jsonify({
+                "error": f"Invalid temperature type. Must be one of: {', '.join(NDVI_MAP_TYPES)}"
+            }), 400
+
+        levels = parse_coverages(request.args.get('veg'))
+        if levels is None:
+            return jsonify({"error": "Invalid vegetation coverage value 植被覆蓋率格式無效"}), 400
+
+        if len(types) * len(levels) > MAX_BUNDLE_FRAMES:
+            return jsonify({"error": f"Too many frames, at most {MAX_BUNDLE_FRAMES} per request 請求的圖層過多"}), 400
+
+        columns = [getattr(NDVITemp, t) for t in types]
+        rows = db.session.query(
+            NDVITemp.column_id,
+            NDVITemp.row_id,
+            NDVITemp.Vegetation_Coverage,
+            *columns
+        ).filter(
+            NDVITemp.Month == month
+        ).order_by(NDVITemp.column_id, NDVITemp.row_id, NDVITemp.id).all()
+
+        if not rows:
+            return jsonify({"error": "Data not found 查無資料"}), 404
+
+        # 依網格分組
+        grouped = {}
+        for row in rows:
+            if row[2] is None:
+                continue
+            grouped.setdefault((row[0], row[1]), []).append(row)
+
+        cells = sorted(grouped)
+        values = [[[None] * len(cells) for _ in levels] for _ in types]
+        for i, cell in enumerate(cells):
+            candidates = grouped[cell]
+            for j, level in enumerate(levels):
+                # 最接近的植被覆蓋率（完全相同時差值為 0）
+                record = min(candidates, key=lambda row: abs(row[2] - level))
+                for t in range(len(types)):
+                    values[t][j][i] = record[3 + t]
+
+        frames = []
+        for t, type_name in enumerate(types):
+            for j, level in enumerate(levels):
+                frames.append({
+                    "type": type_name,
+                    "month": month,
+                    "vegetation": level,
+                    "values": values[t][j]
+                })
+
+        return jsonify({
+            "cells": [[c, r] for c, r in cells],
+            "frames": frames
+        })
+
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
 @bp.route('/data/<int:year>/<int:month>/<string:colrow>', methods=['GET'])
+@admission.limit('map')
 def get_data(year, month, colrow):
     try:
         # 固定使用 HistoryData
@@ -402,6 +572,8 @@ def get_data(year, month, colrow):
 
 
 @bp.route('/NDVIbymonth/<path:veg>/<string:colrow>', methods=['GET'])
+@cache.cached()
+@admission.limit('ndvi_map')
 def get_ndvi_yearly_data(veg, colrow):
     """
     獲取指定植被覆蓋率和位置的全年溫度數據
@@ -473,6 +645,8 @@ def get_ndvi_yearly_data(veg, colrow):
 
 
 @bp.route('/NDVIbycoverage/<int:month>/<string:colrow>', methods=['GET'])
+@cache.cached()
+@admission.limit('ndvi_map')
 def get_ndvi_vegetation_data(month, colrow):
     """
     獲取指定月份和位置的不同植被覆蓋率溫度數據
@@ -515,4 +689,115 @@ def get_ndvi_vegetation_data(month, colrow):
         return jsonify(result)
 
     except Exception as e:
-        return jsonify({"error": str(e)}), 500
\ No newline at end of file
+        return jsonify({"error": str(e)}), 500
+
+@bp.route('/scenario', methods=['POST'])
+@admission.limit('compute')
+def run_scenario():
+    """
+    批次假設情境：多個網格的植被覆蓋率覆寫，一次解析到 NDVITemp 並與 HistoryData 基準比較
+    請求格式:
+    {
+        "months": [7],                     # 或 "month": 7
+        "year": 2022,                      # 基準年份，預設為該月份最新的年份
+        "overrides": [{"column_id": 1, "row_id": 2, "vegetation": 0.6}],
+        "cells": [[1, 2], [1, 3]], "vegetation": 0.6,   # 或同一覆蓋率套用到多個網格
+        "method": "interpolate"            # 或 "nearest"
+    }
+    """
+    try:
+        data = request.get_json(silent=True) or {}
+
+        months = data.get('months') or ([data['month']] if data.get('month') is not None else [])
+        if not isinstance(months, list) or not months or \
+                any(not isinstance(m, int) or isinstance(m, bool) or not 1 <= m <= 12 for m in months):
+            return jsonify({"error": "Invalid months 月份格式無效"}), 400
+        months = sorted(set(months))
+
+        method = data.get('method', 'interpolate')
+        if method not in ('interpolate', 'nearest'):
+            return jsonify({"error": "Invalid method, expected interpolate or nearest 無效的查表方式"}), 400
+
+        year = data.get('year')
+        if year is not None:
+            if not isinstance(year, int) or isinstance(year, bool):
+                return jsonify({"error": "Invalid year 年份格式無效"}), 400
+            if not has_year(year, months):
+                return jsonify({"error": f"No baseline data for year {year} 查無該年份的基準資料"}), 400
+
+        # 解析網格與覆蓋率
+        try:
+            if data.get('overrides') is not None:
+                overrides = data['overrides']
+                column_ids = [int(o['column_id']) for o in overrides]
+                row_ids = [int(o['row_id']) for o in overrides]
+                coverages = [float(o['vegetation']) for o in overrides]
+            else:
+                cells = data.get('cells') or []
+                column_ids = [int(c) for c, _ in cells]
+                row_ids = [int(r) for _, r in cells]
+                coverages = [float(data['vegetation'])] * len(cells)
+        except (KeyError, TypeError, ValueError):
+            return jsonify({"error": "Invalid overrides format 覆寫格式無效"}), 400
+
+        if not column_ids:
+            return jsonify({"error": "No cells given 請提供網格"}), 400
+        if len(column_ids) > MAX_SCENARIO_CELLS:
+            return jsonify({"error": f"Too many cells, at most {MAX_SCENARIO_CELLS} 網格數過多"}), 400
+        coverages = np.array(coverages, dtype=np.float64)
+        if np.isnan(coverages).any() or (coverages < 0).any() or (coverages > 1).any():
+            return jsonify({"error": "Invalid vegetation coverage value 植被覆蓋率格式無效"}), 400
+
+        keys = cell_keys(column_ids, row_ids)
+        names = list(SCENARIO_FIELDS.values())
+
+        results = []
+        for month in months:
+            year = data.get('year') or latest_year(month)
+            scenario_values, scenario_found = resolve_coverage(month, keys, coverages, method)
+            base_values, base_vegetation, base_found = baseline(year, month, keys) if year else (
+                np.full_like(scenario_values, np.nan), np.full(len(keys), np.nan), np.zeros(len(keys), dtype=bool)
+            )
+            delta = scenario_values - base_values
+            both = scenario_found & base_found
+
+            # 先整批轉成 Python 值再組 JSON
+            base_list, scenario_list, delta_list = (
+                round_list(values) for values in (base_values, scenario_values, delta)
+            )
+            base_vegetation_list = round_list(base_vegetation)
+            cells = []
+            for i in range(len(keys)):
+                cells.append({
+                    "column_id": column_ids[i],
+                    "row_id": row_ids[i],
+                    "vegetation": round(float(coverages[i]), 4),
+                    "baseline_vegetation": base_vegetation_list[i],
+                    "baseline": dict(zip(names, base_list[i])),
+                    "scenario": dict(zip(names, scenario_list[i])),
+                    "delta": dict(zip(names, delta_list[i]))
+                })
+
+            aggregate = {"cells": int(both.sum())}
+            if both.any():
+                aggregate.update({
+                    "mean_baseline": {name: round_value(base_values[both, k].mean()) for k, name in enumerate(names)},
+                    "mean_scenario": {name: round_value(scenario_values[both, k].mean()) for k, name in enumerate(names)},
+                    "mean_delta": {name: round_value(delta[both, k].mean()) for k, name in enumerate(names)},
+                    "min_delta": {name: round_value(delta[both, k].min()) for k, name in enumerate(names)},
+                    "max_delta": {name: round_value(delta[both, k].max()) for k, name in enumerate(names)}
+                })
+
+            results.append({
+                "month": month,
+                "baseline_year": year,
+                "missing_scenario": int((~scenario_found).sum()),
+                "missing_baseline": int((~base_found).sum()),
+                "aggregate": aggregate,
+                "cells": cells
+            })
+
+        return jsonify({"method": method, "results": results})
+
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
@@ -0,0 +1,124 @@
+"""
+假設情境計算 - 把任意網格的植被覆蓋率覆寫一次解析到 NDVITemp（向量化查表或線性內插），
+並與 HistoryData 基準比較
+"""
+import numpy as np
+
+from app import db
+from app.models import HistoryData, NDVITemp
+
+# NDVITemp 欄位 → 回應欄位
+SCENARIO_FIELDS = {
+    "Temperature_Predicted": "Temperature",
+    "High_Temp_Predicted": "High_Temp",
+    "Low_Temp_Predicted": "Low_Temp"
+}
+
+# 網格鍵編碼：column_id * CELL_KEY_BASE + row_id
+CELL_KEY_BASE = 1 << 20
+
+
+def cell_keys(column_ids, row_ids):
+    return np.asarray(column_ids, dtype=np.int64) * CELL_KEY_BASE + np.asarray(row_ids, dtype=np.int64)
+
+
+def resolve_coverage(month, keys, coverages, method='interpolate'):
+    """
+    對一個月份、N 個網格同時查 NDVITemp
+    keys: (N,) 網格鍵；coverages: (N,) 植被覆蓋率
+    回傳 (values (N, 3), found (N,) bool)
+    """
+    rows = db.session.query(
+        NDVITemp.column_id,
+        NDVITemp.row_id,
+        NDVITemp.Vegetation_Coverage,
+        *[getattr(NDVITemp, name) for name in SCENARIO_FIELDS]
+    ).filter(NDVITemp.Month == month).all()
+
+    values = np.full((len(keys), len(SCENARIO_FIELDS)), np.nan)
+    found = np.zeros(len(keys), dtype=bool)
+    if not rows:
+        return values, found
+
+    data = np.array(rows, dtype=np.float64)
+    data = data[~np.isnan(data[:, 2])]
+    if len(data) == 0:
+        # 該月份的植被覆蓋率全部為 NULL
+        return values, found
+    row_keys = cell_keys(data[:, 0], data[:, 1])
+    coverage = data[:, 2]
+
+    # 依 (網格, 覆蓋率) 排序，並把各網格的覆蓋率平移到互不重疊的區間，
+    # 讓所有網格可以用同一次 searchsorted 完成查表
+    order = np.lexsort((coverage, row_keys))
+    row_keys, coverage, table = row_keys[order], coverage[order], data[order, 3:]
+    groups, starts, counts = np.unique(row_keys, return_index=True, return_counts=True)
+    span = float(np.ptp(coverage)) + 2.0
+    group_of_row = np.repeat(np.arange(len(groups)), counts)
+    shifted = group_of_row * span + (coverage - coverage.min())
+
+    g = np.searchsorted(groups, keys)
+    g = np.clip(g, 0, len(groups) - 1)
+    found = groups[g] == keys
+    g = np.where(found, g, 0)
+    start, end = starts[g], starts[g] + counts[g] - 1
+
+    query = g * span + (np.asarray(coverages, dtype=np.float64) - coverage.min())
+    upper = np.clip(np.searchsorted(shifted, query), start, end)
+    lower = np.clip(upper - 1, start, end)
+
+    c_low, c_up = coverage[lower], coverage[upper]
+    q = np.clip(np.asarray(coverages, dtype=np.float64), coverage[start], coverage[end])
+
+    if method == 'nearest':
+        pick = np.where(np.abs(q - c_low) <= np.abs(c_up - q), lower, upper)
+        result = table[pick]
+    else:
+        width = c_up - c_low
+        weight = np.divide(q - c_low, width, out=np.zeros_like(q), where=width > 0)
+        result = table[lower] + (table[upper] - table[lower]) * weight[:, None]
+
+    values[found] = result[found]
+    return values, found
+
+
+def latest_year(month):
+    return db.session.query(db.func.max(HistoryData.Year)).filter(HistoryData.Month == month).scalar()
+
+
+def has_year(year, months):
+    """HistoryData 是否有該年份（任一指定月份）的資料"""
+    return db.session.query(HistoryData.id).filter(
+        HistoryData.Year == year,
+        HistoryData.Month.in_(months)
+    ).first() is not None
+
+
+def baseline(year, month, keys):
+    """HistoryData 基準：回傳 (values (N, 3), vegetation (N,), found (N,))"""
+    rows = db.session.query(
+        HistoryData.column_id,
+        HistoryData.row_id,
+        *[getattr(HistoryData, name) for name in SCENARIO_FIELDS.values()],
+        HistoryData.Vegetation_Coverage
+    ).filter(
+        HistoryData.Year == year,
+        HistoryData.Month == month
+    ).all()
+
+    values = np.full((len(keys), len(SCENARIO_FIELDS)), np.nan)
+    vegetation = np.full(len(keys), np.nan)
+    found = np.zeros(len(keys), dtype=bool)
+    if not rows:
+        return values, vegetation, found
+
+    data = np.array(rows, dtype=np.float64)
+    row_keys = cell_keys(data[:, 0], data[:, 1])
+    order = np.argsort(row_keys)
+    row_keys, data = row_keys[order], data[order]
+
+    idx = np.clip(np.searchsorted(row_keys, keys), 0, len(row_keys) - 1)
+    found = row_keys[idx] == keys
+    values[found] = data[idx[found], 2:5]
+    vegetation[found] = data[idx[found], 5]
+    return values, vegetation, found
@@ -0,0 +1,67 @@
+"""
+程序內指標 - 計數器、量測值與統計摘要，由 /metrics 以 JSON 輸出
+"""
+import threading
+import time
+
+
+class Metrics:
+    """執行緒安全的簡易指標註冊表"""
+
+    def __init__(self, app=None):
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._gauges = {}
+        self._summaries = {}
+        self._collectors = {}
+        self.started = time.time()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.extensions['metrics'] = self
+
+    def incr(self, name, value=1):
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+
+    def gauge(self, name, value):
+        with self._lock:
+            self._gauges[name] = value
+
+    def observe(self, name, value):
+        """記錄一次量測（例如延遲毫秒數、batch 大小）"""
+        with self._lock:
+            s = self._summaries.get(name)
+            if s is None:
+                s = self._summaries[name] = {"count": 0, "sum": 0.0, "min": value, "max": value}
+            s["count"] += 1
+            s["sum"] += value
+            s["min"] = min(s["min"], value)
+            s["max"] = max(s["max"], value)
+
+    def register_collector(self, name, fn):
+        """註冊在輸出時才計算的指標（回傳 dict 的函式）"""
+        with self._lock:
+            self._collectors[name] = fn
+
+    def snapshot(self):
+        with self._lock:
+            summaries = {
+                name: {**s, "avg": s["sum"] / s["count"] if s["count"] else 0.0}
+                for name, s in self._summaries.items()
+            }
+            result = {
+                "uptime_seconds": round(time.time() - self.started, 1),
+                "counters": dict(self._counters),
+                "gauges": dict(self._gauges),
+                "summaries": summaries
+            }
+            collectors = list(self._collectors.items())
+
+        for name, fn in collectors:
+            try:
+                result[name] = fn()
+            except Exception as e:
+                result[name] = {"error": str(e)}
+        return result
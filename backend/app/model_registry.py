@@ -0,0 +1,345 @@
+"""
+模型註冊表 - 本機磁碟上的版本化模型檔案
+
+目錄結構:
+    <MODEL_REGISTRY_DIR>/<name>/<version>/manifest.json
+    <MODEL_REGISTRY_DIR>/<name>/<version>/<array>.npy
+    <MODEL_REGISTRY_DIR>/<name>/CURRENT          目前版本（以 os.replace 原子切換）
+    <MODEL_REGISTRY_DIR>/<name>/PINNED           存在時表示目前版本由管理者指定，不自動重新訓練
+    <MODEL_REGISTRY_DIR>/<name>/.lock            訓練與發布的跨程序鎖
+
+陣列以 mmap 方式載入，同一台機器上的多個 worker 共用相同的分頁快取；
+第一次使用時才載入，CURRENT 改變後下一次 get() 會自動換成新版本，不需重啟
+"""
+import json
+import os
+import shutil
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+import click
+import numpy as np
+from flask import current_app
+
+
+@contextmanager
+def _file_lock(path):
+    """跨程序的互斥鎖（同一台機器上的所有 worker），離開時釋放"""
+    with open(path, 'a+') as f:
+        if os.name == 'nt':
+            import msvcrt
+            while True:
+                try:
+                    f.seek(0)
+                    msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:
+                    # LK_LOCK 約 10 秒後放棄，訓練可能更久，繼續等待
+                    continue
+            try:
+                yield
+            finally:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+        else:
+            import fcntl
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+
+class ModelArtifact:
+    """一個已載入的模型版本"""
+
+    def __init__(self, name, version, arrays, meta):
+        self.name = name
+        self.version = version
+        self.arrays = arrays    # name -> np.memmap（唯讀）
+        self.meta = meta
+
+    def __getitem__(self, key):
+        return self.arrays[key]
+
+
+class ModelRegistry:
+    """延遲載入、mmap 共用記憶體、可原子切換版本的模型註冊表"""
+
+    def __init__(self, app=None):
+        self.root = None
+        self.check_interval = 5
+        self.keep_versions = 3
+        self._lock = threading.Lock()
+        self._loaded = {}       # name -> ModelArtifact
+        self._checked = {}      # name -> 上次檢查 CURRENT 的時間
+        self._models = {}       # name -> (version, 由 artifact 建立的模型物件)
+        self.loads = 0
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.root = app.config.get('MODEL_REGISTRY_DIR') or os.path.join(app.instance_path, 'models')
+        self.check_interval = app.config.get('MODEL_REGISTRY_CHECK_INTERVAL', self.check_interval)
+        self.keep_versions = app.config.get('MODEL_REGISTRY_KEEP_VERSIONS', self.keep_versions)
+        app.extensions['model_registry'] = self
+        self._register_commands(app)
+
+    # ---------- 路徑 ----------
+
+    def _model_dir(self, name):
+        return os.path.join(self.root, name)
+
+    def _current_file(self, name):
+        return os.path.join(self._model_dir(name), 'CURRENT')
+
+    def _pin_file(self, name):
+        return os.path.join(self._model_dir(name), 'PINNED')
+
+    def pinned(self, name):
+        """目前版本是否由管理者指定（指定期間不會自動以新資料重新訓練）"""
+        return os.path.exists(self._pin_file(name))
+
+    @contextmanager
+    def lock(self, name):
+        """訓練與發布的跨程序鎖"""
+        os.makedirs(self._model_dir(name), exist_ok=True)
+        with _file_lock(os.path.join(self._model_dir(name), '.lock')):
+            yield
+
+    def current_version(self, name):
+        try:
+            with open(self._current_file(name), 'r', encoding='utf-8') as f:
+                return f.read().strip() or None
+        except FileNotFoundError:
+            return None
+
+    def versions(self, name):
+        """已發布的版本，依發布時間排序"""
+        model_dir = self._model_dir(name)
+        if not os.path.isdir(model_dir):
+            return []
+        found = []
+        for entry in os.listdir(model_dir):
+            manifest = os.path.join(model_dir, entry, 'manifest.json')
+            if os.path.isfile(manifest):
+                found.append((os.path.getmtime(manifest), entry))
+        return [v for _, v in sorted(found)]
+
+    # ---------- 發布與切換 ----------
+
+    def publish(self, name, arrays, meta=None, version=None, activate=True):
+        """
+        寫入新版本：先寫到暫存目錄再 rename，最後原子切換 CURRENT
+        arrays: {name: ndarray}；meta: 可 JSON 序列化的 dict
+        """
+        version = version or time.strftime('%Y%m%d%H%M%S') + '-' + uuid.uuid4().hex[:6]
+        model_dir = self._model_dir(name)
+        os.makedirs(model_dir, exist_ok=True)
+
+        staging = os.path.join(model_dir, f'.staging-{uuid.uuid4().hex}')
+        os.makedirs(staging)
+        try:
+            for key, array in arrays.items():
+                np.save(os.path.join(staging, f'{key}.npy'), np.ascontiguousarray(array))
+            manifest = {
+                "name": name,
+                "version": version,
+                "created": time.time(),
+                "arrays": sorted(arrays),
+                "meta": meta or {}
+            }
+            with open(os.path.join(staging, 'manifest.json'), 'w', encoding='utf-8') as f:
+                json.dump(manifest, f, ensure_ascii=False, indent=2)
+            os.rename(staging, os.path.join(model_dir, version))
+        except Exception:
+            shutil.rmtree(staging, ignore_errors=True)
+            raise
+
+        if activate:
+            self.activate(name, version)
+        return version
+
+    def activate(self, name, version, pin=False):
+        """
+        原子切換目前版本；其他 worker 會在下次檢查時載入
+        pin=True 時固定此版本，資料集更新也不會自動重新訓練取代（unpin() 解除）；
+        pin=False 會解除先前的固定
+        """
+        if not os.path.isfile(os.path.join(self._model_dir(name), version, 'manifest.json')):
+            raise ValueError(f"Unknown version {version!r} for model {name!r}")
+        tmp = self._current_file(name) + f'.{uuid.uuid4().hex}'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            f.write(version)
+        os.replace(tmp, self._current_file(name))
+        if pin:
+            with open(self._pin_file(name), 'w', encoding='utf-8') as f:
+                f.write(version)
+        else:
+            self.unpin(name)
+        with self._lock:
+            self._checked.pop(name, None)
+        self.prune(name)
+
+    def unpin(self, name):
+        """解除固定，下次使用時若資料集已更新會重新訓練"""
+        try:
+            os.remove(self._pin_file(name))
+        except FileNotFoundError:
+            pass
+
+    def prune(self, name):
+        """只保留最近 keep_versions 個版本（目前版本一定保留）"""
+        current = self.current_version(name)
+        old = [v for v in self.versions(name) if v != current]
+        for version in old[:max(0, len(old) - (self.keep_versions - 1))]:
+            shutil.rmtree(os.path.join(self._model_dir(name), version), ignore_errors=True)
+
+    # ---------- 載入 ----------
+
+    def _load(self, name, version):
+        version_dir = os.path.join(self._model_dir(name), version)
+        with open(os.path.join(version_dir, 'manifest.json'), 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+        arrays = {
+            key: np.load(os.path.join(version_dir, f'{key}.npy'), mmap_mode='r')
+            for key in manifest["arrays"]
+        }
+        self.loads += 1
+        return ModelArtifact(name, version, arrays, manifest.get("meta", {}))
+
+    def get(self, name, refresh=False):
+        """
+        取得目前版本（延遲載入）；最多每 check_interval 秒檢查一次 CURRENT 是否改變
+        refresh=True 時立即檢查；沒有任何已發布版本時回傳 None
+        """
+        now = time.monotonic()
+        with self._lock:
+            loaded = self._loaded.get(name)
+            if loaded is not None and not refresh and now - self._checked.get(name, 0) < self.check_interval:
+                return loaded
+
+        version = self.current_version(name)
+        with self._lock:
+            self._checked[name] = now
+            loaded = self._loaded.get(name)
+            if version is None:
+                return None
+            if loaded is not None and loaded.version == version:
+                return loaded
+
+        try:
+            artifact = self._load(name, version)
+        except FileNotFoundError:
+            # 版本在讀取途中被清除，沿用舊版本
+            return loaded
+        with self._lock:
+            self._loaded[name] = artifact
+        return artifact
+
+    def get_or_train(self, name, data_version, train, load):
+        """
+        取得以目前資料集版本訓練的模型物件
+        train(): 回傳 (arrays, meta) 或 None；load(artifact): 由 artifact 建立模型物件
+        註冊表中的目前版本若來自同一資料集版本、或由管理者固定（flask models activate），
+        就直接使用（不論是哪個 worker 訓練的），否則訓練並發布新版本；
+        同一程序內的並行請求只訓練一次，多個 worker 之間以檔案鎖排隊，
+        取得鎖後會先重新檢查，其他 worker 已發布的版本直接沿用
+        """
+        def usable(artifact):
+            return artifact is not None and (
+                artifact.meta.get("dataset_version") == data_version or self.pinned(name)
+            )
+
+        artifact = self.get(name)
+        if not usable(artifact):
+            def build():
+                with self.lock(name):
+                    artifact = self.get(name, refresh=True)
+                    if usable(artifact):
+                        return artifact
+                    result = train()
+                    if result is None:
+                        return None
+                    arrays, meta = result
+                    self.publish(name, arrays, {**meta, "dataset_version": data_version})
+                    return self.get(name, refresh=True)
+
+            flights = current_app.extensions.get('singleflight')
+            if flights is None:
+                artifact = build()
+            else:
+                artifact, _ = flights.do(('model-train', name, data_version), build)
+            if artifact is None:
+                return None
+
+        with self._lock:
+            cached = self._models.get(name)
+        if cached is not None and cached[0] == artifact.version:
+            return cached[1]
+        model = load(artifact)
+        with self._lock:
+            self._models[name] = (artifact.version, model)
+        return model
+
+    def warm(self, names=None):
+        """預先載入並觸碰所有陣列分頁，讓第一個請求不必等磁碟"""
+        if names is None:
+            names = os.listdir(self.root) if self.root and os.path.isdir(self.root) else []
+        warmed = []
+        for name in names:
+            artifact = self.get(name)
+            if artifact is None:
+                continue
+            for array in artifact.arrays.values():
+                if array.size:
+                    np.asarray(array).sum()
+            warmed.append(f'{name}@{artifact.version}')
+        return warmed
+
+    def stats(self):
+        with self._lock:
+            loaded = {name: a.version for name, a in self._loaded.items()}
+        return {"root": self.root, "loaded": loaded, "loads": self.loads}
+
+    # ---------- CLI ----------
+
+    def _register_commands(self, app):
+        registry = self
+
+        @app.cli.group('models')
+        def models():
+            """模型註冊表管理"""
+
+        @models.command('list')
+        @click.argument('name', required=False)
+        def list_models(name):
+            names = [name] if name else (sorted(os.listdir(registry.root)) if os.path.isdir(registry.root) else [])
+            for model_name in names:
+                current = registry.current_version(model_name)
+                pinned = registry.pinned(model_name)
+                for version in registry.versions(model_name):
+                    marker = '*' if version == current else ' '
+                    suffix = ' (pinned)' if version == current and pinned else ''
+                    click.echo(f'{marker} {model_name} {version}{suffix}')
+
+        @models.command('activate')
+        @click.argument('name')
+        @click.argument('version')
+        def activate_model(name, version):
+            """切換並固定版本（資料集更新也不會自動取代，用 unpin 解除）"""
+            try:
+                with registry.lock(name):
+                    registry.activate(name, version, pin=True)
+            except ValueError as e:
+                raise click.ClickException(str(e))
+            click.echo(f'{name} -> {version} (pinned)')
+
+        @models.command('unpin')
+        @click.argument('name')
+        def unpin_model(name):
+            """解除固定，資料集更新後會自動重新訓練"""
+            registry.unpin(name)
+            click.echo(f'{name} unpinned')
@@ -1,11 +1,12 @@
-from app import db, login
+from app import db, login, token_auth
 from werkzeug.security import generate_password_hash, check_password_hash
 from flask_login import UserMixin
 from sqlalchemy import ForeignKeyConstraint
 
 @login.user_loader
 def load_user(id):
-    return User.query.get(int(id))
+    # 快取 AUTH_USER_CACHE_TTL 秒，已登入的請求不必每次查 user 表
+    return token_auth.load_user(int(id), lambda user_id: User.query.get(user_id))
 
 class User(UserMixin, db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -0,0 +1,103 @@
+"""
+Micro-batcher - 收集數毫秒內的並行預測請求，合併成一次向量化前向運算
+"""
+import queue
+import threading
+import time
+
+import numpy as np
+
+
+class BatchTimeout(Exception):
+    """等待批次結果逾時"""
+
+
+class _Item:
+    def __init__(self, model, inputs):
+        self.model = model
+        self.inputs = inputs
+        self.enqueued = time.perf_counter()
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class MicroBatcher:
+    """單一背景執行緒負責前向運算；請求端只需 submit 並等待自己的結果"""
+
+    def __init__(self, max_wait_ms=5, max_batch_rows=65536, metrics=None, name='batch'):
+        self.max_wait = max_wait_ms / 1000
+        self.max_batch_rows = max_batch_rows
+        self.metrics = metrics
+        self.name = name
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def _ensure_worker(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name=f'{self.name}-batcher', daemon=True)
+                self._thread.start()
+
+    def submit(self, model, inputs, timeout=10):
+        """inputs: (N, F)，回傳 model.predict 對應的 (N, K)"""
+        self._ensure_worker()
+        item = _Item(model, np.asarray(inputs, dtype=np.float64))
+        self._queue.put(item)
+        if not item.done.wait(timeout):
+            raise BatchTimeout(f"Prediction not completed within {timeout}s")
+        if item.error is not None:
+            raise item.error
+        return item.result
+
+    def _collect(self):
+        """阻塞取得第一筆，之後在 max_wait 內盡量多收集"""
+        first = self._queue.get()
+        batch = [first]
+        rows = len(first.inputs)
+        deadline = time.perf_counter() + self.max_wait
+        while rows < self.max_batch_rows:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                item = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            batch.append(item)
+            rows += len(item.inputs)
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            # 資料集版本切換時，同一批可能混有不同模型
+            groups = {}
+            for item in batch:
+                groups.setdefault(id(item.model), []).append(item)
+
+            for items in groups.values():
+                started = time.perf_counter()
+                try:
+                    outputs = items[0].model.predict(np.concatenate([i.inputs for i in items]))
+                    offset = 0
+                    for item in items:
+                        n = len(item.inputs)
+                        item.result = outputs[offset:offset + n]
+                        offset += n
+                except Exception as e:
+                    for item in items:
+                        item.error = e
+                finished = time.perf_counter()
+
+                if self.metrics is not None:
+                    self.metrics.incr(f'{self.name}.batches')
+                    self.metrics.observe(f'{self.name}.batch_requests', len(items))
+                    self.metrics.observe(f'{self.name}.batch_rows', sum(len(i.inputs) for i in items))
+                    self.metrics.observe(f'{self.name}.forward_ms', (finished - started) * 1000)
+                    for item in items:
+                        self.metrics.observe(f'{self.name}.latency_ms', (finished - item.enqueued) * 1000)
+
+                for item in items:
+                    item.done.set()
@@ -0,0 +1,223 @@
+"""
+氣候變數回歸模型 - 由 NDVITemp 的模擬結果學習「植被、水體、高程 → 溫度」的關係，
+以 HistoryData 的逐格月氣候值作為基準特徵，可回答任意覆蓋率與高程的假設情境
+權重發布到模型註冊表，各 worker 以 mmap 共用
+"""
+import time
+
+import numpy as np
+from sqlalchemy import func
+
+from app import db, model_registry
+from app.dataset import dataset_version
+from app.models import HistoryData, NDVITemp, IndexTable
+
+TARGETS = ["Temperature", "High_Temp", "Low_Temp"]
+NDVI_TARGETS = ["Temperature_Predicted", "High_Temp_Predicted", "Low_Temp_Predicted"]
+
+# 原始輸入欄位順序：month, vegetation, water_body, elevation, 基準溫度 ×3
+INPUTS = ["month", "vegetation", "water_body", "elevation", "base_temperature", "base_high", "base_low"]
+
+RIDGE = 1e-3
+
+REGISTRY_NAME = 'climate_variable'
+
+
+def expand_features(raw):
+    """raw: (N, len(INPUTS)) → (N, F) 特徵矩陣（不含截距）"""
+    month, veg, water, elev = raw[:, 0], raw[:, 1], raw[:, 2], raw[:, 3]
+    base = raw[:, 4:7]
+    phase = 2 * np.pi * (month - 1) / 12
+    s, c = np.sin(phase), np.cos(phase)
+    return np.column_stack([
+        base,
+        veg, veg ** 2, water, water ** 2, veg * water,
+        elev / 1000,
+        s, c, veg * s, veg * c, water * s, water * c
+    ])
+
+
+class ClimateVariableModel:
+    """Ridge 回歸權重與逐格預設值"""
+
+    def __init__(self, version, mean, scale, weights, cells, defaults, train_rmse, n_train, fit_seconds):
+        self.version = version
+        self.mean = mean            # (F,)
+        self.scale = scale          # (F,)
+        self.weights = weights      # (F + 1, len(TARGETS))
+        self.cells = cells          # (C, 2)
+        self.defaults = defaults    # (C, 12, 6): vegetation, water_body, elevation, 基準溫度 ×3
+        self.train_rmse = train_rmse
+        self.n_train = n_train
+        self.fit_seconds = fit_seconds
+        self.cell_index = {(int(c), int(r)): i for i, (c, r) in enumerate(cells)}
+
+    def predict(self, raw):
+        """一次前向運算：raw (N, len(INPUTS)) → (N, len(TARGETS))"""
+        X = (expand_features(raw) - self.mean) / self.scale
+        return X @ self.weights[1:] + self.weights[0]
+
+    def build_inputs(self, cell_ids, month, vegetation=None, water_body=None, elevation=None):
+        """
+        依網格與月份組出原始輸入；未指定的值使用該格該月的歷史平均
+        vegetation / water_body / elevation 可為純量或與 cell_ids 等長的陣列
+        """
+        cell_ids = np.asarray(cell_ids, dtype=np.int64)
+        d = self.defaults[cell_ids, month - 1]
+        raw = np.empty((len(cell_ids), len(INPUTS)))
+        raw[:, 0] = month
+        raw[:, 1] = d[:, 0] if vegetation is None else vegetation
+        raw[:, 2] = d[:, 1] if water_body is None else water_body
+        raw[:, 3] = d[:, 2] if elevation is None else elevation
+        raw[:, 4:7] = d[:, 3:6]
+        return raw
+
+    def to_artifact(self):
+        """轉成模型註冊表的 (arrays, meta)"""
+        arrays = {
+            "mean": self.mean,
+            "scale": self.scale,
+            "weights": self.weights,
+            "cells": self.cells,
+            "defaults": self.defaults,
+            "train_rmse": self.train_rmse
+        }
+        meta = {"n_train": self.n_train, "fit_seconds": self.fit_seconds}
+        return arrays, meta
+
+    @classmethod
+    def from_artifact(cls, artifact):
+        return cls(
+            version=artifact.meta["dataset_version"],
+            mean=artifact["mean"],
+            scale=artifact["scale"],
+            weights=artifact["weights"],
+            cells=artifact["cells"],
+            defaults=artifact["defaults"],
+            train_rmse=artifact["train_rmse"],
+            n_train=artifact.meta["n_train"],
+            fit_seconds=artifact.meta["fit_seconds"]
+        )
+
+    def info(self):
+        return {
+            "dataset_version": self.version,
+            "cells": len(self.cells),
+            "inputs": INPUTS,
+            "targets": TARGETS,
+            "training_rows": self.n_train,
+            "train_rmse": {name: round(float(v), 4) for name, v in zip(TARGETS, self.train_rmse)},
+            "fit_seconds": round(self.fit_seconds, 4)
+        }
+
+
+def _load_defaults():
+    """逐格逐月的歷史平均（一次 GROUP BY）與高程"""
+    climatology = db.session.query(
+        HistoryData.column_id,
+        HistoryData.row_id,
+        HistoryData.Month,
+        func.avg(HistoryData.Vegetation_Coverage),
+        func.avg(HistoryData.Water_Body_Coverage),
+        func.avg(HistoryData.Temperature),
+        func.avg(HistoryData.High_Temp),
+        func.avg(HistoryData.Low_Temp)
+    ).group_by(HistoryData.column_id, HistoryData.row_id, HistoryData.Month).all()
+
+    elevations = dict(
+        ((c, r), e) for c, r, e in
+        db.session.query(IndexTable.column_id, IndexTable.row_id, IndexTable.Elevation).all()
+    )
+
+    cells = sorted({(c, r) for c, r, *_ in climatology})
+    cell_index = {cell: i for i, cell in enumerate(cells)}
+    defaults = np.full((len(cells), 12, 6), np.nan)
+    for c, r, month, veg, water, t, high, low in climatology:
+        if month is None or not 1 <= month <= 12:
+            continue
+        defaults[cell_index[(c, r)], month - 1] = [
+            veg, water, elevations.get((c, r)), t, high, low
+        ]
+    # 缺少覆蓋率視為 0，缺少高程以全區平均補上
+    defaults[:, :, 0:2] = np.nan_to_num(defaults[:, :, 0:2])
+    if np.isnan(defaults[:, :, 2]).all():
+        defaults[:, :, 2] = 0.0
+    else:
+        defaults[:, :, 2] = np.where(np.isnan(defaults[:, :, 2]), np.nanmean(defaults[:, :, 2]), defaults[:, :, 2])
+    return np.array(cells, dtype=np.int64).reshape(-1, 2), cell_index, defaults
+
+
+def train(version):
+    started = time.perf_counter()
+    cells, cell_index, defaults = _load_defaults()
+    if not len(cells):
+        return None
+
+    rows = db.session.query(
+        NDVITemp.column_id,
+        NDVITemp.row_id,
+        NDVITemp.Month,
+        NDVITemp.Vegetation_Coverage,
+        NDVITemp.Water_Body_Coverage,
+        NDVITemp.Elevation,
+        *[getattr(NDVITemp, t) for t in NDVI_TARGETS]
+    ).all()
+
+    samples, targets = [], []
+    for c, r, month, veg, water, elev, *y in rows:
+        i = cell_index.get((c, r))
+        if i is None or month is None or not 1 <= month <= 12:
+            continue
+        base = defaults[i, month - 1]
+        samples.append([
+            month,
+            veg if veg is not None else np.nan,
+            water if water is not None else base[1],
+            elev if elev is not None else base[2],
+            base[3], base[4], base[5]
+        ])
+        targets.append([np.nan if v is None else v for v in y])
+
+    if not samples:
+        return None
+
+    raw = np.array(samples, dtype=np.float64)
+    Y = np.array(targets, dtype=np.float64)
+    valid = ~np.isnan(raw).any(axis=1) & ~np.isnan(Y).any(axis=1)
+    raw, Y = raw[valid], Y[valid]
+    if len(raw) == 0:
+        return None
+
+    # 標準化後以封閉解求 ridge 回歸，所有目標一起解
+    X = expand_features(raw)
+    mean = X.mean(axis=0)
+    scale = X.std(axis=0)
+    scale[scale == 0] = 1.0
+    Xs = np.column_stack([np.ones(len(X)), (X - mean) / scale])
+    penalty = RIDGE * np.eye(Xs.shape[1])
+    penalty[0, 0] = 0.0
+    weights = np.linalg.solve(Xs.T @ Xs + penalty, Xs.T @ Y)
+
+    rmse = np.sqrt(((Xs @ weights - Y) ** 2).mean(axis=0))
+    return ClimateVariableModel(
+        version=version,
+        mean=mean,
+        scale=scale,
+        weights=weights,
+        cells=cells,
+        defaults=defaults,
+        train_rmse=rmse,
+        n_train=int(len(raw)),
+        fit_seconds=time.perf_counter() - started
+    )
+
+
+def get_model():
+    """取得目前資料集版本的模型；版本改變時重新訓練並發布（並行請求只訓練一次）"""
+    version = dataset_version()
+
+    def build():
+        trained = train(version)
+        return None if trained is None else trained.to_artifact()
+
+    return model_registry.get_or_train(REGISTRY_NAME, version, build, ClimateVariableModel.from_artifact)
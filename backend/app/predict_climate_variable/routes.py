@@ -1,7 +1,232 @@
-from flask import render_template
+import math
+
+from flask import jsonify, request
+from app import metrics, admission
 from app.predict_climate_variable import bp
+from app.predict_climate_variable.batcher import MicroBatcher, BatchTimeout
+from app.predict_climate_variable.model import TARGETS, get_model
+from app.singleflight import SingleFlightTimeout
+
+# 所有預測請求共用同一個 micro-batcher
+batcher = MicroBatcher(metrics=metrics, name='predict')
+
+# 單次 /predict 請求最多的網格數
+MAX_PREDICT_CELLS = 10000
+
+
+@bp.record_once
+def _configure_batcher(state):
+    batcher.max_wait = state.app.config.get('PREDICT_BATCH_WAIT_MS', 5) / 1000
+    batcher.max_batch_rows = state.app.config.get('PREDICT_BATCH_MAX_ROWS', 65536)
+
+
+def _value(x):
+    return None if x is None or math.isnan(x) else round(float(x), 3)
+
+
+def _coverage(value, name):
+    """解析 0~1 的覆蓋率，None 表示使用歷史平均"""
+    if value is None:
+        return None
+    value = float(value)
+    if not 0 <= value <= 1:
+        raise ValueError(f"{name} must be between 0 and 1")
+    return value
+
+
+def _elevation(value, name="elevation"):
+    """解析有限的高程（或高程位移），None 表示使用歷史平均 / 不位移"""
+    if value is None:
+        return None
+    value = float(value)
+    if not math.isfinite(value):
+        raise ValueError(f"{name} must be a finite number")
+    return value
+
 
 @bp.route('/')
 def index():
-    # 控制变量预测气候的页面
-    return "这是气候变量预测页面"
+    """模型狀態"""
+    try:
+        model = get_model()
+        if model is None:
+            return jsonify({"error": "Data not found 查無資料"}), 404
+        return jsonify(model.info())
+    except SingleFlightTimeout:
+        return jsonify({"error": "Timed out waiting for model training 等待模型訓練逾時"}), 504
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+@bp.route('/<int:month>/<path:veg>/<string:colrow>', methods=['GET'])
+@admission.limit('compute')
+def predict_cell(month, veg, colrow):
+    """
+    單一網格在任意植被覆蓋率（可選水體覆蓋率、高程）下的預測
+    路由格式: /predict_climate_variable/<month>/<vegetation>/<column_id>+<row_id>?water_body=&elevation=
+    """
+    try:
+        try:
+            vegetation = _coverage(veg, "vegetation")
+            water_body = _coverage(request.args.get('water_body'), "water_body")
+        except ValueError:
+            return jsonify({"error": "Invalid coverage value 覆蓋率格式無效"}), 400
+        try:
+            elevation = _elevation(request.args.get('elevation'))
+        except ValueError:
+            return jsonify({"error": "Invalid elevation 高程格式無效"}), 400
+        if month < 1 or month > 12:
+            return jsonify({"error": "Invalid month 月份格式無效"}), 400
+
+        # 檢查 column_id+row_id 格式
+        if '+' not in colrow:
+            return jsonify({"error": "Invalid format, expected column_id+row_id 無效格式，請輸入column ID+row ID"}), 400
+
+        column_id_str, row_id_str = colrow.split('+', 1)
+        try:
+            column_id = int(column_id_str)
+            row_id = int(row_id_str)
+        except ValueError:
+            return jsonify({"error": "Invalid column_id or row_id format 無效的行列格式"}), 400
+
+        model = get_model()
+        if model is None or (column_id, row_id) not in model.cell_index:
+            return jsonify({"error": "Data not found 查無資料"}), 404
+
+        inputs = model.build_inputs(
+            [model.cell_index[(column_id, row_id)]], month,
+            vegetation=vegetation, water_body=water_body, elevation=elevation
+        )
+        outputs = batcher.submit(model, inputs)[0]
+
+        return jsonify({
+            "predicted_temperatures": {
+                "current": _value(outputs[0]),
+                "high": _value(outputs[1]),
+                "low": _value(outputs[2])
+            },
+            "location": {"column_id": column_id, "row_id": row_id},
+            "metadata": {
+                "month": month,
+                "vegetation": _value(inputs[0, 1]),
+                "water_body": _value(inputs[0, 2]),
+                "elevation": _value(inputs[0, 3])
+            }
+        })
+
+    except (SingleFlightTimeout, BatchTimeout):
+        return jsonify({"error": "Timed out waiting for prediction 等待預測逾時"}), 504
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+@bp.route('/predict', methods=['POST'])
+@admission.limit('compute')
+def predict_cells():
+    """
+    多個網格的預測，每格可各自指定覆蓋率與高程
+    請求格式: {"month": 7, "cells": [{"column_id": 1, "row_id": 2, "vegetation": 0.6, "water_body": 0.1, "elevation": 30}]}
+    """
+    try:
+        data = request.get_json(silent=True) or {}
+        month = data.get('month')
+        cells = data.get('cells') or []
+        if not isinstance(month, int) or not 1 <= month <= 12:
+            return jsonify({"error": "Invalid month 月份格式無效"}), 400
+        if not isinstance(cells, list) or not cells:
+            return jsonify({"error": "cells must be a non-empty list 請提供網格清單"}), 400
+        if len(cells) > MAX_PREDICT_CELLS:
+            return jsonify({"error": f"Too many cells, at most {MAX_PREDICT_CELLS} 網格數過多"}), 400
+
+        model = get_model()
+        if model is None:
+            return jsonify({"error": "Data not found 查無資料"}), 404
+
+        indices, vegetation, water_body, elevation = [], [], [], []
+        try:
+            for cell in cells:
+                key = (int(cell['column_id']), int(cell['row_id']))
+                if key not in model.cell_index:
+                    return jsonify({"error": f"Data not found for cell {key[0]}+{key[1]} 查無資料"}), 404
+                indices.append(model.cell_index[key])
+                vegetation.append(_coverage(cell.get('vegetation'), "vegetation"))
+                water_body.append(_coverage(cell.get('water_body'), "water_body"))
+                elevation.append(_elevation(cell.get('elevation')))
+        except (KeyError, TypeError, ValueError):
+            return jsonify({"error": "Invalid cell format 網格格式無效"}), 400
+
+        # 未指定的欄位以歷史平均補上
+        inputs = model.build_inputs(indices, month)
+        for column, values in ((1, vegetation), (2, water_body), (3, elevation)):
+            for i, value in enumerate(values):
+                if value is not None:
+                    inputs[i, column] = value
+
+        outputs = batcher.submit(model, inputs)
+
+        predictions = []
+        for i, cell in enumerate(cells):
+            predictions.append({
+                "column_id": int(cell['column_id']),
+                "row_id": int(cell['row_id']),
+                **{name: _value(outputs[i, k]) for k, name in enumerate(TARGETS)}
+            })
+        return jsonify({"month": month, "predictions": predictions})
+
+    except (SingleFlightTimeout, BatchTimeout):
+        return jsonify({"error": "Timed out waiting for prediction 等待預測逾時"}), 504
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+@bp.route('/grid', methods=['POST'])
+@admission.limit('compute')
+def predict_grid():
+    """
+    全網格假設情境，回傳格式與 /formap 相同
+    請求格式: {"month": 7, "type": "Temperature", "vegetation": 0.6, "water_body": 0.1, "elevation_offset": 0}
+    """
+    try:
+        data = request.get_json(silent=True) or {}
+        month = data.get('month')
+        type = data.get('type', 'Temperature')
+        if not isinstance(month, int) or not 1 <= month <= 12:
+            return jsonify({"error": "Invalid month 月份格式無效"}), 400
+        if type not in TARGETS:
+            return jsonify({
+                "error": f"Invalid temperature type. Must be one of: {', '.join(TARGETS)}"
+            }), 400
+        try:
+            vegetation = _coverage(data.get('vegetation'), "vegetation")
+            water_body = _coverage(data.get('water_body'), "water_body")
+        except (TypeError, ValueError):
+            return jsonify({"error": "Invalid coverage value 覆蓋率格式無效"}), 400
+        try:
+            elevation_offset = _elevation(data.get('elevation_offset'), "elevation_offset") or 0.0
+        except (TypeError, ValueError):
+            return jsonify({"error": "Invalid elevation_offset 高程位移格式無效"}), 400
+
+        model = get_model()
+        if model is None:
+            return jsonify({"error": "Data not found 查無資料"}), 404
+
+        inputs = model.build_inputs(
+            range(len(model.cells)), month, vegetation=vegetation, water_body=water_body
+        )
+        inputs[:, 3] += elevation_offset
+        values = batcher.submit(model, inputs)[:, TARGETS.index(type)]
+
+        # 建立回應數據
+        result = {}
+        for (column_id, row_id), value in zip(model.cells, values.tolist()):
+            col_key = str(column_id)
+            if col_key not in result:
+                result[col_key] = {}
+            result[col_key][str(row_id)] = _value(value)
+
+        return jsonify(result)
+
+    except (SingleFlightTimeout, BatchTimeout):
+        return jsonify({"error": "Timed out waiting for prediction 等待預測逾時"}), 504
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
@@ -0,0 +1,185 @@
+"""
+未來氣候預測引擎 - 一次對所有網格、所有變數擬合「趨勢 + 季節」模型
+
+模型: y(t) = a + b * t + Σ_k [c_k * sin(2πk·m/12) + d_k * cos(2πk·m/12)]
+以批次的加權最小平方法（缺值權重為 0）同時求解所有 (網格, 變數) 的係數，
+係數依資料集版本發布到模型註冊表（mmap 載入、各 worker 共用），預測只需一次矩陣乘法
+"""
+import time
+
+import numpy as np
+
+from app import db, model_registry
+from app.dataset import dataset_version
+from app.models import HistoryData
+
+VARIABLES = ["Temperature", "High_Temp", "Low_Temp"]
+HARMONICS = 2
+RIDGE = 1e-6
+
+REGISTRY_NAME = 'future_climate'
+
+
+def design_matrix(period, month):
+    """period: 自起始月份起算的月數；month: 1-12。回傳 (N, p) 設計矩陣"""
+    period = np.asarray(period, dtype=np.float64)
+    phase = 2 * np.pi * (np.asarray(month, dtype=np.float64) - 1) / 12
+    columns = [np.ones_like(period), period / 12]
+    for k in range(1, HARMONICS + 1):
+        columns.append(np.sin(k * phase))
+        columns.append(np.cos(k * phase))
+    return np.stack(columns, axis=-1)
+
+
+class ForecastModel:
+    """已擬合的係數與網格索引"""
+
+    def __init__(self, version, cells, origin, coef, resid_std, n_obs, last_period, fit_seconds):
+        self.version = version
+        self.cells = cells              # (C, 2) column_id, row_id
+        self.origin = origin            # (year, month) 對應 period 0
+        self.coef = coef                # (C, V, p)
+        self.resid_std = resid_std      # (C, V)
+        self.n_obs = n_obs              # (C, V)
+        self.last_period = last_period  # 最後一個有觀測值的 (year, month)
+        self.fit_seconds = fit_seconds
+        self.cell_index = {(int(c), int(r)): i for i, (c, r) in enumerate(cells)}
+
+    def period_of(self, year, month):
+        return (year - self.origin[0]) * 12 + (month - self.origin[1])
+
+    def predict(self, periods):
+        """periods: [(year, month), ...]，回傳 (H, C, V)"""
+        X = design_matrix(
+            [self.period_of(y, m) for y, m in periods],
+            [m for _, m in periods]
+        )
+        return np.einsum('hp,cvp->hcv', X, self.coef)
+
+    def predict_cell(self, cell, periods):
+        """單一網格，回傳 (H, V)"""
+        X = design_matrix(
+            [self.period_of(y, m) for y, m in periods],
+            [m for _, m in periods]
+        )
+        return X @ self.coef[self.cell_index[cell]].T
+
+    def to_artifact(self):
+        """轉成模型註冊表的 (arrays, meta)"""
+        arrays = {
+            "cells": self.cells,
+            "coef": self.coef,
+            "resid_std": self.resid_std,
+            "n_obs": self.n_obs
+        }
+        meta = {
+            "origin": list(self.origin),
+            "last_period": list(self.last_period),
+            "fit_seconds": self.fit_seconds
+        }
+        return arrays, meta
+
+    @classmethod
+    def from_artifact(cls, artifact):
+        meta = artifact.meta
+        return cls(
+            version=meta["dataset_version"],
+            cells=artifact["cells"],
+            origin=tuple(meta["origin"]),
+            coef=artifact["coef"],
+            resid_std=artifact["resid_std"],
+            n_obs=artifact["n_obs"],
+            last_period=tuple(meta["last_period"]),
+            fit_seconds=meta["fit_seconds"]
+        )
+
+    def info(self):
+        return {
+            "dataset_version": self.version,
+            "cells": len(self.cells),
+            "variables": VARIABLES,
+            "harmonics": HARMONICS,
+            "origin": {"year": self.origin[0], "month": self.origin[1]},
+            "last_observed": {"year": self.last_period[0], "month": self.last_period[1]},
+            "fit_seconds": round(self.fit_seconds, 4)
+        }
+
+
+def fit(rows, version):
+    """
+    rows: [(column_id, row_id, Year, Month, *VARIABLES), ...]
+    所有網格與變數一起求解，沒有逐格迴圈
+    """
+    started = time.perf_counter()
+    data = np.array(rows, dtype=np.float64)
+    col, row, year, month = data[:, 0], data[:, 1], data[:, 2], data[:, 3]
+    values = data[:, 4:]
+
+    cells, cell_idx = np.unique(np.stack([col, row], axis=1), axis=0, return_inverse=True)
+    cell_idx = cell_idx.reshape(-1)
+    absolute = (year * 12 + month - 1).astype(np.int64)
+    first, last = int(absolute.min()), int(absolute.max())
+    period_idx = absolute - first
+
+    T, C, V = last - first + 1, len(cells), len(VARIABLES)
+    Y = np.full((T, C, V), np.nan)
+    Y[period_idx, cell_idx] = values
+
+    W = (~np.isnan(Y)).astype(np.float64)
+    Y0 = np.nan_to_num(Y)
+
+    periods = np.arange(T)
+    X = design_matrix(periods, (first + periods) % 12 + 1)
+    p = X.shape[1]
+
+    # 批次的正規方程：A[c, v] = Xᵀ diag(w) X，b[c, v] = Xᵀ diag(w) y
+    A = np.einsum('tp,tq,tcv->cvpq', X, X, W) + RIDGE * np.eye(p)
+    b = np.einsum('tp,tcv->cvp', X, W * Y0)
+    coef = np.linalg.solve(A, b[..., None])[..., 0]
+
+    n_obs = W.sum(axis=0)
+    fitted = np.einsum('tp,cvp->tcv', X, coef)
+    sse = (W * (Y0 - fitted) ** 2).sum(axis=0)
+    resid_std = np.sqrt(sse / np.maximum(n_obs - p, 1))
+
+    # 觀測值不足以決定模型的序列不提供預測
+    unfit = n_obs < p + 2
+    coef[unfit] = np.nan
+    resid_std[unfit] = np.nan
+
+    return ForecastModel(
+        version=version,
+        cells=cells.astype(np.int64),
+        origin=(first // 12, first % 12 + 1),
+        coef=coef,
+        resid_std=resid_std,
+        n_obs=n_obs,
+        last_period=(last // 12, last % 12 + 1),
+        fit_seconds=time.perf_counter() - started
+    )
+
+
+def _load_rows():
+    return db.session.query(
+        HistoryData.column_id,
+        HistoryData.row_id,
+        HistoryData.Year,
+        HistoryData.Month,
+        *[getattr(HistoryData, v) for v in VARIABLES]
+    ).filter(
+        HistoryData.Year.isnot(None),
+        HistoryData.Month.isnot(None)
+    ).all()
+
+
+def get_model():
+    """取得目前資料集版本的模型；版本改變時重新擬合並發布（並行請求只擬合一次）"""
+    version = dataset_version()
+
+    def train():
+        rows = _load_rows()
+        if not rows:
+            return None
+        return fit(rows, version).to_artifact()
+
+    return model_registry.get_or_train(REGISTRY_NAME, version, train, ForecastModel.from_artifact)
@@ -1,7 +1,120 @@
-from flask import render_template
+import math
+import time
+
+from flask import jsonify
+from app import cache, metrics, admission
 from app.predict_future_climate import bp
+from app.predict_future_climate.engine import VARIABLES, get_model
+from app.singleflight import SingleFlightTimeout
+
+# 最多可預測到最後觀測年份之後幾年
+MAX_YEARS_AHEAD = 50
+
+
+def _value(x):
+    return None if x is None or math.isnan(x) else round(float(x), 3)
+
 
 @bp.route('/')
 def index():
-    # 预测未来十年气候的页面
-    return "这是未来气候预测页面"
+    """預測模型狀態"""
+    try:
+        model = get_model()
+        if model is None:
+            return jsonify({"error": "Data not found 查無資料"}), 404
+        return jsonify(model.info())
+    except SingleFlightTimeout:
+        return jsonify({"error": "Timed out waiting for model fit 等待模型擬合逾時"}), 504
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+@bp.route('/formap/<string:type>/<int:year>/<int:month>', methods=['GET'])
+@cache.cached()
+@admission.limit('compute')
+def get_forecast_map(type, year, month):
+    """
+    全網格的未來月均溫預測，格式與 /formap 相同
+    路由格式: /predict_future_climate/formap/<type>/<year>/<month>
+    """
+    try:
+        if type not in VARIABLES:
+            return jsonify({
+                "error": f"Invalid temperature type. Must be one of: {', '.join(VARIABLES)}"
+            }), 400
+        if month < 1 or month > 12:
+            return jsonify({"error": "Invalid month 月份格式無效"}), 400
+
+        model = get_model()
+        if model is None:
+            return jsonify({"error": "Data not found 查無資料"}), 404
+        if year > model.last_period[0] + MAX_YEARS_AHEAD:
+            return jsonify({"error": f"Year out of range, at most {MAX_YEARS_AHEAD} years ahead 年份超出範圍"}), 400
+
+        started = time.perf_counter()
+        values = model.predict([(year, month)])[0, :, VARIABLES.index(type)]
+        metrics.observe('forecast.map_ms', (time.perf_counter() - started) * 1000)
+
+        # 建立回應數據
+        result = {}
+        for (column_id, row_id), value in zip(model.cells, values.tolist()):
+            col_key = str(column_id)
+            if col_key not in result:
+                result[col_key] = {}
+            result[col_key][str(row_id)] = _value(value)
+
+        return jsonify(result)
+
+    except SingleFlightTimeout:
+        return jsonify({"error": "Timed out waiting for model fit 等待模型擬合逾時"}), 504
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+@bp.route('/annual/temp/<int:year>/<string:colrow>', methods=['GET'])
+@cache.cached()
+@admission.limit('compute')
+def get_forecast_series(year, colrow):
+    """
+    單一網格全年 12 個月的預測，格式與 /annual/temp 相同
+    路由格式: /predict_future_climate/annual/temp/<year>/<column_id>+<row_id>
+    """
+    try:
+        # 檢查 column_id+row_id 格式
+        if '+' not in colrow:
+            return jsonify({"error": "Invalid format, expected column_id+row_id 無效格式，請輸入column ID+row ID"}), 400
+
+        column_id_str, row_id_str = colrow.split('+', 1)
+        try:
+            column_id = int(column_id_str)
+            row_id = int(row_id_str)
+        except ValueError:
+            return jsonify({"error": "Invalid column_id or row_id format 無效的行列格式"}), 400
+
+        model = get_model()
+        if model is None or (column_id, row_id) not in model.cell_index:
+            return jsonify({"error": "Data not found 查無資料"}), 404
+        if year > model.last_period[0] + MAX_YEARS_AHEAD:
+            return jsonify({"error": f"Year out of range, at most {MAX_YEARS_AHEAD} years ahead 年份超出範圍"}), 400
+
+        started = time.perf_counter()
+        periods = [(year, m) for m in range(1, 13)]
+        values = model.predict_cell((column_id, row_id), periods)
+        metrics.observe('forecast.series_ms', (time.perf_counter() - started) * 1000)
+
+        result = {name: {} for name in VARIABLES}
+        for i, (_, month) in enumerate(periods):
+            for v, name in enumerate(VARIABLES):
+                result[name][str(month)] = _value(values[i, v])
+
+        resid_std = model.resid_std[model.cell_index[(column_id, row_id)]]
+        result["uncertainty"] = {
+            name: _value(resid_std[v]) for v, name in enumerate(VARIABLES)
+        }
+
+        return jsonify(result)
+
+    except SingleFlightTimeout:
+        return jsonify({"error": "Timed out waiting for model fit 等待模型擬合逾時"}), 504
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
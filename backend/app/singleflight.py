@@ -0,0 +1,106 @@
+"""
+Single-flight 請求合併 - 相同鍵的並行請求只執行一次，其他請求等待並共用結果
+"""
+import threading
+import time
+
+
+class SingleFlightTimeout(Exception):
+    """等待進行中的計算逾時"""
+
+    def __init__(self, key, timeout):
+        super().__init__(f"Timed out after {timeout}s waiting for in-flight computation {key!r}")
+        self.key = key
+        self.timeout = timeout
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """同一時間每個鍵只有一個 leader 執行計算，followers 等待同一個結果"""
+
+    def __init__(self, app=None):
+        self._calls = {}
+        self._lock = threading.Lock()
+        self.timeout = 30
+        self.leaders = 0
+        self.followers = 0
+        self.errors = 0
+        self.retries = 0
+        self.timeouts = 0
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.timeout = app.config.get('SINGLEFLIGHT_TIMEOUT', self.timeout)
+        app.extensions['singleflight'] = self
+
+    def do(self, key, fn, timeout=None, is_error=None, shareable=None):
+        """
+        執行 fn 或等待進行中的同鍵計算
+        回傳 (result, is_leader)；leader 的例外會原樣傳給所有 followers，
+        且不會留下任何狀態，下一個請求會重新計算
+        is_error(result): 回傳值代表失敗時為 True（計入 errors，例如非 200 的回應）
+        shareable(result): 結果只適用於 leader 時為 False（例如被准入控制拒絕），
+        followers 不共用而自行重新執行
+        """
+        timeout = self.timeout if timeout is None else timeout
+        deadline = time.monotonic() + timeout
+        while True:
+            with self._lock:
+                call = self._calls.get(key)
+                if call is None:
+                    call = _Call()
+                    self._calls[key] = call
+                    self.leaders += 1
+                    leader = True
+                else:
+                    self.followers += 1
+                    leader = False
+
+            if leader:
+                try:
+                    call.result = fn()
+                except BaseException as e:
+                    call.error = e
+                    with self._lock:
+                        self.errors += 1
+                    raise
+                finally:
+                    with self._lock:
+                        if self._calls.get(key) is call:
+                            del self._calls[key]
+                    call.done.set()
+                if is_error is not None and is_error(call.result):
+                    with self._lock:
+                        self.errors += 1
+                return call.result, True
+
+            if not call.done.wait(max(deadline - time.monotonic(), 0)):
+                with self._lock:
+                    self.timeouts += 1
+                raise SingleFlightTimeout(key, timeout)
+            if call.error is not None:
+                raise call.error
+            if shareable is None or shareable(call.result):
+                return call.result, False
+            with self._lock:
+                self.retries += 1
+
+    def stats(self):
+        with self._lock:
+            total = self.leaders + self.followers
+            return {
+                "in_flight": len(self._calls),
+                "leaders": self.leaders,
+                "followers": self.followers,
+                "coalescing_ratio": round(self.followers / total, 4) if total else 0.0,
+                "errors": self.errors,
+                "retries": self.retries,
+                "timeouts": self.timeouts
+            }
@@ -0,0 +1,272 @@
+"""
+快取預熱 - 啟動時與資料匯入後，以低優先權的執行緒池預先計算前端請求的地圖 bundle（涵蓋所有 frame）
+
+預熱不排擠真實流量：最多只佔回應快取容量的 WARMUP_CACHE_FRACTION，寫入時放在 LRU 最舊的一端，
+准入控制中只使用空閒名額、不排隊（忙碌時稍後重試）
+另有一個執行緒每 DATASET_VERSION_INTERVAL 秒重新計算資料集版本，請求路徑只讀取快取的版本
+"""
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from flask import has_request_context, request
+
+# 預熱請求在 WSGI environ 中的標記（外部請求無法設定非 HTTP_ 開頭的 environ）
+WARMUP_ENVIRON_KEY = 'app.warmup'
+
+# 與前端 MapSection 的 TIME_BUNDLE_URL / VEG_BUNDLE_URL 完全相同的查詢字串（快取鍵包含查詢參數）
+TIME_BUNDLE_QUERY = 'types=Temperature&months=1-12'
+VEG_BUNDLE_QUERY = 'types=Temperature_Predicted&veg=0:1:0.01'
+
+
+def is_warmup_request():
+    return has_request_context() and bool(request.environ.get(WARMUP_ENVIRON_KEY))
+
+
+def _lower_thread_priority():
+    """把 worker 執行緒的 nice 值調到最低優先權（僅 Linux 支援以執行緒為單位）"""
+    try:
+        os.setpriority(os.PRIO_PROCESS, threading.get_native_id(), 19)
+    except (AttributeError, OSError):
+        pass
+
+
+class WarmupScheduler:
+    """以前端實際請求的 bundle 網址（每年一包、每個 NDVI 月份一包）背景預先寫入回應快取"""
+
+    def __init__(self, app=None):
+        self.app = None
+        self._lock = threading.Lock()
+        self._thread = None
+        self._version_thread = None
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+        self._pending_history = set()
+        self._pending_ndvi = set()
+        self._fingerprints = None
+        self.state = "idle"
+        self.total = 0
+        self.done = 0
+        self.failed = 0
+        self.skipped = 0
+        self.skipped_urls = []
+        self.deferred = 0
+        self.runs = 0
+        self.last_run_seconds = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        app.extensions['warmup'] = self
+        if not app.config.get('WARMUP_ENABLED', True) or app.testing:
+            return
+        # debug 模式的 reloader 父程序不做預熱
+        if app.debug and os.environ.get('WERKZEUG_RUN_MAIN') != 'true':
+            return
+        self.start()
+
+    # ---------- 設定 ----------
+
+    def _config(self, name, default):
+        return self.app.config.get(name, default)
+
+    def bundle_queries(self):
+        """(時間模式, 植被模式) 的 bundle 查詢字串"""
+        return (self._config('WARMUP_TIME_BUNDLE_QUERY', TIME_BUNDLE_QUERY),
+                self._config('WARMUP_VEG_BUNDLE_QUERY', VEG_BUNDLE_QUERY))
+
+    # ---------- 排程 ----------
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='cache-warmup', daemon=True)
+        self._thread.start()
+        if self._version_thread is None or not self._version_thread.is_alive():
+            self._version_thread = threading.Thread(target=self._poll_version, name='dataset-version', daemon=True)
+            self._version_thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+
+    def refresh(self, history_periods=None, ndvi_months=None):
+        """
+        資料匯入後呼叫：讓指定期間的快取失效並重新預熱
+        history_periods: [(year, month), ...]；ndvi_months: [month, ...]
+        """
+        with self._lock:
+            self._pending_history.update(tuple(p) for p in history_periods or [])
+            self._pending_ndvi.update(ndvi_months or [])
+        self._wake.set()
+
+    def _run(self):
+        from app.dataset import period_fingerprints, diff_fingerprints, fingerprint_version, set_dataset_version
+
+        if self._stop.wait(self._config('WARMUP_DELAY', 5)):
+            return
+        interval = self._config('WARMUP_POLL_INTERVAL', 300)
+
+        # 先把已發布的模型載入並觸碰分頁
+        registry = self.app.extensions.get('model_registry')
+        if registry is not None:
+            try:
+                registry.warm()
+            except Exception as e:
+                self.state = f"error: {e}"
+
+        while not self._stop.is_set():
+            try:
+                with self.app.app_context():
+                    fingerprints = period_fingerprints()
+                set_dataset_version(fingerprint_version(fingerprints))
+
+                if self._fingerprints is None:
+                    # 第一次：全部預熱
+                    history = sorted(fingerprints["history"])
+                    ndvi = sorted(fingerprints["ndvi"])
+                else:
+                    history, ndvi = diff_fingerprints(self._fingerprints, fingerprints)
+                self._fingerprints = fingerprints
+
+                with self._lock:
+                    history = sorted(set(history) | self._pending_history)
+                    ndvi = sorted(set(ndvi) | self._pending_ndvi)
+                    self._pending_history.clear()
+                    self._pending_ndvi.clear()
+
+                if history or ndvi:
+                    if self.runs:
+                        self._invalidate(history, ndvi)
+                    self._warm(self._urls(history, ndvi))
+            except Exception as e:
+                self.state = f"error: {e}"
+
+            self._wake.wait(interval)
+            self._wake.clear()
+
+    def _poll_version(self):
+        """定期更新資料集版本（取代請求路徑上的指紋查詢）；版本改變時提早喚醒預熱"""
+        from app.dataset import (VERSION_TTL, fingerprint_version, period_fingerprints,
+                                 set_background_refresh, set_dataset_version)
+
+        interval = self._config('DATASET_VERSION_INTERVAL', VERSION_TTL)
+        set_background_refresh(True)
+        last = None
+        try:
+            while not self._stop.is_set():
+                try:
+                    with self.app.app_context():
+                        version = fingerprint_version(period_fingerprints())
+                    set_dataset_version(version)
+                    if last is not None and version != last:
+                        self._wake.set()
+                    last = version
+                except Exception:
+                    pass  # 保留上一個版本，下次再試
+                self._stop.wait(interval)
+        finally:
+            set_background_refresh(False)
+
+    def _invalidate(self, history, ndvi):
+        cache = self.app.extensions['response_cache']
+        for year, month in history:
+            cache.invalidate('main.get_temperature_map', year=year, month=month)
+            cache.invalidate('main.get_temperature_map_bundle', year=year)
+            cache.invalidate('main.get_yearly_weather_data', year=year)
+            cache.invalidate('main.get_yearly_temperature_data', year=year)
+        for month in ndvi:
+            cache.invalidate('main.get_ndvi_temperature_map', month=month)
+            cache.invalidate('main.get_ndvi_temperature_map_bundle', month=month)
+            cache.invalidate('main.get_ndvi_vegetation_data', month=month)
+        if ndvi:
+            cache.invalidate('main.get_ndvi_yearly_data')
+        if history:
+            # 預測模型以全部歷史資料擬合，任何期間變動都會改變預測
+            cache.invalidate('predict_future_climate.get_forecast_map')
+            cache.invalidate('predict_future_climate.get_forecast_series')
+
+    def _urls(self, history, ndvi):
+        """
+        每個有變動的年份一個時間 bundle、每個有變動的 NDVI 月份一個植被 bundle，
+        一包涵蓋該年 12 個月 / 該月所有覆蓋率，與 MapSection 的請求完全相同
+        """
+        time_query, veg_query = self.bundle_queries()
+        # 最新的年份優先；快取容量不足時被略過的是最舊的年份
+        urls = [f'/formap/bundle/{year}?{time_query}'
+                for year in sorted({year for year, _ in history}, reverse=True)]
+        urls += [f'/formap/NDVI/bundle/{month}?{veg_query}' for month in sorted(ndvi)]
+        return urls
+
+    def _warm(self, urls):
+        # 只預熱快取容量的一部分，其餘留給真實流量
+        capacity = int(self.app.extensions['response_cache'].max_entries * self._config('WARMUP_CACHE_FRACTION', 0.5))
+        skipped = urls[capacity:]
+        urls = urls[:capacity]
+        if skipped:
+            self.app.logger.warning(
+                "Warm-up skipped %d URLs beyond %d cache entries (raise RESPONSE_CACHE_MAX_ENTRIES "
+                "or WARMUP_CACHE_FRACTION): %s", len(skipped), capacity, ', '.join(skipped))
+        with self._lock:
+            self.state = "running"
+            self.total = len(urls)
+            self.done = 0
+            self.failed = 0
+            self.skipped = len(skipped)
+            self.skipped_urls = skipped
+            self.deferred = 0
+
+        started = time.monotonic()
+        pause = self._config('WARMUP_PAUSE', 0.05)
+        busy_pause = self._config('WARMUP_BUSY_PAUSE', 1.0)
+        retries = self._config('WARMUP_BUSY_RETRIES', 5)
+        client = self.app.test_client()
+
+        def warm_one(url):
+            if self._stop.is_set():
+                return
+            status = None
+            try:
+                # 准入控制忙碌時回傳 503，等一下再試
+                for attempt in range(retries + 1):
+                    status = client.get(url, environ_overrides={WARMUP_ENVIRON_KEY: True}).status_code
+                    if status != 503 or self._stop.wait(busy_pause * (attempt + 1)):
+                        break
+            except Exception:
+                status = None
+            with self._lock:
+                if status in (200, 404):
+                    self.done += 1
+                elif status == 503:
+                    self.deferred += 1
+                else:
+                    self.failed += 1
+            time.sleep(pause)
+
+        workers = self._config('WARMUP_WORKERS', 2)
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='cache-warmup',
+                                initializer=_lower_thread_priority) as pool:
+            list(pool.map(warm_one, urls))
+
+        with self._lock:
+            self.runs += 1
+            self.last_run_seconds = round(time.monotonic() - started, 2)
+            self.state = "idle"
+
+    def stats(self):
+        with self._lock:
+            return {
+                "state": self.state,
+                "total": self.total,
+                "done": self.done,
+                "failed": self.failed,
+                "skipped": self.skipped,
+                "skipped_urls": list(self.skipped_urls),
+                "deferred": self.deferred,
+                "progress": round(self.done / self.total, 4) if self.total else 1.0,
+                "runs": self.runs,
+                "last_run_seconds": self.last_run_seconds
+            }
@@ -18,3 +18,45 @@ class Config:
     SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL') or \
         f'mysql+pymysql://{MYSQL_USER}:{MYSQL_PASSWORD}@{MYSQL_HOST}:{MYSQL_PORT}/{MYSQL_DATABASE}'
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+
+    # 回應快取與預先壓縮
+    RESPONSE_CACHE_MAX_ENTRIES = int(os.environ.get('RESPONSE_CACHE_MAX_ENTRIES') or 512)
+    RESPONSE_CACHE_TTL = int(os.environ.get('RESPONSE_CACHE_TTL') or 3600)
+    RESPONSE_CACHE_MIN_COMPRESS_SIZE = int(os.environ.get('RESPONSE_CACHE_MIN_COMPRESS_SIZE') or 512)
+
+    # 相同請求合併：等待進行中計算的最長秒數
+    SINGLEFLIGHT_TIMEOUT = float(os.environ.get('SINGLEFLIGHT_TIMEOUT') or 30)
+
+    # 快取預熱：啟動後與偵測到資料匯入時預先計算地圖 frame
+    WARMUP_ENABLED = (os.environ.get('WARMUP_ENABLED') or 'true').lower() in ('1', 'true', 'yes')
+    WARMUP_WORKERS = int(os.environ.get('WARMUP_WORKERS') or 2)
+    WARMUP_DELAY = float(os.environ.get('WARMUP_DELAY') or 5)
+    WARMUP_POLL_INTERVAL = float(os.environ.get('WARMUP_POLL_INTERVAL') or 300)
+    # 預熱最多佔用的回應快取比例，其餘留給真實流量
+    WARMUP_CACHE_FRACTION = float(os.environ.get('WARMUP_CACHE_FRACTION') or 0.5)
+    # 背景重新計算資料集版本的間隔（秒），請求路徑只讀取快取的版本
+    DATASET_VERSION_INTERVAL = float(os.environ.get('DATASET_VERSION_INTERVAL') or 30)
+
+    # 預測 micro-batching：收集並行請求的最長等待毫秒數與單批最多列數
+    PREDICT_BATCH_WAIT_MS = float(os.environ.get('PREDICT_BATCH_WAIT_MS') or 5)
+    PREDICT_BATCH_MAX_ROWS = int(os.environ.get('PREDICT_BATCH_MAX_ROWS') or 65536)
+
+    # 模型註冊表：版本化的模型檔案（mmap 載入）
+    MODEL_REGISTRY_DIR = os.environ.get('MODEL_REGISTRY_DIR') or os.path.join(basedir, 'model_registry')
+    MODEL_REGISTRY_CHECK_INTERVAL = float(os.environ.get('MODEL_REGISTRY_CHECK_INTERVAL') or 5)
+
+    # 背景工作佇列：執行緒數、排隊上限、結果保存秒數與最多保留的已完成工作數
+    JOB_WORKERS = int(os.environ.get('JOB_WORKERS') or 2)
+    JOB_MAX_PENDING = int(os.environ.get('JOB_MAX_PENDING') or 32)
+    JOB_RESULT_TTL = int(os.environ.get('JOB_RESULT_TTL') or 3600)
+    JOB_MAX_RETAINED = int(os.environ.get('JOB_MAX_RETAINED') or 100)
+
+    # 准入控制：各路由池的並行上限與等待佇列（格式 map=8:32,ndvi_map=4:16,compute=4:8）
+    ADMISSION_ENABLED = (os.environ.get('ADMISSION_ENABLED') or 'true').lower() in ('1', 'true', 'yes')
+    ADMISSION_POOLS = os.environ.get('ADMISSION_POOLS') or 'map=8:32,ndvi_map=4:16,compute=4:8'
+    ADMISSION_QUEUE_TIMEOUT = float(os.environ.get('ADMISSION_QUEUE_TIMEOUT') or 2)
+    ADMISSION_RETRY_AFTER = int(os.environ.get('ADMISSION_RETRY_AFTER') or 2)
+
+    # API bearer token 有效秒數與 session 使用者快取秒數
+    AUTH_TOKEN_TTL = int(os.environ.get('AUTH_TOKEN_TTL') or 3600)
+    AUTH_USER_CACHE_TTL = int(os.environ.get('AUTH_USER_CACHE_TTL') or 300)
\ No newline at end of file
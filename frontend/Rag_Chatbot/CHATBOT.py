@@ -1,12 +1,22 @@
 """
 超輕量 Flask 應用 - 清晰易懂的路由管理
 """
+import time
+_process_started = time.perf_counter()
+
+import json
 import os
-from flask import Flask, request, jsonify, send_from_directory, redirect
+import sys
+from flask import Flask, Response, request, jsonify, send_from_directory, redirect, stream_with_context
 from flask_cors import CORS
 from dotenv import load_dotenv
 from simple_rag import SimpleRAG
-import requests
+from admission import ConcurrencyLimiter
+from startup_timer import StartupTimer
+
+# 啟動各階段耗時（/status 也會回傳）
+startup = StartupTimer(_process_started)
+startup.mark("匯入模組")
 
 # 載入環境變數
 load_dotenv()
@@ -23,13 +33,19 @@ CORS(CHATBOT,
 # 全域 RAG 系統
 rag_system = None
 
+# /chat 准入控制：同時呼叫 LLM 的請求數上限與等待佇列
+# （CHAT_MAX_CONCURRENCY / CHAT_MAX_QUEUE / CHAT_QUEUE_TIMEOUT / CHAT_RETRY_AFTER）
+chat_limiter = ConcurrencyLimiter.from_env(
+    "chat", "CHAT", limit=4, queue_size=8, queue_timeout=10, retry_after=5
+)
+
 def init_system():
     """初始化 RAG 系統"""
     global rag_system
     
-    # 檢查 API 金鑰
+    # 檢查 API 金鑰（本機假模型不需要）
     api_key = os.getenv("GOOGLE_API_KEY")
-    if not api_key:
+    if not api_key and os.getenv("LLM_BACKEND", "gemini") != "fake":
         print("❌ 錯誤: 請在 .env 檔案中設置 GOOGLE_API_KEY")
         return False
     
@@ -39,14 +55,21 @@ def init_system():
     rag_system = SimpleRAG(api_key)
     
     # 載入語言模型
-    if not rag_system.load_llm():
-        return False
+    with startup.phase("載入語言模型"):
+        if not rag_system.load_llm():
+            return False
     
-    # 載入向量資料庫
-    if not rag_system.load_vectorstore():
-        print("⚠️  向量資料庫未找到，請先運行 simple_vectorstore.py 建立資料庫")
-        return False
+    # 載入向量資料庫（mmap，不載入編碼模型）
+    with startup.phase("載入向量資料庫"):
+        if not rag_system.load_vectorstore():
+            print("⚠️  向量資料庫未找到，請先運行 simple_vectorstore.py 建立資料庫")
+            return False
+    
+    # 編碼模型只載入這一次，之後所有查詢共用
+    with startup.phase("載入編碼模型"):
+        rag_system.warm_encoder()
     
+    startup.report()
     print("✅ RAG 系統初始化完成！")
     return True
 
@@ -63,6 +86,7 @@ def home():
         "version": "1.0.0",
         "endpoints": {
             "chat": "/chat",
+            "chat_stream": "/chat/stream",
             "status": "/status", 
             "clear": "/clear"
         }
@@ -77,7 +101,29 @@ def health_check():
         "timestamp": "2025-08-16"
     })
 
+def parse_chat_request():
+    """讀取並驗證聊天請求，回傳 (message, session_id, 錯誤回應或 None)"""
+    data = request.get_json()
+    message = data.get('message', '').strip()
+    session_id = data.get('session_id', 'default')
+    
+    # 驗證訊息
+    if not message:
+        return message, session_id, (jsonify({
+            "success": False,
+            "error": "訊息不能為空"
+        }), 400)
+    
+    if len(message) > 500:
+        return message, session_id, (jsonify({
+            "success": False,
+            "error": "訊息長度不能超過 500 字"
+        }), 400)
+    
+    return message, session_id, None
+
 @CHATBOT.route('/chat', methods=['POST'])
+@chat_limiter.limit_route
 def chat():
     """聊天 API - 處理用戶訊息"""
     # 檢查系統狀態
@@ -89,22 +135,9 @@ def chat():
     
     # 獲取請求數據
     try:
-        data = request.get_json()
-        message = data.get('message', '').strip()
-        session_id = data.get('session_id', 'default')
-        
-        # 驗證訊息
-        if not message:
-            return jsonify({
-                "success": False,
-                "error": "訊息不能為空"
-            }), 400
-        
-        if len(message) > 500:
-            return jsonify({
-                "success": False,
-                "error": "訊息長度不能超過 500 字"
-            }), 400
+        message, session_id, error = parse_chat_request()
+        if error:
+            return error
         
         # 處理聊天
         result = rag_system.chat(message, session_id)
@@ -116,6 +149,46 @@ def chat():
             "error": f"處理請求時發生錯誤: {str(e)}"
         }), 500
 
+@CHATBOT.route('/chat/stream', methods=['POST'])
+def chat_stream():
+    """
+    串流聊天 API（Server-Sent Events）
+    先送出 meta（參考來源數、是否命中快取），再逐段送出 token，最後送出 done（完整回答）或 error
+    """
+    if not rag_system or not rag_system.is_ready():
+        return jsonify({
+            "success": False,
+            "error": "系統未準備就緒"
+        }), 503
+    
+    try:
+        message, session_id, error = parse_chat_request()
+    except Exception as e:
+        return jsonify({
+            "success": False,
+            "error": f"處理請求時發生錯誤: {str(e)}"
+        }), 500
+    if error:
+        return error
+    
+    # 名額在串流結束（或連線關閉）時才釋放，不是 view 回傳時
+    if not chat_limiter.acquire():
+        return chat_limiter.busy_response()
+    
+    def events():
+        for event, payload in rag_system.chat_stream(message, session_id):
+            yield f"event: {event}\ndata: {json.dumps(payload, ensure_ascii=False)}\n\n"
+    
+    try:
+        response = Response(stream_with_context(events()), mimetype='text/event-stream')
+        response.headers['Cache-Control'] = 'no-cache'
+        response.headers['X-Accel-Buffering'] = 'no'  # 避免反向代理緩衝整個回應
+        response.call_on_close(chat_limiter.release)
+        return response
+    except Exception:
+        chat_limiter.release()
+        raise
+
 @CHATBOT.route('/clear', methods=['POST'])
 def clear_history():
     """清除對話歷史"""
@@ -150,7 +223,15 @@ def status():
     return jsonify({
         "ready": rag_system.is_ready(),
         "llm_loaded": rag_system.llm is not None,
-        "vectorstore_loaded": rag_system.vectorstore is not None
+        "vectorstore_loaded": rag_system.vectorstore is not None,
+        "index": rag_system.vectorstore.index_info() if rag_system.vectorstore is not None else None,
+        "admission": chat_limiter.stats(),
+        "answer_cache": rag_system.answer_cache.stats(),
+        "sessions": rag_system.sessions.stats(),
+        "context": rag_system.context_assembler.stats(),
+        "query_batcher": rag_system.vectorstore.query_batcher.stats()
+        if rag_system.vectorstore is not None and rag_system.vectorstore.query_batcher is not None else None,
+        "startup": startup.as_dict()
     })
 
 # ================================
@@ -180,12 +261,18 @@ if __name__ == '__main__':
         print("📱 前端地址: http://localhost:3000 (由 Next.js 提供)")
         print("🛑 按 Ctrl+C 停止服務\n")
         
-        CHATBOT.run(
-            host='0.0.0.0',
-            port=5001,
-            debug=True,
-            threaded=True
-        )
+        if "--async" in sys.argv or os.getenv("CHATBOT_SERVER") == "async":
+            # 非同步模式：對話在事件迴圈上等待 LLM，不佔用執行緒
+            from async_server import create_async_app
+            print("⚡ 非同步模式 (Quart + Hypercorn)")
+            create_async_app(rag_system, startup).run(host='0.0.0.0', port=5001, use_reloader=False)
+        else:
+            CHATBOT.run(
+                host='0.0.0.0',
+                port=5001,
+                debug=True,
+                threaded=True
+            )
     else:
         print("\n❌ 系統初始化失敗，無法啟動服務")
         print("\n📋 請檢查:")
@@ -2,7 +2,7 @@
 專門用來添加 TypeScript React 文件到向量數據庫的腳本
 """
 import os
-from simple_vectorstore import SimpleVectorStore, DocumentProcessor
+from simple_vectorstore import SimpleVectorStore, DocumentProcessor, DEFAULT_STORE_PATH
 
 def add_tsx_file_to_vectorstore():
     """將 index.tsx 文件添加到向量數據庫"""
@@ -23,7 +23,7 @@ def add_tsx_file_to_vectorstore():
         vectorstore = SimpleVectorStore()
         
         # 嘗試載入現有的向量庫
-        vectorstore_path = "vectorstore.pkl"
+        vectorstore_path = DEFAULT_STORE_PATH
         if os.path.exists(vectorstore_path):
             print("📂 載入現有向量庫...")
             vectorstore.load(vectorstore_path)
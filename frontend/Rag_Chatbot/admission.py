@@ -0,0 +1,118 @@
+"""
+准入控制 - 限制同時呼叫 LLM 的請求數，多出的請求在有限佇列中等待，
+佇列已滿或等待逾時時立即回傳 503 + Retry-After
+"""
+import os
+import threading
+import time
+from functools import wraps
+from typing import Dict
+
+from flask import jsonify
+
+
+class ConcurrencyLimiter:
+    """
+    並行上限 + 有限等待佇列
+    等待邏輯與 backend/app/admission.py 的 Pool 刻意保持相同（兩個服務分開部署，不共用程式碼），修改時兩邊一起改
+    """
+
+    def __init__(self, name: str, limit: int, queue_size: int, queue_timeout: float, retry_after: int):
+        self.name = name
+        self.limit = limit
+        self.queue_size = queue_size
+        self.queue_timeout = queue_timeout
+        self.retry_after = retry_after
+        self.active = 0
+        self.waiting = 0
+        self.admitted = 0
+        self.rejected = 0
+        self.timed_out = 0
+        self.peak_active = 0
+        self.total_wait = 0.0
+        self._cond = threading.Condition()
+
+    @classmethod
+    def from_env(cls, name: str, prefix: str, limit: int, queue_size: int, queue_timeout: float, retry_after: int):
+        """從環境變數讀取設定，例如 CHAT_MAX_CONCURRENCY、CHAT_MAX_QUEUE"""
+        return cls(
+            name,
+            int(os.getenv(f"{prefix}_MAX_CONCURRENCY", limit)),
+            int(os.getenv(f"{prefix}_MAX_QUEUE", queue_size)),
+            float(os.getenv(f"{prefix}_QUEUE_TIMEOUT", queue_timeout)),
+            int(os.getenv(f"{prefix}_RETRY_AFTER", retry_after))
+        )
+
+    def acquire(self) -> bool:
+        """取得名額；佇列已滿或等待逾時回傳 False"""
+        started = time.monotonic()
+        with self._cond:
+            if self.active < self.limit and self.waiting == 0:
+                self._admit()
+                return True
+            if self.waiting >= self.queue_size:
+                self.rejected += 1
+                return False
+
+            self.waiting += 1
+            deadline = started + self.queue_timeout
+            try:
+                while self.active >= self.limit:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self.timed_out += 1
+                        # 逾時的等待者可能剛好消耗了 release 的通知，轉交給下一個等待者，避免有空位卻沒有人被喚醒
+                        self._cond.notify()
+                        return False
+                    self._cond.wait(remaining)
+            finally:
+                self.waiting -= 1
+            self._admit()
+            self.total_wait += time.monotonic() - started
+        return True
+
+    def _admit(self):
+        self.active += 1
+        self.admitted += 1
+        self.peak_active = max(self.peak_active, self.active)
+
+    def release(self):
+        with self._cond:
+            self.active -= 1
+            self._cond.notify()
+
+    def busy_response(self):
+        """名額不足時的 503 + Retry-After 回應"""
+        response = jsonify({
+            "success": False,
+            "error": "伺服器忙碌中，請稍後再試"
+        })
+        response.status_code = 503
+        response.headers['Retry-After'] = str(self.retry_after)
+        return response
+
+    def limit_route(self, view):
+        """Flask 路由裝飾器：名額不足時回傳 503 + Retry-After"""
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if not self.acquire():
+                return self.busy_response()
+            try:
+                return view(*args, **kwargs)
+            finally:
+                self.release()
+        return wrapper
+
+    def stats(self) -> Dict:
+        with self._cond:
+            return {
+                "limit": self.limit,
+                "queue_size": self.queue_size,
+                "active": self.active,
+                "waiting": self.waiting,
+                "peak_active": self.peak_active,
+                "admitted": self.admitted,
+                "rejected": self.rejected,
+                "timed_out": self.timed_out,
+                "avg_wait_ms": round(self.total_wait / self.admitted * 1000, 2) if self.admitted else 0.0
+            }
@@ -0,0 +1,216 @@
+"""
+語意回答快取 - 問題的向量與已快取的問題夠相近、且向量庫版本相同時，直接回傳先前的回答，不呼叫 LLM
+
+以問題向量（已正規化）做內積比對；容量有上限（LRU 淘汰）、每筆有存活時間，
+並定期寫入磁碟（.npz），重新啟動後仍然有效
+"""
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional
+
+import numpy as np
+
+
+class SemanticAnswerCache:
+    """以問題向量相似度查詢的 LRU + TTL 回答快取"""
+
+    def __init__(self, threshold: float = 0.92, max_size: int = 1024, ttl: float = 86400,
+                 path: Optional[str] = None, flush_interval: float = 30, enabled: bool = True):
+        """
+        threshold: 內積（cosine）至少達到此值才視為同一個問題
+        max_size: 最多保留的回答數；ttl: 每筆回答的存活秒數
+        path: 持久化檔案（None 表示不寫入磁碟）；flush_interval: 兩次寫入的最短間隔秒數
+        """
+        self.threshold = threshold
+        self.max_size = max_size
+        self.ttl = ttl
+        self.path = path
+        self.flush_interval = flush_interval
+        self.enabled = enabled
+        self.model_name = None
+        self._entries: "OrderedDict[int, Dict]" = OrderedDict()  # id -> 回答（最後一個最近使用）
+        self._vectors: Dict[int, np.ndarray] = {}
+        self._matrix = None  # 依 _ids 順序堆疊的向量，查詢時才重建
+        self._ids = []
+        self._next_id = 0
+        self._dirty = False
+        self._last_flush = time.monotonic()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+        self.expired = 0
+        self.evictions = 0
+        self.saved_seconds = 0.0  # 命中時省下的生成時間
+
+    @classmethod
+    def from_env(cls, path: str = "answer_cache.npz"):
+        """從環境變數讀取設定：ANSWER_CACHE_ENABLED、ANSWER_CACHE_THRESHOLD、ANSWER_CACHE_SIZE、
+        ANSWER_CACHE_TTL、ANSWER_CACHE_PATH、ANSWER_CACHE_FLUSH_SECONDS"""
+        return cls(
+            threshold=float(os.getenv("ANSWER_CACHE_THRESHOLD", 0.92)),
+            max_size=int(os.getenv("ANSWER_CACHE_SIZE", 1024)),
+            ttl=float(os.getenv("ANSWER_CACHE_TTL", 86400)),
+            path=os.getenv("ANSWER_CACHE_PATH", path) or None,
+            flush_interval=float(os.getenv("ANSWER_CACHE_FLUSH_SECONDS", 30)),
+            enabled=os.getenv("ANSWER_CACHE_ENABLED", "true").lower() not in ("0", "false", "no")
+        )
+
+    def lookup(self, vector: np.ndarray, version: int) -> Optional[Dict]:
+        """vector 為已正規化的問題向量；命中時回傳 {query, answer, sources, similarity}"""
+        if not self.enabled:
+            return None
+        vector = np.asarray(vector, dtype=np.float32).reshape(-1)
+        now = time.time()
+        with self._lock:
+            if not self._entries:
+                self.misses += 1
+                return None
+            if self._matrix is None:
+                self._ids = list(self._vectors)
+                self._matrix = np.stack([self._vectors[i] for i in self._ids])
+            if self._matrix.shape[1] != len(vector):
+                self.misses += 1
+                return None
+
+            similarities = self._matrix @ vector
+            for position in np.argsort(-similarities):
+                similarity = float(similarities[position])
+                if similarity < self.threshold:
+                    break
+                entry_id = self._ids[position]
+                entry = self._entries[entry_id]
+                if now - entry["created"] > self.ttl:
+                    self._remove(entry_id)
+                    self.expired += 1
+                    continue
+                if entry["version"] != version:
+                    # 向量庫已更新，舊回答可能引用過時的文檔
+                    self._remove(entry_id)
+                    self.stale += 1
+                    continue
+                self._entries.move_to_end(entry_id)
+                entry["hits"] += 1
+                self.hits += 1
+                self.saved_seconds += entry["seconds"]
+                return {
+                    "query": entry["query"],
+                    "answer": entry["answer"],
+                    "sources": entry["sources"],
+                    "similarity": round(similarity, 4)
+                }
+            self.misses += 1
+            return None
+
+    def store(self, vector: np.ndarray, query: str, answer: str, sources: int, version: int,
+              seconds: float = 0.0):
+        """加入一筆回答；seconds 為生成花費的時間（命中時計入省下的時間）"""
+        if not self.enabled:
+            return
+        with self._lock:
+            entry_id = self._next_id
+            self._next_id += 1
+            self._entries[entry_id] = {
+                "query": query,
+                "answer": answer,
+                "sources": sources,
+                "version": version,
+                "created": time.time(),
+                "seconds": seconds,
+                "hits": 0
+            }
+            self._vectors[entry_id] = np.asarray(vector, dtype=np.float32).reshape(-1).copy()
+            self._matrix = None
+            while len(self._entries) > self.max_size:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+            self._dirty = True
+        self.maybe_flush()
+
+    def _remove(self, entry_id: int):
+        del self._entries[entry_id]
+        del self._vectors[entry_id]
+        self._matrix = None
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._vectors.clear()
+            self._matrix = None
+            self._dirty = True
+        self.flush()
+
+    # ---------- 持久化 ----------
+
+    def maybe_flush(self):
+        """距離上次寫入超過 flush_interval 才寫入"""
+        if time.monotonic() - self._last_flush >= self.flush_interval:
+            self.flush()
+
+    def flush(self):
+        """寫入磁碟（先寫暫存檔再替換）"""
+        if not self.path:
+            return
+        with self._lock:
+            self._last_flush = time.monotonic()
+            if not self._dirty:
+                return
+            ids = list(self._entries)
+            meta = {"model_name": self.model_name, "entries": [self._entries[i] for i in ids]}
+            vectors = np.stack([self._vectors[i] for i in ids]) if ids else np.zeros((0, 0), dtype=np.float32)
+            self._dirty = False
+        temp_path = f"{self.path}.tmp.npz"
+        try:
+            np.savez(temp_path, vectors=vectors, meta=np.array(json.dumps(meta, ensure_ascii=False)))
+            os.replace(temp_path, self.path)
+        except OSError as e:
+            print(f"⚠️ 回答快取寫入失敗: {e}")
+
+    def load(self, model_name: Optional[str] = None) -> int:
+        """讀取磁碟上的快取；編碼模型不同或已過期的回答會略過，回傳載入的筆數"""
+        self.model_name = model_name
+        if not self.path or not os.path.exists(self.path):
+            return 0
+        try:
+            with np.load(self.path, allow_pickle=False) as data:
+                vectors = data["vectors"]
+                meta = json.loads(str(data["meta"]))
+        except Exception as e:
+            print(f"⚠️ 回答快取讀取失敗，略過: {e}")
+            return 0
+        if model_name and meta.get("model_name") not in (None, model_name):
+            return 0
+
+        now = time.time()
+        with self._lock:
+            for vector, entry in zip(vectors, meta["entries"]):
+                if now - entry["created"] > self.ttl:
+                    continue
+                entry_id = self._next_id
+                self._next_id += 1
+                self._entries[entry_id] = entry
+                self._vectors[entry_id] = np.asarray(vector, dtype=np.float32)
+            while len(self._entries) > self.max_size:
+                self._remove(next(iter(self._entries)))
+            self._matrix = None
+            return len(self._entries)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "enabled": self.enabled,
+                "entries": len(self._entries),
+                "max_size": self.max_size,
+                "threshold": self.threshold,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "stale": self.stale,
+                "expired": self.expired,
+                "evictions": self.evictions,
+                "saved_seconds": round(self.saved_seconds, 2)
+            }
@@ -0,0 +1,332 @@
+"""
+非同步服務模式 - /chat、/chat/stream、/status、/clear 在事件迴圈上執行（Quart + Hypercorn）
+
+等待 LLM 回應時不佔用執行緒：LLM 以 ainvoke / astream 等待，每次呼叫都有逾時，
+同時進行的對話數由 AsyncLLMGate 限制；編碼與檢索等 CPU 工作交給小型執行緒池
+（併發的查詢仍由 QueryBatcher 合併成批次）。數百個對話只需要幾個執行緒
+
+啟動：python CHATBOT.py --async（或 CHATBOT_SERVER=async）
+"""
+import asyncio
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict
+
+from quart import Quart, Response, jsonify, request
+
+# 與 CHATBOT.py 的 CORS 設定相同
+ALLOWED_ORIGINS = ["http://localhost:3000", "http://127.0.0.1:3000"]
+
+
+class GateBusy(Exception):
+    """等待佇列已滿或等待逾時"""
+
+
+class AsyncLLMGate:
+    """非同步的並行上限 + 有限等待佇列，以及 LLM 呼叫逾時"""
+
+    def __init__(self, limit: int = 64, queue_size: int = 256, queue_timeout: float = 10,
+                 timeout: float = 30, retry_after: int = 5):
+        """
+        limit: 同時進行的對話數；queue_size / queue_timeout: 等待佇列長度與最長等待秒數
+        timeout: 每次 LLM 呼叫（串流為整段回答）的逾時秒數
+        """
+        self.limit = limit
+        self.queue_size = queue_size
+        self.queue_timeout = queue_timeout
+        self.timeout = timeout
+        self.retry_after = retry_after
+        self._semaphore = None  # 在事件迴圈中建立
+        self.active = 0
+        self.waiting = 0
+        self.peak_active = 0
+        self.admitted = 0
+        self.rejected = 0
+        self.timed_out = 0
+        self.llm_calls = 0
+        self.llm_timeouts = 0
+        self.llm_seconds = 0.0
+
+    @classmethod
+    def from_env(cls):
+        """從環境變數讀取設定：ASYNC_CHAT_MAX_CONCURRENCY、ASYNC_CHAT_MAX_QUEUE、
+        ASYNC_CHAT_QUEUE_TIMEOUT、LLM_TIMEOUT、CHAT_RETRY_AFTER"""
+        return cls(
+            limit=int(os.getenv("ASYNC_CHAT_MAX_CONCURRENCY", 64)),
+            queue_size=int(os.getenv("ASYNC_CHAT_MAX_QUEUE", 256)),
+            queue_timeout=float(os.getenv("ASYNC_CHAT_QUEUE_TIMEOUT", 10)),
+            timeout=float(os.getenv("LLM_TIMEOUT", 30)),
+            retry_after=int(os.getenv("CHAT_RETRY_AFTER", 5))
+        )
+
+    async def acquire(self):
+        """取得名額；佇列已滿或等待逾時拋出 GateBusy"""
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.limit)
+        if self._semaphore.locked() and self.waiting >= self.queue_size:
+            self.rejected += 1
+            raise GateBusy()
+        self.waiting += 1
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), self.queue_timeout)
+        except asyncio.TimeoutError:
+            self.timed_out += 1
+            raise GateBusy()
+        finally:
+            self.waiting -= 1
+        self.active += 1
+        self.admitted += 1
+        self.peak_active = max(self.peak_active, self.active)
+
+    def release(self):
+        self.active -= 1
+        self._semaphore.release()
+
+    @asynccontextmanager
+    async def admit(self):
+        await self.acquire()
+        try:
+            yield
+        finally:
+            self.release()
+
+    async def invoke(self, llm, prompt: str) -> str:
+        """等待完整回答；超過 timeout 拋出 asyncio.TimeoutError"""
+        started = time.perf_counter()
+        self.llm_calls += 1
+        try:
+            if hasattr(llm, "ainvoke"):
+                message = await asyncio.wait_for(llm.ainvoke(prompt), self.timeout)
+            else:
+                message = await asyncio.wait_for(asyncio.to_thread(llm.invoke, prompt), self.timeout)
+        except asyncio.TimeoutError:
+            self.llm_timeouts += 1
+            raise
+        finally:
+            self.llm_seconds += time.perf_counter() - started
+        return message.content
+
+    async def stream(self, llm, prompt: str) -> AsyncIterator[str]:
+        """逐段產生回答；整段回答超過 timeout 拋出 asyncio.TimeoutError"""
+        if not hasattr(llm, "astream"):
+            yield await self.invoke(llm, prompt)
+            return
+        started = time.perf_counter()
+        deadline = started + self.timeout
+        self.llm_calls += 1
+        chunks = llm.astream(prompt).__aiter__()
+        try:
+            while True:
+                try:
+                    chunk = await asyncio.wait_for(chunks.__anext__(), deadline - time.perf_counter())
+                except StopAsyncIteration:
+                    break
+                except asyncio.TimeoutError:
+                    self.llm_timeouts += 1
+                    raise
+                if chunk.content:
+                    yield chunk.content
+        finally:
+            self.llm_seconds += time.perf_counter() - started
+            if hasattr(chunks, "aclose"):
+                await chunks.aclose()
+
+    def stats(self) -> Dict:
+        return {
+            "limit": self.limit,
+            "queue_size": self.queue_size,
+            "active": self.active,
+            "waiting": self.waiting,
+            "peak_active": self.peak_active,
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "timed_out": self.timed_out,
+            "llm_timeout": self.timeout,
+            "llm_calls": self.llm_calls,
+            "llm_timeouts": self.llm_timeouts,
+            "avg_llm_ms": round(self.llm_seconds / self.llm_calls * 1000, 2) if self.llm_calls else 0.0
+        }
+
+
+class _ReleasingStream:
+    """串流回應的 body：結束或連線關閉時釋放名額（即使一段都還沒送出）"""
+
+    def __init__(self, events: AsyncIterator[str], release):
+        self._events = events
+        self._release = release
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self) -> str:
+        return await self._events.__anext__()
+
+    async def aclose(self):
+        try:
+            await self._events.aclose()
+        finally:
+            if self._release is not None:
+                self._release()
+                self._release = None
+
+
+def create_async_app(rag_system, startup=None) -> Quart:
+    """建立非同步版本的聊天 API（路由與 CHATBOT.py 相同）"""
+    app = Quart(__name__)
+    gate = AsyncLLMGate.from_env()
+    # 編碼與檢索的執行緒池（ASYNC_ENCODE_WORKERS）
+    executor = ThreadPoolExecutor(max_workers=int(os.getenv("ASYNC_ENCODE_WORKERS", 4)),
+                                  thread_name_prefix='chat-encode')
+
+    def busy_response():
+        response = jsonify({
+            "success": False,
+            "error": "伺服器忙碌中，請稍後再試"
+        })
+        response.status_code = 503
+        response.headers['Retry-After'] = str(gate.retry_after)
+        return response
+
+    async def parse_chat_request():
+        """讀取並驗證聊天請求，回傳 (message, session_id, 錯誤回應或 None)"""
+        data = await request.get_json()
+        message = data.get('message', '').strip()
+        session_id = data.get('session_id', 'default')
+        if not message:
+            return message, session_id, (jsonify({"success": False, "error": "訊息不能為空"}), 400)
+        if len(message) > 500:
+            return message, session_id, (jsonify({"success": False, "error": "訊息長度不能超過 500 字"}), 400)
+        return message, session_id, None
+
+    @app.after_request
+    async def add_cors_headers(response):
+        origin = request.headers.get('Origin')
+        if origin in ALLOWED_ORIGINS:
+            response.headers['Access-Control-Allow-Origin'] = origin
+            response.headers['Access-Control-Allow-Headers'] = 'Content-Type, Authorization'
+            response.headers['Access-Control-Allow-Methods'] = 'GET, POST, OPTIONS'
+            response.headers['Vary'] = 'Origin'
+        return response
+
+    @app.route('/')
+    async def home():
+        return jsonify({
+            "message": "RAG Chatbot API",
+            "status": "running",
+            "version": "1.0.0",
+            "mode": "async",
+            "endpoints": {
+                "chat": "/chat",
+                "chat_stream": "/chat/stream",
+                "status": "/status",
+                "clear": "/clear"
+            }
+        })
+
+    @app.route('/api/health')
+    async def health_check():
+        return jsonify({"status": "healthy", "message": "API is running"})
+
+    @app.route('/chat', methods=['POST', 'OPTIONS'])
+    async def chat():
+        """聊天 API - 處理用戶訊息"""
+        if request.method == 'OPTIONS':
+            return '', 204
+        if not rag_system or not rag_system.is_ready():
+            return jsonify({"success": False, "error": "系統未準備就緒"}), 503
+        try:
+            message, session_id, error = await parse_chat_request()
+            if error:
+                return error
+            try:
+                async with gate.admit():
+                    result = await rag_system.achat(message, session_id, gate, executor)
+            except GateBusy:
+                return busy_response()
+            return jsonify(result)
+        except Exception as e:
+            return jsonify({
+                "success": False,
+                "error": f"處理請求時發生錯誤: {str(e)}"
+            }), 500
+
+    @app.route('/chat/stream', methods=['POST', 'OPTIONS'])
+    async def chat_stream():
+        """串流聊天 API（Server-Sent Events），事件與 CHATBOT.py 相同"""
+        if request.method == 'OPTIONS':
+            return '', 204
+        if not rag_system or not rag_system.is_ready():
+            return jsonify({"success": False, "error": "系統未準備就緒"}), 503
+        try:
+            message, session_id, error = await parse_chat_request()
+        except Exception as e:
+            return jsonify({
+                "success": False,
+                "error": f"處理請求時發生錯誤: {str(e)}"
+            }), 500
+        if error:
+            return error
+
+        try:
+            await gate.acquire()
+        except GateBusy:
+            return busy_response()
+
+        async def events():
+            async for event, payload in rag_system.achat_stream(message, session_id, gate, executor):
+                yield f"event: {event}\ndata: {json.dumps(payload, ensure_ascii=False)}\n\n"
+
+        response = Response(_ReleasingStream(events(), gate.release), mimetype='text/event-stream')
+        response.headers['Cache-Control'] = 'no-cache'
+        response.headers['X-Accel-Buffering'] = 'no'
+        response.timeout = None  # 逾時由 gate 控制，不使用 Quart 的回應逾時
+        return response
+
+    @app.route('/clear', methods=['POST', 'OPTIONS'])
+    async def clear_history():
+        if request.method == 'OPTIONS':
+            return '', 204
+        if not rag_system:
+            return jsonify({"success": False, "error": "系統未初始化"}), 503
+        try:
+            data = await request.get_json(silent=True)
+            session_id = data.get('session_id', 'default') if data else 'default'
+            # 對話歷史可能在 SQLite 中，不在事件迴圈上執行
+            await asyncio.get_running_loop().run_in_executor(executor, rag_system.clear_history, session_id)
+            return jsonify({"success": True, "message": "對話歷史已清除"})
+        except Exception as e:
+            return jsonify({"success": False, "error": str(e)}), 500
+
+    @app.route('/status')
+    async def status():
+        if not rag_system:
+            return jsonify({"ready": False, "error": "系統未初始化"})
+        vectorstore = rag_system.vectorstore
+        return jsonify({
+            "ready": rag_system.is_ready(),
+            "mode": "async",
+            "llm_loaded": rag_system.llm is not None,
+            "vectorstore_loaded": vectorstore is not None,
+            "index": vectorstore.index_info() if vectorstore is not None else None,
+            "admission": gate.stats(),
+            "answer_cache": rag_system.answer_cache.stats(),
+            "sessions": rag_system.sessions.stats(),
+            "context": rag_system.context_assembler.stats(),
+            "query_batcher": vectorstore.query_batcher.stats()
+            if vectorstore is not None and vectorstore.query_batcher is not None else None,
+            "startup": startup.as_dict() if startup is not None else None
+        })
+
+    @app.errorhandler(404)
+    async def not_found(error):
+        return jsonify({"error": "頁面不存在"}), 404
+
+    @app.errorhandler(500)
+    async def server_error(error):
+        return jsonify({"error": "服務器錯誤"}), 500
+
+    app.extensions['chat_gate'] = gate
+    return app
@@ -0,0 +1,201 @@
+"""
+上下文組裝 - 把檢索結果整理成精簡的提示詞內容
+
+1. MMR 選擇：在多取的候選中兼顧相關性與多樣性，幾乎重複的文字塊直接略過
+2. 合併：同一檔案中相鄰的文字塊接成一段，切塊時重疊的文字（chunk_overlap）只保留一次
+3. 預算：依相關性依序放入，超過 token 預算時截斷或捨棄
+token 數以字元估算（中日韓文字每字約 1 token，其他約 4 字元 1 token），用於預算與統計
+"""
+import os
+import re
+import threading
+from typing import Dict, List, Optional
+
+import numpy as np
+
+_CJK = re.compile(r"[\u3000-\u303f\u3400-\u9fff\uf900-\ufaff\uff00-\uffef]")
+
+MIN_OVERLAP = 20    # 至少重疊這麼多字元才視為切塊重疊
+MAX_OVERLAP = 300   # 檢查重疊的最大長度（chunk_overlap 的數倍）
+MIN_TRUNCATED_TOKENS = 50  # 剩餘預算少於此數時不再截斷放入
+
+
+def estimate_tokens(text: str) -> int:
+    """估算 token 數"""
+    cjk = len(_CJK.findall(text))
+    return cjk + (len(text) - cjk + 3) // 4
+
+
+def overlap_length(left: str, right: str) -> int:
+    """left 的結尾與 right 的開頭重疊的字元數（少於 MIN_OVERLAP 視為 0）"""
+    for length in range(min(len(left), len(right), MAX_OVERLAP), MIN_OVERLAP - 1, -1):
+        if left.endswith(right[:length]):
+            return length
+    return 0
+
+
+class ContextAssembler:
+    """檢索結果 -> 去重、合併、符合 token 預算的上下文"""
+
+    def __init__(self, top_k: int = 3, fetch_k: int = 8, mmr_lambda: float = 0.7,
+                 duplicate_threshold: float = 0.95, token_budget: int = 1200):
+        """
+        top_k: 最多選幾個文字塊；fetch_k: 先向向量庫取幾個候選
+        mmr_lambda: 1 表示只看相關性，越小越重視多樣性
+        duplicate_threshold: 與已選文字塊的 cosine 相似度超過此值視為重複
+        token_budget: 上下文的 token 上限
+        """
+        self.top_k = top_k
+        self.fetch_k = max(fetch_k, top_k)
+        self.mmr_lambda = mmr_lambda
+        self.duplicate_threshold = duplicate_threshold
+        self.token_budget = token_budget
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.raw_tokens = 0
+        self.context_tokens = 0
+        self.duplicates = 0
+        self.merged = 0
+        self.truncated = 0
+        self.dropped = 0
+
+    @classmethod
+    def from_env(cls):
+        """從環境變數讀取設定：CONTEXT_TOP_K、CONTEXT_FETCH_K、CONTEXT_MMR_LAMBDA、
+        CONTEXT_DUP_THRESHOLD、CONTEXT_TOKEN_BUDGET"""
+        return cls(
+            top_k=int(os.getenv("CONTEXT_TOP_K", 3)),
+            fetch_k=int(os.getenv("CONTEXT_FETCH_K", 8)),
+            mmr_lambda=float(os.getenv("CONTEXT_MMR_LAMBDA", 0.7)),
+            duplicate_threshold=float(os.getenv("CONTEXT_DUP_THRESHOLD", 0.95)),
+            token_budget=int(os.getenv("CONTEXT_TOKEN_BUDGET", 1200))
+        )
+
+    def assemble(self, vectorstore, query: str, query_embedding: Optional[np.ndarray] = None,
+                 top_k: Optional[int] = None) -> Dict:
+        """
+        回傳 {"context", "sources", "context_tokens", "raw_tokens"}
+        raw_tokens 為直接串接前 top_k 個結果時的 token 數（對照用）
+        """
+        top_k = top_k or self.top_k
+        if query_embedding is None:
+            query_embedding = vectorstore.encode_query(query)
+        hits = vectorstore.search(query, max(self.fetch_k, top_k), query_embedding=query_embedding)
+        if not hits:
+            return {"context": "", "sources": 0, "context_tokens": 0, "raw_tokens": 0}
+        raw_tokens = sum(estimate_tokens(hit['content']) for hit in hits[:top_k])
+
+        selected, duplicates = self._select(vectorstore, hits, np.asarray(query_embedding).reshape(-1), top_k)
+        blocks, merged = self._merge(vectorstore, selected)
+        context, placed, context_tokens, truncated = self._fit(blocks)
+        dropped = len(blocks) - placed
+
+        with self._lock:
+            self.requests += 1
+            self.raw_tokens += raw_tokens
+            self.context_tokens += context_tokens
+            self.duplicates += duplicates
+            self.merged += merged
+            self.truncated += truncated
+            self.dropped += dropped
+        return {
+            "context": context,
+            "sources": placed,
+            "context_tokens": context_tokens,
+            "raw_tokens": raw_tokens
+        }
+
+    def _select(self, vectorstore, hits: List[Dict], query: np.ndarray, top_k: int):
+        """MMR：每次選 λ·相關性 − (1−λ)·與已選最大相似度 最高的候選"""
+        if vectorstore.embeddings is None or 'id' not in hits[0]:
+            return hits[:top_k], 0
+        ids = np.array([hit['id'] for hit in hits])
+        order = np.argsort(ids)  # 依列號讀取 mmap 較連續
+        vectors = np.empty((len(ids), len(query)), dtype=np.float32)
+        vectors[order] = np.asarray(vectorstore.embeddings[ids[order]], dtype=np.float32)
+        relevance = vectors @ query
+        similarity = vectors @ vectors.T
+
+        selected, duplicates = [], 0
+        candidates = list(range(len(hits)))
+        while candidates and len(selected) < top_k:
+            best, best_score = None, -np.inf
+            for i in list(candidates):
+                redundancy = max((similarity[i, j] for j in selected), default=0.0)
+                if redundancy >= self.duplicate_threshold:
+                    candidates.remove(i)  # 幾乎重複，不再考慮
+                    duplicates += 1
+                    continue
+                score = self.mmr_lambda * relevance[i] - (1 - self.mmr_lambda) * redundancy
+                if score > best_score:
+                    best, best_score = i, score
+            if best is None:
+                break
+            selected.append(best)
+            candidates.remove(best)
+        return [hits[i] for i in selected], duplicates
+
+    def _merge(self, vectorstore, hits: List[Dict]):
+        """相鄰（列號連續且同一來源或文字重疊）的文字塊接成一段，保留最高分的排序"""
+        if not hits or 'id' not in hits[0]:
+            return [{"text": hit['content'], "score": hit['score']} for hit in hits], 0
+        source_of = getattr(vectorstore, 'chunk_source', lambda i: '')
+        runs, merged = [], 0
+        for hit in sorted(hits, key=lambda h: h['id']):
+            text, source = hit['content'], source_of(hit['id'])
+            if runs:
+                last = runs[-1]
+                if text in last["text"]:
+                    merged += 1
+                    last["score"] = max(last["score"], hit['score'])
+                    continue
+                overlap = overlap_length(last["text"], text)
+                adjacent = hit['id'] == last["last_id"] + 1 and (overlap or (source and source == last["source"]))
+                if adjacent:
+                    last["text"] += text[overlap:] if overlap else "\n" + text
+                    last["last_id"] = hit['id']
+                    last["score"] = max(last["score"], hit['score'])
+                    merged += 1
+                    continue
+            runs.append({"text": text, "score": hit['score'], "last_id": hit['id'], "source": source})
+        runs.sort(key=lambda run: -run["score"])
+        return runs, merged
+
+    def _fit(self, blocks: List[Dict]):
+        """依序放入 token 預算內的段落；放不下時截斷最後一段，回傳 (上下文, 段數, token 數, 截斷數)"""
+        context, placed, used, truncated = "", 0, 0, 0
+        for block in blocks:
+            header = f"文檔 {placed + 1}:\n"
+            text = block["text"]
+            cost = estimate_tokens(header + text) + 1
+            remaining = self.token_budget - used
+            if cost > remaining:
+                if remaining < MIN_TRUNCATED_TOKENS:
+                    break
+                # 依比例截斷，再逐步縮短到符合預算
+                keep = max(int(len(text) * remaining / cost), 1)
+                while keep > 1 and estimate_tokens(header + text[:keep] + "…") + 1 > remaining:
+                    keep = int(keep * 0.9)
+                text = text[:keep] + "…"
+                cost = estimate_tokens(header + text) + 1
+                truncated += 1
+            context += f"{header}{text}\n\n"
+            placed += 1
+            used += cost
+        return context, placed, used, truncated
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "top_k": self.top_k,
+                "fetch_k": self.fetch_k,
+                "token_budget": self.token_budget,
+                "requests": self.requests,
+                "avg_raw_tokens": round(self.raw_tokens / self.requests, 1) if self.requests else 0.0,
+                "avg_context_tokens": round(self.context_tokens / self.requests, 1) if self.requests else 0.0,
+                "saved_ratio": round(1 - self.context_tokens / self.raw_tokens, 4) if self.raw_tokens else 0.0,
+                "duplicates": self.duplicates,
+                "merged": self.merged,
+                "truncated": self.truncated,
+                "dropped": self.dropped
+            }
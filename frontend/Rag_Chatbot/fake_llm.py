@@ -0,0 +1,68 @@
+"""
+本機假語言模型 - 不需要網路與 API 金鑰，離線測試串流、快取與併發時使用（LLM_BACKEND=fake）
+
+介面與 LangChain 的 chat model 相同：invoke() 回傳有 content 的訊息，stream() 逐段產生
+"""
+import asyncio
+import os
+import re
+import time
+from typing import AsyncIterator, Iterator
+
+
+class FakeMessage:
+    def __init__(self, content: str):
+        self.content = content
+
+
+class FakeChatModel:
+    """依提示詞中的問題與文檔組出固定格式的回答，逐段輸出並模擬生成延遲"""
+
+    def __init__(self, token_delay_ms: float = 30, first_token_ms: float = 200):
+        """token_delay_ms: 每段之間的延遲；first_token_ms: 第一段前的延遲（模擬網路與排隊）"""
+        self.token_delay = token_delay_ms / 1000
+        self.first_token_delay = first_token_ms / 1000
+
+    @classmethod
+    def from_env(cls):
+        """從環境變數讀取設定：FAKE_LLM_TOKEN_DELAY_MS、FAKE_LLM_FIRST_TOKEN_MS"""
+        return cls(
+            token_delay_ms=float(os.getenv("FAKE_LLM_TOKEN_DELAY_MS", 30)),
+            first_token_ms=float(os.getenv("FAKE_LLM_FIRST_TOKEN_MS", 200))
+        )
+
+    def _answer(self, prompt: str) -> str:
+        question = re.search(r"用戶問題：(.*)", prompt)
+        question = question.group(1).strip() if question else ""
+        documents = re.findall(r"文檔 \d+:\n(.+)", prompt)
+        lines = [f"（測試回答）關於「{question}」："]
+        for i, doc in enumerate(documents[:3], 1):
+            lines.append(f"{i}. {doc.strip()[:40]}")
+        return "\n".join(lines)
+
+    def _tokens(self, text: str) -> Iterator[str]:
+        # 英數字詞一段、中文每兩個字一段，近似真實模型的輸出節奏
+        for match in re.finditer(r"[A-Za-z0-9_]+\s*|\s+|[^\sA-Za-z0-9_]{1,2}", text):
+            yield match.group(0)
+
+    def invoke(self, prompt: str) -> FakeMessage:
+        answer = self._answer(prompt)
+        time.sleep(self.first_token_delay + self.token_delay * sum(1 for _ in self._tokens(answer)))
+        return FakeMessage(answer)
+
+    def stream(self, prompt: str) -> Iterator[FakeMessage]:
+        time.sleep(self.first_token_delay)
+        for token in self._tokens(self._answer(prompt)):
+            time.sleep(self.token_delay)
+            yield FakeMessage(token)
+
+    async def ainvoke(self, prompt: str) -> FakeMessage:
+        answer = self._answer(prompt)
+        await asyncio.sleep(self.first_token_delay + self.token_delay * sum(1 for _ in self._tokens(answer)))
+        return FakeMessage(answer)
+
+    async def astream(self, prompt: str) -> AsyncIterator[FakeMessage]:
+        await asyncio.sleep(self.first_token_delay)
+        for token in self._tokens(self._answer(prompt)):
+            await asyncio.sleep(self.token_delay)
+            yield FakeMessage(token)
@@ -0,0 +1,228 @@
+"""
+管線化文檔匯入 - 載入 / 切塊、批次編碼、寫入向量庫三個階段同時進行
+
+    檔案 ──► [載入+切塊 執行緒池] ──► 有限佇列 ──► [批次編碼] ──► 有限佇列 ──► [寫入向量庫]
+
+每個佇列都有上限，同時在處理中的檔案數與跨批次去重的快取也有上限，因此記憶體用量與語料大小無關；
+編碼模型處理一批時，執行緒池已經在切下一批檔案
+"""
+import os
+import queue
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+
+from simple_vectorstore import DocumentProcessor, SimpleVectorStore, _normalize, chunk_hash
+
+_DONE = object()  # 階段結束的標記
+
+
+class IngestPipeline:
+    """載入、編碼、寫入三段式匯入管線"""
+
+    def __init__(self, vectorstore: SimpleVectorStore, processor: Optional[DocumentProcessor] = None,
+                 workers: int = 4, batch_size: int = 64, queue_size: int = 8,
+                 dedupe_size: int = 4096,
+                 lookup: Optional[Callable[[str], Optional[np.ndarray]]] = None):
+        """
+        workers: 載入 / 切塊的執行緒數
+        batch_size: 每次送進編碼模型的文字塊數
+        queue_size: 階段之間佇列的上限（檔案數 / 批次數）
+        dedupe_size: 跨批次去重時保留最近編碼過的內容數（LRU）
+        lookup: 內容雜湊 -> 已正規化的向量，命中時不重新編碼
+        """
+        self.vectorstore = vectorstore
+        self.processor = processor or DocumentProcessor()
+        self.workers = workers
+        self.batch_size = batch_size
+        self.queue_size = queue_size
+        self.dedupe_size = dedupe_size
+        self.lookup = lookup
+        self.failed: List[str] = []  # 最近一次匯入中無法讀取的檔案
+        # 最近編碼過的內容（跨批次去重），最後一個為最近使用
+        self._fresh: "OrderedDict[str, np.ndarray]" = OrderedDict()
+
+    @classmethod
+    def from_env(cls, vectorstore: SimpleVectorStore, processor: Optional[DocumentProcessor] = None, **kwargs):
+        """從環境變數讀取設定：INGEST_WORKERS、INGEST_BATCH_SIZE、INGEST_QUEUE_SIZE、INGEST_DEDUPE_SIZE"""
+        return cls(
+            vectorstore,
+            processor,
+            workers=int(os.getenv("INGEST_WORKERS", 4)),
+            batch_size=int(os.getenv("INGEST_BATCH_SIZE", 64)),
+            queue_size=int(os.getenv("INGEST_QUEUE_SIZE", 8)),
+            dedupe_size=int(os.getenv("INGEST_DEDUPE_SIZE", 4096)),
+            **kwargs
+        )
+
+    def run(self, file_paths: List[str]) -> Dict:
+        """匯入所有檔案，回傳統計資料"""
+        started = time.perf_counter()
+        chunk_queue = queue.Queue(maxsize=self.queue_size)    # (path, chunks)
+        batch_queue = queue.Queue(maxsize=self.queue_size)    # (docs, sources, vectors)
+        stop = threading.Event()
+        errors = []
+        self.failed = []
+        stats = {"files": 0, "failed": 0, "chunks": 0, "encoded": 0, "reused": 0, "batches": 0,
+                 "encode_seconds": 0.0, "peak_pending": 0, "peak_chunk_queue": 0, "peak_batch_queue": 0}
+
+        def put(q, item, peak_key):
+            # 佇列已滿時阻塞（背壓），但在其他階段出錯時放棄
+            while not stop.is_set():
+                try:
+                    q.put(item, timeout=0.1)
+                    stats[peak_key] = max(stats[peak_key], q.qsize())
+                    return True
+                except queue.Full:
+                    continue
+            return False
+
+        def get(q):
+            # 其他階段出錯時視同結束
+            while not stop.is_set():
+                try:
+                    return q.get(timeout=0.1)
+                except queue.Empty:
+                    continue
+            return _DONE
+
+        def load_stage():
+            # 已送出但還沒放進佇列的檔案（切塊中或已切好等待依序送出）不超過 workers + queue_size，
+            # 前面有一個慢的檔案時，後面切好的結果也不會無限累積
+            max_pending = self.workers + self.queue_size
+
+            def split(path):
+                return path, self.processor.split_file(path)
+
+            try:
+                with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='ingest-load') as pool:
+                    pending = []
+                    for path in file_paths:
+                        if stop.is_set():
+                            break
+                        while len(pending) >= max_pending:
+                            if not put(chunk_queue, pending.pop(0).result(), "peak_chunk_queue"):
+                                return
+                        pending.append(pool.submit(split, path))
+                        stats["peak_pending"] = max(stats["peak_pending"], len(pending))
+                        # 依檔案順序送出已完成的結果
+                        while pending and pending[0].done():
+                            if not put(chunk_queue, pending.pop(0).result(), "peak_chunk_queue"):
+                                return
+                    for future in pending:
+                        if not put(chunk_queue, future.result(), "peak_chunk_queue"):
+                            return
+            except Exception as e:
+                errors.append(e)
+                stop.set()
+            finally:
+                put(chunk_queue, _DONE, "peak_chunk_queue")
+
+        def encode_stage():
+            docs, sources = [], []
+
+            def flush():
+                if not docs:
+                    return True
+                vectors = self._encode(docs, stats)
+                stats["batches"] += 1
+                ok = put(batch_queue, (list(docs), list(sources), vectors), "peak_batch_queue")
+                docs.clear()
+                sources.clear()
+                return ok
+
+            try:
+                while True:
+                    item = get(chunk_queue)
+                    if item is _DONE:
+                        break
+                    path, chunks = item
+                    stats["files"] += 1
+                    if chunks is None:
+                        self.failed.append(path)
+                        stats["failed"] += 1
+                        continue
+                    for chunk in chunks:
+                        docs.append(chunk)
+                        sources.append(path)
+                        if len(docs) >= self.batch_size and not flush():
+                            return
+                flush()
+            except Exception as e:
+                errors.append(e)
+                stop.set()
+            finally:
+                put(batch_queue, _DONE, "peak_batch_queue")
+
+        loader = threading.Thread(target=load_stage, name='ingest-loader', daemon=True)
+        encoder = threading.Thread(target=encode_stage, name='ingest-encoder', daemon=True)
+        loader.start()
+        encoder.start()
+
+        # 寫入階段在呼叫端執行緒進行，向量庫不需要加鎖
+        try:
+            while True:
+                item = get(batch_queue)
+                if item is _DONE:
+                    break
+                docs, sources, vectors = item
+                self.vectorstore.add_documents(docs, sources=sources, embeddings=vectors)
+                stats["chunks"] += len(docs)
+        except BaseException:
+            stop.set()
+            raise
+        finally:
+            loader.join()
+            encoder.join()
+
+        if errors:
+            raise errors[0]
+
+        elapsed = time.perf_counter() - started
+        stats["seconds"] = round(elapsed, 3)
+        stats["encode_seconds"] = round(stats["encode_seconds"], 3)
+        stats["docs_per_second"] = round(stats["files"] / elapsed, 2) if elapsed else 0.0
+        stats["chunks_per_second"] = round(stats["chunks"] / elapsed, 2) if elapsed else 0.0
+        print(f"🚀 匯入完成: {stats['files']} 個檔案、{stats['chunks']} 個文字塊，"
+              f"{stats['docs_per_second']} docs/s、{stats['chunks_per_second']} chunks/s")
+        return stats
+
+    def _encode(self, docs: List[str], stats: Dict) -> np.ndarray:
+        """編碼一批文字塊；快取命中、最近編碼過與同批重複的內容不重新編碼"""
+        hashes = [chunk_hash(doc) for doc in docs]
+        vectors: List[Optional[np.ndarray]] = [None] * len(docs)
+        missing = {}  # hash -> 第一個出現的位置
+        for i, h in enumerate(hashes):
+            cached = self._fresh.get(h)
+            if cached is not None:
+                self._fresh.move_to_end(h)
+            elif self.lookup:
+                cached = self.lookup(h)
+            if cached is not None:
+                vectors[i] = cached
+            elif h not in missing:
+                missing[h] = i
+
+        if missing:
+            started = time.perf_counter()
+            texts = [docs[i] for i in missing.values()]
+            encoded = np.asarray(
+                self.vectorstore.encoder.encode(texts, batch_size=self.batch_size, show_progress_bar=False),
+                dtype=np.float32
+            )
+            _normalize(encoded)
+            stats["encode_seconds"] += time.perf_counter() - started
+            fresh = dict(zip(missing, encoded))
+            for i, h in enumerate(hashes):
+                if vectors[i] is None:
+                    vectors[i] = fresh[h]
+            self._fresh.update(fresh)
+            while len(self._fresh) > self.dedupe_size:
+                self._fresh.popitem(last=False)
+        stats["encoded"] += len(missing)
+        stats["reused"] += len(docs) - len(missing)
+        return np.stack(vectors).astype(np.float32, copy=False)
@@ -0,0 +1,111 @@
+"""
+查詢向量的微批次編碼 - 併發請求的查詢合併成一次 encode 呼叫
+
+背景執行緒取出第一個查詢後，立即帶走佇列中已經在等待的查詢；只有在其他請求正在
+送出查詢（呼叫中的數量大於這一批）時，才最多再等 max_wait_ms 湊成一批。
+單一使用者不會等待，延遲不增加；併發時多個單句前向運算合併成一次批次運算
+"""
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Callable, Dict, List
+
+import numpy as np
+
+
+class QueryBatcher:
+    """把併發的 encode([query]) 合併成批次呼叫"""
+
+    def __init__(self, encode: Callable[[List[str]], np.ndarray], max_batch: int = 32, max_wait_ms: float = 5):
+        """
+        encode: 一次編碼多個文字，回傳 (n, dimension)
+        max_batch: 每批最多的查詢數；max_wait_ms: 有其他請求正在送出時，最多等待湊批的毫秒數
+        """
+        self.encode_batch = encode
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000
+        self._queue = queue.Queue()
+        self._callers = 0  # 呼叫 encode() 且尚未取得結果的請求數
+        self._lock = threading.Lock()
+        self._worker = None
+        self.batches = 0
+        self.queries = 0
+        self.largest_batch = 0
+        self.encode_seconds = 0.0
+
+    @classmethod
+    def from_env(cls, encode: Callable[[List[str]], np.ndarray]):
+        """從環境變數讀取設定：QUERY_BATCH_MAX、QUERY_BATCH_WAIT_MS"""
+        return cls(
+            encode,
+            max_batch=int(os.getenv("QUERY_BATCH_MAX", 32)),
+            max_wait_ms=float(os.getenv("QUERY_BATCH_WAIT_MS", 5))
+        )
+
+    def encode(self, text: str) -> np.ndarray:
+        """編碼單一查詢（與其他請求合併），回傳形狀 (dimension,) 的向量"""
+        future = Future()
+        with self._lock:
+            self._callers += 1
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._run, name='query-batcher', daemon=True)
+                self._worker.start()
+        try:
+            self._queue.put((text, future))
+            return future.result()
+        finally:
+            with self._lock:
+                self._callers -= 1
+
+    def _collect(self) -> list:
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch:
+            try:
+                batch.append(self._queue.get_nowait())
+                continue
+            except queue.Empty:
+                pass
+            # 還有請求正在送出查詢時才等待，單一使用者直接編碼
+            remaining = deadline - time.monotonic()
+            if self._callers <= len(batch) or remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            texts = [text for text, _ in batch]
+            started = time.perf_counter()
+            try:
+                vectors = np.asarray(self.encode_batch(texts), dtype=np.float32).reshape(len(texts), -1)
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            elapsed = time.perf_counter() - started
+            with self._lock:
+                self.batches += 1
+                self.queries += len(batch)
+                self.largest_batch = max(self.largest_batch, len(batch))
+                self.encode_seconds += elapsed
+            for (_, future), vector in zip(batch, vectors):
+                future.set_result(vector)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "max_batch": self.max_batch,
+                "max_wait_ms": self.max_wait * 1000,
+                "batches": self.batches,
+                "queries": self.queries,
+                "avg_batch": round(self.queries / self.batches, 2) if self.batches else 0.0,
+                "largest_batch": self.largest_batch,
+                "avg_encode_ms": round(self.encode_seconds / self.batches * 1000, 2) if self.batches else 0.0
+            }
@@ -0,0 +1,236 @@
+"""
+對話歷史儲存 - 每個 session 的輪數上限、全域 LRU 與閒置逾時淘汰
+
+MemorySessionStore 存在記憶體中（預設）；SQLiteSessionStore 寫入 SQLite，重新啟動後仍保留。
+兩者的 session 數與每個 session 的輪數都有上限，記憶體 / 資料庫大小不隨流量成長
+"""
+import os
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict, deque
+from typing import Dict, List
+
+
+class SessionStore(ABC):
+    """對話歷史儲存的介面"""
+
+    backend = ""
+
+    def __init__(self, max_sessions: int = 10000, max_turns: int = 50, idle_ttl: float = 86400):
+        """
+        max_sessions: 最多保留的 session 數（超過時淘汰最久未使用的）
+        max_turns: 每個 session 保留的最近輪數；idle_ttl: 閒置超過此秒數的 session 會被清除
+        """
+        self.max_sessions = max_sessions
+        self.max_turns = max_turns
+        self.idle_ttl = idle_ttl
+        self.evicted = 0
+        self.expired = 0
+
+    @abstractmethod
+    def append(self, session_id: str, user: str, bot: str):
+        """加入一輪對話"""
+
+    @abstractmethod
+    def get(self, session_id: str) -> List[Dict]:
+        """回傳 [{"user": ..., "bot": ...}, ...]（由舊到新），沒有紀錄時回傳空 list"""
+
+    @abstractmethod
+    def clear(self, session_id: str):
+        """清除一個 session 的對話歷史"""
+
+    def __contains__(self, session_id: str) -> bool:
+        return bool(self.get(session_id))
+
+    @abstractmethod
+    def __len__(self) -> int:
+        """目前保留的 session 數"""
+
+    def stats(self) -> Dict:
+        return {
+            "backend": self.backend,
+            "sessions": len(self),
+            "max_sessions": self.max_sessions,
+            "max_turns": self.max_turns,
+            "idle_ttl": self.idle_ttl,
+            "evicted": self.evicted,
+            "expired": self.expired
+        }
+
+
+class MemorySessionStore(SessionStore):
+    """記憶體中的 LRU 對話歷史"""
+
+    backend = "memory"
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self._sessions: "OrderedDict[str, Dict]" = OrderedDict()  # 最後一個為最近使用
+        self._lock = threading.Lock()
+
+    def _purge(self, now: float):
+        # LRU 順序即最後使用時間的順序，閒置的 session 都在最前面
+        while self._sessions:
+            session_id, session = next(iter(self._sessions.items()))
+            if now - session["last_used"] <= self.idle_ttl:
+                break
+            del self._sessions[session_id]
+            self.expired += 1
+        while len(self._sessions) > self.max_sessions:
+            self._sessions.popitem(last=False)
+            self.evicted += 1
+
+    def append(self, session_id: str, user: str, bot: str):
+        now = time.time()
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None:
+                session = self._sessions[session_id] = {"turns": deque(maxlen=self.max_turns)}
+            session["turns"].append({"user": user, "bot": bot})
+            session["last_used"] = now
+            self._sessions.move_to_end(session_id)
+            self._purge(now)
+
+    def get(self, session_id: str) -> List[Dict]:
+        now = time.time()
+        with self._lock:
+            self._purge(now)
+            session = self._sessions.get(session_id)
+            if session is None:
+                return []
+            session["last_used"] = now
+            self._sessions.move_to_end(session_id)
+            return list(session["turns"])
+
+    def clear(self, session_id: str):
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+
+class SQLiteSessionStore(SessionStore):
+    """SQLite 對話歷史（WAL 模式），重新啟動後仍保留"""
+
+    backend = "sqlite"
+
+    def __init__(self, path: str = "chat_sessions.db", purge_interval: float = 60, **kwargs):
+        """purge_interval: 兩次清除閒置 / 超量 session 的最短間隔秒數"""
+        super().__init__(**kwargs)
+        self.path = path
+        self.purge_interval = purge_interval
+        self._last_purge = 0.0
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript("""
+            CREATE TABLE IF NOT EXISTS sessions (
+                session_id TEXT PRIMARY KEY,
+                last_used REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS ix_sessions_last_used ON sessions (last_used);
+            CREATE TABLE IF NOT EXISTS turns (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                session_id TEXT NOT NULL,
+                user TEXT NOT NULL,
+                bot TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS ix_turns_session ON turns (session_id, id);
+        """)
+
+    def _purge(self, now: float):
+        if now - self._last_purge < self.purge_interval:
+            return
+        self._last_purge = now
+        db = self._db
+        cursor = db.execute("DELETE FROM sessions WHERE last_used < ?", (now - self.idle_ttl,))
+        self.expired += max(cursor.rowcount, 0)
+        self._evict()
+        db.execute("DELETE FROM turns WHERE session_id NOT IN (SELECT session_id FROM sessions)")
+
+    def _evict(self):
+        """session 數超過上限時刪除最久未使用的 session 與其對話"""
+        db = self._db
+        (count,) = db.execute("SELECT COUNT(*) FROM sessions").fetchone()
+        if count <= self.max_sessions:
+            return
+        oldest = [row[0] for row in db.execute(
+            "SELECT session_id FROM sessions ORDER BY last_used LIMIT ?", (count - self.max_sessions,)
+        )]
+        db.executemany("DELETE FROM sessions WHERE session_id = ?", [(sid,) for sid in oldest])
+        db.executemany("DELETE FROM turns WHERE session_id = ?", [(sid,) for sid in oldest])
+        self.evicted += len(oldest)
+
+    def append(self, session_id: str, user: str, bot: str):
+        now = time.time()
+        with self._lock:
+            db = self._db
+            db.execute("BEGIN")
+            try:
+                cursor = db.execute("UPDATE sessions SET last_used = ? WHERE session_id = ?", (now, session_id))
+                if cursor.rowcount == 0:
+                    # 新的 session：插入後立即維持 session 數上限，不等定期清除
+                    db.execute("INSERT INTO sessions (session_id, last_used) VALUES (?, ?)", (session_id, now))
+                    self._evict()
+                db.execute("INSERT INTO turns (session_id, user, bot) VALUES (?, ?, ?)", (session_id, user, bot))
+                # 只保留最近 max_turns 輪
+                db.execute(
+                    "DELETE FROM turns WHERE session_id = ? AND id <= "
+                    "(SELECT id FROM turns WHERE session_id = ? ORDER BY id DESC LIMIT 1 OFFSET ?)",
+                    (session_id, session_id, self.max_turns)
+                )
+                self._purge(now)
+                db.execute("COMMIT")
+            except Exception:
+                db.execute("ROLLBACK")
+                raise
+
+    def get(self, session_id: str) -> List[Dict]:
+        now = time.time()
+        with self._lock:
+            db = self._db
+            row = db.execute("SELECT last_used FROM sessions WHERE session_id = ?", (session_id,)).fetchone()
+            if row is None:
+                return []
+            if now - row[0] > self.idle_ttl:
+                db.execute("DELETE FROM sessions WHERE session_id = ?", (session_id,))
+                db.execute("DELETE FROM turns WHERE session_id = ?", (session_id,))
+                self.expired += 1
+                return []
+            db.execute("UPDATE sessions SET last_used = ? WHERE session_id = ?", (now, session_id))
+            rows = db.execute("SELECT user, bot FROM turns WHERE session_id = ? ORDER BY id",
+                              (session_id,)).fetchall()
+            return [{"user": user, "bot": bot} for user, bot in rows]
+
+    def clear(self, session_id: str):
+        with self._lock:
+            self._db.execute("DELETE FROM sessions WHERE session_id = ?", (session_id,))
+            self._db.execute("DELETE FROM turns WHERE session_id = ?", (session_id,))
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM sessions").fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+def create_session_store() -> SessionStore:
+    """依環境變數建立：SESSION_STORE (memory / sqlite)、SESSION_DB_PATH、SESSION_MAX、
+    SESSION_MAX_TURNS、SESSION_IDLE_TTL"""
+    kwargs = dict(
+        max_sessions=int(os.getenv("SESSION_MAX", 10000)),
+        max_turns=int(os.getenv("SESSION_MAX_TURNS", 50)),
+        idle_ttl=float(os.getenv("SESSION_IDLE_TTL", 86400))
+    )
+    backend = os.getenv("SESSION_STORE", "memory")
+    if backend == "sqlite":
+        return SQLiteSessionStore(os.getenv("SESSION_DB_PATH", "chat_sessions.db"), **kwargs)
+    if backend != "memory":
+        raise ValueError(f"不支援的對話歷史儲存方式: {backend}")
+    return MemorySessionStore(**kwargs)
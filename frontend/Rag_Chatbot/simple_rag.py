@@ -1,10 +1,18 @@
 """
 超簡化 RAG Agent - 清晰易懂的核心邏輯
 """
+import asyncio
+import atexit
 import os
-from typing import Dict
-from langchain_google_genai import ChatGoogleGenerativeAI
-from simple_vectorstore import SimpleVectorStore
+import time
+from typing import AsyncIterator, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from answer_cache import SemanticAnswerCache
+from context_assembler import ContextAssembler, estimate_tokens
+from session_store import create_session_store
+from simple_vectorstore import SimpleVectorStore, DEFAULT_STORE_PATH, LEGACY_PICKLE_PATH, migrate_pickle
 
 
 class SimpleRAG:
@@ -14,11 +22,24 @@ class SimpleRAG:
         self.api_key = google_api_key
         self.llm = None
         self.vectorstore = None
-        self.chat_history = {}
+        # 對話歷史：輪數與 session 數有上限，SESSION_STORE=sqlite 時重新啟動後仍保留
+        self.sessions = create_session_store()
+        # 檢索結果去重、合併相鄰文字塊並限制 token 數（CONTEXT_*）
+        self.context_assembler = ContextAssembler.from_env()
+        # 相近的問題直接回傳先前的回答（ANSWER_CACHE_*），結束時寫入磁碟
+        self.answer_cache = SemanticAnswerCache.from_env()
+        atexit.register(self.answer_cache.flush)
         
     def load_llm(self):
-        """載入語言模型"""
+        """載入語言模型（LLM_BACKEND=fake 時使用本機假模型，可離線測試）"""
         try:
+            if os.getenv("LLM_BACKEND", "gemini") == "fake":
+                from fake_llm import FakeChatModel
+                self.llm = FakeChatModel.from_env()
+                print("✅ 語言模型載入成功（本機假模型）")
+                return True
+            
+            from langchain_google_genai import ChatGoogleGenerativeAI
             self.llm = ChatGoogleGenerativeAI(
                 model="gemini-2.0-flash",
                 google_api_key=self.api_key,
@@ -30,40 +51,65 @@ class SimpleRAG:
             print(f"❌ 語言模型載入失敗: {e}")
             return False
     
-    def load_vectorstore(self, path: str = "vectorstore.pkl"):
-        """載入向量資料庫"""
+    def load_vectorstore(self, path: str = DEFAULT_STORE_PATH):
+        """載入向量資料庫（只有舊版 pickle 時先轉換一次）"""
+        if not os.path.exists(path) and os.path.isfile(LEGACY_PICKLE_PATH):
+            print("🔁 偵測到舊版 vectorstore.pkl，轉換為目錄格式...")
+            migrate_pickle(LEGACY_PICKLE_PATH, path)
         self.vectorstore = SimpleVectorStore()
         if self.vectorstore.load(path):
             print("✅ 向量資料庫載入成功")
+            # 併發請求的查詢合併編碼（QUERY_BATCH_ENABLED / QUERY_BATCH_MAX / QUERY_BATCH_WAIT_MS）
+            if os.getenv("QUERY_BATCH_ENABLED", "true").lower() not in ("0", "false", "no"):
+                self.vectorstore.enable_query_batching()
+            loaded = self.answer_cache.load(self.vectorstore.model_name)
+            if loaded:
+                print(f"💬 已載入 {loaded} 筆快取回答")
             return True
         else:
             print("❌ 向量資料庫載入失敗")
             return False
     
-    def search_documents(self, query: str, k: int = 3) -> str:
+    def warm_encoder(self):
+        """預先載入查詢用的編碼模型，第一個聊天請求不必等待"""
+        if self.vectorstore:
+            self.vectorstore.encoder.encode(["warmup"])
+    
+    def search_documents(self, query: str, k: Optional[int] = None,
+                         query_embedding: Optional[np.ndarray] = None) -> str:
         """搜尋相關文檔"""
+        return self.assemble_context(query, k, query_embedding)["context"]
+    
+    def assemble_context(self, query: str, k: Optional[int] = None,
+                         query_embedding: Optional[np.ndarray] = None) -> Dict:
+        """搜尋並組裝上下文，回傳 {"context", "sources", "context_tokens", "raw_tokens"}"""
         if not self.vectorstore:
-            return "沒有可用的文檔資料庫"
-        
-        results = self.vectorstore.search(query, k)
+            return {"context": "沒有可用的文檔資料庫", "sources": 0, "context_tokens": 0, "raw_tokens": 0}
         
-        if not results:
-            return "沒有找到相關文檔"
+        assembled = self.context_assembler.assemble(self.vectorstore, query, query_embedding, top_k=k)
         
-        # 組合搜尋結果
-        context = ""
-        for i, result in enumerate(results, 1):
-            context += f"文檔 {i}:\n{result['content']}\n\n"
-        
-        return context
+        if not assembled["sources"]:
+            assembled["context"] = "沒有找到相關文檔"
+        return assembled
     
     def generate_response(self, query: str, context: str) -> str:
         """生成回應"""
         if not self.llm:
             return "語言模型未載入"
         
-        # 建立提示詞
-        prompt = f"""
+        try:
+            return self._generate(query, context)
+        except Exception as e:
+            return f"生成回應時發生錯誤: {e}"
+    
+    def _generate(self, query: str, context: str) -> str:
+        """呼叫語言模型；失敗時拋出例外（錯誤訊息不會被快取）"""
+        response = self.llm.invoke(self._build_prompt(query, context))
+        return response.content
+    
+    def _build_prompt(self, query: str, context: str) -> str:
+        """建立提示詞"""
+        return f"""
 你是一個熱島效應的專家學者。可以根據以下提供的內容回答用戶的問題。
 回答請精煉至100字內。
 
@@ -85,35 +131,139 @@ class SimpleRAG:
 請把回答控制在150字內
 請用繁體中文回答。
 """
+    
+    def _retrieve(self, message: str) -> Dict:
+        """編碼問題、查詢語意快取，未命中時搜尋相關文檔"""
+        # 查詢語意快取：相近的問題且向量庫版本相同時直接使用先前的回答
+        query_embedding = self.vectorstore.encode_query(message) if self.vectorstore else None
+        cached = None
+        if query_embedding is not None:
+            cached = self.answer_cache.lookup(query_embedding, self.vectorstore.version)
+        if cached:
+            return {"query_embedding": query_embedding, "cached": cached,
+                    "context": None, "sources": cached["sources"], "prompt_tokens": 0}
         
-        try:
-            response = self.llm.invoke(prompt)
-            return response.content
-        except Exception as e:
-            return f"生成回應時發生錯誤: {e}"
+        assembled = self.assemble_context(message, query_embedding=query_embedding)
+        context = assembled["context"]
+        return {"query_embedding": query_embedding, "cached": None, "context": context,
+                "sources": assembled["sources"],
+                "prompt_tokens": estimate_tokens(self._build_prompt(message, context))}
+    
+    def _remember(self, retrieval: Dict, message: str, response: str, session_id: str, seconds: Optional[float]):
+        """儲存對話歷史；seconds 不為 None 表示是新生成的回答，一併寫入快取"""
+        if seconds is not None and retrieval["query_embedding"] is not None:
+            self.answer_cache.store(retrieval["query_embedding"], message, response, retrieval["sources"],
+                                    self.vectorstore.version, seconds)
+        
+        self.sessions.append(session_id, message, response)
     
     def chat(self, message: str, session_id: str = "default") -> Dict:
         """主要聊天功能"""
         try:
-            # 1. 搜尋相關文檔
-            context = self.search_documents(message)
+            # 1. 查詢快取 / 搜尋相關文檔
+            retrieval = self._retrieve(message)
             
-            # 2. 生成回應 
-            response = self.generate_response(message, context)
+            # 2. 生成回應（只快取成功的回答）
+            seconds = None
+            if retrieval["cached"]:
+                response = retrieval["cached"]["answer"]
+            elif not self.llm:
+                response = "語言模型未載入"
+            else:
+                started = time.perf_counter()
+                try:
+                    response = self._generate(message, retrieval["context"])
+                    seconds = time.perf_counter() - started
+                except Exception as e:
+                    response = f"生成回應時發生錯誤: {e}"
+            
+            # 3. 儲存對話歷史
+            self._remember(retrieval, message, response, session_id, seconds)
+            
+            return {
+                "success": True,
+                "response": response,
+                "sources": retrieval["sources"],
+                "cached": retrieval["cached"] is not None,
+                "prompt_tokens": retrieval["prompt_tokens"]
+            }
             
-            # 3. 儲存對話歷史（簡化版）
-            if session_id not in self.chat_history:
-                self.chat_history[session_id] = []
+        except Exception as e:
+            return {
+                "success": False,
+                "error": str(e)
+            }
+    
+    def chat_stream(self, message: str, session_id: str = "default") -> Iterator[Tuple[str, Dict]]:
+        """
+        串流聊天：依序產生 (事件, 資料)
+        meta（檢索結果）→ 多個 token（回答片段）→ done（完整回答），失敗時為 error；
+        完整回答在最後才寫入對話歷史與快取，中途斷線或失敗都不會留下半段回答
+        """
+        try:
+            retrieval = self._retrieve(message)
+        except Exception as e:
+            yield "error", {"error": str(e)}
+            return
+        cached = retrieval["cached"]
+        yield "meta", {"sources": retrieval["sources"], "cached": cached is not None,
+                       "prompt_tokens": retrieval["prompt_tokens"]}
+        
+        seconds = None
+        if cached:
+            response = cached["answer"]
+            yield "token", {"text": response}
+        elif not self.llm:
+            yield "error", {"error": "語言模型未載入"}
+            return
+        else:
+            started = time.perf_counter()
+            parts = []
+            try:
+                for chunk in self.llm.stream(self._build_prompt(message, retrieval["context"])):
+                    if chunk.content:
+                        parts.append(chunk.content)
+                        yield "token", {"text": chunk.content}
+            except Exception as e:
+                yield "error", {"error": f"生成回應時發生錯誤: {e}"}
+                return
+            response = "".join(parts)
+            seconds = time.perf_counter() - started
+        
+        self._remember(retrieval, message, response, session_id, seconds)
+        yield "done", {"response": response, "sources": retrieval["sources"], "cached": cached is not None}
+    
+    async def achat(self, message: str, session_id: str, gate, executor=None) -> Dict:
+        """
+        非同步聊天（async_server 使用）：編碼與檢索在 executor 執行，
+        LLM 由 gate 以 ainvoke 等待並套用逾時
+        """
+        loop = asyncio.get_running_loop()
+        try:
+            retrieval = await loop.run_in_executor(executor, self._retrieve, message)
             
-            self.chat_history[session_id].append({
-                "user": message,
-                "bot": response
-            })
+            seconds = None
+            if retrieval["cached"]:
+                response = retrieval["cached"]["answer"]
+            elif not self.llm:
+                response = "語言模型未載入"
+            else:
+                started = time.perf_counter()
+                try:
+                    response = await gate.invoke(self.llm, self._build_prompt(message, retrieval["context"]))
+                    seconds = time.perf_counter() - started
+                except asyncio.TimeoutError:
+                    response = "生成回應逾時，請稍後再試"
+                except Exception as e:
+                    response = f"生成回應時發生錯誤: {e}"
             
+            await loop.run_in_executor(executor, self._remember, retrieval, message, response, session_id, seconds)
             return {
                 "success": True,
                 "response": response,
-                "sources": len(context.split("文檔")) - 1 if context else 0
+                "sources": retrieval["sources"],
+                "cached": retrieval["cached"] is not None,
+                "prompt_tokens": retrieval["prompt_tokens"]
             }
             
         except Exception as e:
@@ -122,12 +272,53 @@ class SimpleRAG:
                 "error": str(e)
             }
     
+    async def achat_stream(self, message: str, session_id: str, gate, executor=None) -> AsyncIterator[Tuple[str, Dict]]:
+        """chat_stream 的非同步版本，事件相同"""
+        loop = asyncio.get_running_loop()
+        try:
+            retrieval = await loop.run_in_executor(executor, self._retrieve, message)
+        except Exception as e:
+            yield "error", {"error": str(e)}
+            return
+        cached = retrieval["cached"]
+        yield "meta", {"sources": retrieval["sources"], "cached": cached is not None,
+                       "prompt_tokens": retrieval["prompt_tokens"]}
+        
+        seconds = None
+        if cached:
+            response = cached["answer"]
+            yield "token", {"text": response}
+        elif not self.llm:
+            yield "error", {"error": "語言模型未載入"}
+            return
+        else:
+            started = time.perf_counter()
+            parts = []
+            try:
+                async for text in gate.stream(self.llm, self._build_prompt(message, retrieval["context"])):
+                    parts.append(text)
+                    yield "token", {"text": text}
+            except asyncio.TimeoutError:
+                yield "error", {"error": "生成回應逾時，請稍後再試"}
+                return
+            except Exception as e:
+                yield "error", {"error": f"生成回應時發生錯誤: {e}"}
+                return
+            response = "".join(parts)
+            seconds = time.perf_counter() - started
+        
+        await loop.run_in_executor(executor, self._remember, retrieval, message, response, session_id, seconds)
+        yield "done", {"response": response, "sources": retrieval["sources"], "cached": cached is not None}
+    
     def clear_history(self, session_id: str = "default"):
         """清除對話歷史"""
-        if session_id in self.chat_history:
-            del self.chat_history[session_id]
+        self.sessions.clear(session_id)
         return True
     
+    def get_history(self, session_id: str = "default") -> List[Dict]:
+        """取得對話歷史（由舊到新）"""
+        return self.sessions.get(session_id)
+    
     def is_ready(self) -> bool:
         """檢查系統是否準備就緒"""
         return self.llm is not None and self.vectorstore is not None
@@ -1,79 +1,575 @@
 """
 簡化向量資料庫 - 使用 FAISS 避免編譯問題
+
+儲存格式（目錄）:
+    vectorstore/manifest.json     模型名稱、維度、文檔數與版本
+    vectorstore/embeddings.npy    float32 向量（已正規化），以 mmap 載入
+    vectorstore/documents.bin     所有文檔的 UTF-8 內容
+    vectorstore/offsets.npy       每個文檔在 documents.bin 中的起訖位置
+    vectorstore/index.faiss       FAISS 索引
+    vectorstore/chunks.json       每個文檔的內容雜湊與來源檔案
+    vectorstore/sync.json         目錄同步紀錄：來源檔案的雜湊、mtime 與大小
+載入時只讀 manifest 並建立 mmap，多個程序共用相同的分頁快取
 """
+import gc
+import hashlib
+import json
 import os
 import pickle
+import shutil
+import threading
+import time
+import uuid
 import numpy as np
-from typing import List, Dict, Any
-import bs4
-from sentence_transformers import SentenceTransformer
-from langchain_community.document_loaders import WebBaseLoader, TextLoader, PyPDFLoader
-from langchain_text_splitters import RecursiveCharacterTextSplitter
+from pathlib import Path
+from typing import List, Dict, Any, Optional
+
+# sentence_transformers / langchain / bs4 都很重，只在真正需要時才載入：
+# 聊天服務只需要 SimpleVectorStore，不會載入任何文檔處理套件
+
+_encoders = {}  # model_name -> SentenceTransformer（整個程序共用）
+_encoders_lock = threading.Lock()
+
+
+def get_encoder(model_name: str):
+    """取得共用的 SentenceTransformer，每個模型在程序中只載入一次"""
+    with _encoders_lock:
+        encoder = _encoders.get(model_name)
+        if encoder is None:
+            from sentence_transformers import SentenceTransformer
+            encoder = SentenceTransformer(model_name)
+            _encoders[model_name] = encoder
+        return encoder
+
+
+def _faiss():
+    """延遲載入 FAISS，未安裝時回傳 None"""
+    try:
+        import faiss
+        return faiss
+    except ImportError:
+        return None
+
+
+def _normalize(vectors: np.ndarray):
+    """就地 L2 正規化（float32）"""
+    faiss = _faiss()
+    if faiss is not None:
+        faiss.normalize_L2(vectors)
+    else:
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        vectors /= np.maximum(norms, 1e-12)
+
+
+# 預設的向量庫目錄與舊版 pickle 檔
+DEFAULT_STORE_PATH = "vectorstore"
+LEGACY_PICKLE_PATH = "vectorstore.pkl"
+STORE_FORMAT = 1
+
+# 索引類型：auto 依文檔數自動選擇
+INDEX_TYPES = ("auto", "flat", "hnsw", "ivf")
+AUTO_HNSW_MIN_DOCS = 20000      # 少於此數使用精確搜尋 (flat)
+AUTO_IVF_MIN_DOCS = 1000000     # 超過此數改用 IVF（HNSW 記憶體用量過大）
+HNSW_M = 32
+HNSW_EF_CONSTRUCTION = 80
+IVF_RETRAIN_GROWTH = 4          # IVF / PQ 資料量成長到訓練時的幾倍就重新訓練
+
+# 向量壓縮：none (float32) / fp16 / int8 (純量量化) / pq (乘積量化)
+QUANTIZATIONS = ("none", "fp16", "int8", "pq")
+PQ_MIN_TRAIN = 1024             # PQ 每個子空間 256 個中心，樣本太少時不壓縮
+TRAIN_SAMPLE = 65536            # 訓練 PQ 時最多取樣的向量數
+
+
+def select_index_type(count: int) -> str:
+    """依文檔數選擇索引類型"""
+    if count < AUTO_HNSW_MIN_DOCS:
+        return "flat"
+    if count < AUTO_IVF_MIN_DOCS:
+        return "hnsw"
+    return "ivf"
+
+
+def ivf_nlist(count: int) -> int:
+    """IVF 分群數：約 4√N，並確保每群至少有 39 個訓練樣本"""
+    return max(1, min(int(4 * np.sqrt(count)), count // 39))
+
+
+def pq_subquantizers(dimension: int) -> int:
+    """PQ 子空間數：每個子空間至少 4 維（384 維 -> 96 bytes / 向量）"""
+    for m in range(dimension // 4, 0, -1):
+        if dimension % m == 0:
+            return m
+    return 1
+
+
+# 目錄同步支援的檔案類型
+SUPPORTED_EXTENSIONS = ['.txt', '.md', '.pdf', '.docx', '.tsx', '.ts', '.jsx', '.js', '.py', '.html', '.css', '.json']
+
+
+def chunk_hash(text: str) -> str:
+    """文檔內容雜湊，作為向量快取的鍵"""
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+
+def file_hash(path: str) -> str:
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _rename(source: str, target: str, attempts: int = 5):
+    """更名目錄；Windows 上其他程序短暫開啟檔案時會拒絕存取，稍後重試"""
+    for attempt in range(attempts):
+        try:
+            os.rename(source, target)
+            return
+        except PermissionError:
+            if attempt == attempts - 1:
+                raise
+            time.sleep(0.2 * (attempt + 1))
+
+
+def index_path_for(path: str) -> str:
+    """舊版 pickle 旁的 FAISS 索引檔：vectorstore.pkl -> vectorstore.faiss"""
+    return os.path.splitext(path)[0] + ".faiss"
+
+
+class DocumentTable:
+    """
+    以偏移量索引的唯讀文檔表（mmap），可附加新文檔
+    行為與 list 相同：len()、索引、迭代、extend()
+    """
+    
+    def __init__(self, data=None, offsets=None):
+        self._data = data if data is not None else np.zeros(0, dtype=np.uint8)
+        self._offsets = offsets if offsets is not None else np.zeros(1, dtype=np.int64)
+        self._base = len(self._offsets) - 1
+        self._extra = []  # 載入後新增、尚未儲存的文檔
+    
+    @classmethod
+    def open(cls, directory: str):
+        data_path = os.path.join(directory, "documents.bin")
+        data = np.memmap(data_path, dtype=np.uint8, mode='r') if os.path.getsize(data_path) else None
+        offsets = np.load(os.path.join(directory, "offsets.npy"), mmap_mode='r')
+        return cls(data, offsets)
+    
+    def __len__(self):
+        return self._base + len(self._extra)
+    
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        if i < 0:
+            i += len(self)
+        if i < 0 or i >= len(self):
+            raise IndexError(i)
+        if i >= self._base:
+            return self._extra[i - self._base]
+        start, end = int(self._offsets[i]), int(self._offsets[i + 1])
+        return bytes(self._data[start:end]).decode('utf-8')
+    
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+    
+    def extend(self, docs: List[str]):
+        self._extra.extend(docs)
+    
+    def write(self, directory: str):
+        """寫出 documents.bin 與 offsets.npy"""
+        offsets = np.zeros(len(self) + 1, dtype=np.int64)
+        with open(os.path.join(directory, "documents.bin"), 'wb') as f:
+            position = 0
+            for i, doc in enumerate(self):
+                encoded = doc.encode('utf-8')
+                f.write(encoded)
+                position += len(encoded)
+                offsets[i + 1] = position
+        np.save(os.path.join(directory, "offsets.npy"), offsets)
 
 
 class SimpleVectorStore:
     """簡化版向量資料庫 - 使用 FAISS"""
     
-    def __init__(self, model_name: str = "all-MiniLM-L6-v2"):
+    def __init__(self, model_name: str = "all-MiniLM-L6-v2", index_type: Optional[str] = None,
+                 nprobe: Optional[int] = None, ef_search: Optional[int] = None,
+                 quantization: Optional[str] = None, rerank: Optional[int] = None):
+        """
+        index_type: auto / flat / hnsw / ivf（預設讀取 VECTOR_INDEX_TYPE，否則 auto）
+        nprobe: IVF 每次查詢搜尋的分群數；ef_search: HNSW 查詢時的候選數
+        quantization: none / fp16 / int8 / pq，索引中的向量壓縮方式（預設讀取 VECTOR_QUANTIZATION）
+        rerank: 壓縮時先取 k * rerank 個候選，再以磁碟上的 float32 向量精確重新排序（0 表示不重排）
+        """
         self.model_name = model_name
-        self.encoder = SentenceTransformer(model_name)
-        self.documents = []  # 儲存原始文檔
-        self.embeddings = None  # 儲存向量
+        self.index_type = index_type or os.getenv("VECTOR_INDEX_TYPE", "auto")
+        if self.index_type not in INDEX_TYPES:
+            raise ValueError(f"不支援的索引類型: {self.index_type}")
+        self.nprobe = nprobe or int(os.getenv("VECTOR_NPROBE", 16))
+        self.ef_search = ef_search or int(os.getenv("VECTOR_EF_SEARCH", 64))
+        self.quantization = quantization or os.getenv("VECTOR_QUANTIZATION", "none")
+        if self.quantization not in QUANTIZATIONS:
+            raise ValueError(f"不支援的壓縮方式: {self.quantization}")
+        self.rerank = rerank if rerank is not None else int(os.getenv("VECTOR_RERANK", 4))
+        self.index_kind = None  # 目前索引的實際類型
+        self.index_quantization = None  # 目前索引的實際壓縮方式
+        self._trained_on = 0  # IVF / PQ 訓練時的向量數
+        self.documents = DocumentTable()  # 儲存原始文檔
+        self.embeddings = None  # 儲存向量（已正規化）
+        self.version = 0  # 每次儲存遞增
         self.index = None  # FAISS 索引
+        self._buffer = None  # embeddings 的底層緩衝區
+        self.chunk_hashes: Optional[List[str]] = []  # 每個文檔的內容雜湊（None 表示尚未載入）
+        self.sources: Optional[List[str]] = []  # 每個文檔的來源檔案（空字串表示未追蹤）
+        self.files: Dict[str, Dict] = {}  # 目錄同步紀錄：path -> {hash, mtime, size}
+        self._chunks_path = None
+        self._mapped_path = None  # 目前以 mmap 開啟的向量庫目錄
+        self._index_path = None  # 索引以 mmap 唯讀開啟時的檔案路徑
+        self.query_batcher = None  # 啟用後併發查詢合併成批次編碼
+    
+    @property
+    def encoder(self):
+        """第一次編碼時才載入模型（同名模型共用同一個實例）"""
+        return get_encoder(self.model_name)
         
-    def add_documents(self, docs: List[str]):
-        """添加文檔到向量庫"""
+    def add_documents(self, docs: List[str], sources: Optional[List[str]] = None,
+                      embeddings: Optional[np.ndarray] = None):
+        """
+        添加文檔到向量庫（只正規化並加入新的向量，不重建索引）
+        embeddings: 已計算好的已正規化向量（來自快取），提供時不重新編碼
+        """
         print(f"📄 正在處理 {len(docs)} 個文檔...")
+        self._ensure_chunk_meta()
         
         # 儲存文檔
         self.documents.extend(docs)
+        self.chunk_hashes.extend(chunk_hash(doc) for doc in docs)
+        self.sources.extend(sources if sources is not None else [''] * len(docs))
         
         # 計算向量
-        print("🔢 正在計算向量嵌入...")
-        new_embeddings = self.encoder.encode(docs, show_progress_bar=True)
-        
-        if self.embeddings is None:
-            self.embeddings = new_embeddings
+        if embeddings is None:
+            print("🔢 正在計算向量嵌入...")
+            new_embeddings = np.asarray(self.encoder.encode(docs, show_progress_bar=True), dtype=np.float32)
+            _normalize(new_embeddings)
         else:
-            self.embeddings = np.vstack([self.embeddings, new_embeddings])
+            new_embeddings = np.ascontiguousarray(embeddings, dtype=np.float32)
         
-        # 建立 FAISS 索引
-        self._build_index()
+        self._append_embeddings(new_embeddings)
+        self._add_to_index(new_embeddings)
         print(f"✅ 已添加 {len(docs)} 個文檔，總計 {len(self.documents)} 個")
     
-    def _build_index(self):
-        """建立 FAISS 索引"""
+    def _append_embeddings(self, new_embeddings: np.ndarray):
+        """附加到容量倍增的緩衝區，避免每次 vstack 複製整個矩陣"""
+        count = 0 if self.embeddings is None else len(self.embeddings)
+        needed = count + len(new_embeddings)
+        if self._buffer is None or len(self._buffer) < needed or self._buffer.shape[1] != new_embeddings.shape[1]:
+            capacity = max(needed, 2 * len(self._buffer) if self._buffer is not None else 0, 1024)
+            buffer = np.empty((capacity, new_embeddings.shape[1]), dtype=np.float32)
+            if count:
+                buffer[:count] = self.embeddings
+            self._buffer = buffer
+        self._buffer[count:needed] = new_embeddings
+        self.embeddings = self._buffer[:needed]
+    
+    def _add_to_index(self, vectors: np.ndarray):
+        """
+        把已正規化的向量加入現有索引（沒有索引時建立）
+        auto 模式下文檔數跨過門檻、或 IVF / PQ 資料量成長太多時，由全部向量重建
+        """
+        faiss = _faiss()
+        if faiss is None:
+            self.index = None
+            return
+        if self.index is None:
+            self.index = self._new_index(vectors)
+        elif self._needs_rebuild(self.index.ntotal + len(vectors)):
+            # vectors 已附加到 embeddings，重建時一併加入
+            self.index = None
+            self.index = self._new_index(np.ascontiguousarray(self.embeddings, dtype=np.float32))
+        else:
+            self._writable_index().add(vectors)
+    
+    def _writable_index(self):
+        """
+        修改前把以 mmap 唯讀開啟的索引完整讀入記憶體（IVF 的倒排表在唯讀模式下無法加入向量）
+        檔案已被替換而與目前的索引不一致時，改由全部向量重建
+        """
+        if self._index_path is None:
+            return self.index
+        faiss = _faiss()
+        ntotal = self.index.ntotal
+        index_path, self._index_path = self._index_path, None
         try:
-            import faiss
-            dimension = self.embeddings.shape[1]
-            self.index = faiss.IndexFlatIP(dimension)  # 使用內積相似度
-            
-            # 正規化向量
-            faiss.normalize_L2(self.embeddings)
-            self.index.add(self.embeddings)
-            
-        except ImportError:
+            index = faiss.read_index(index_path)
+        except Exception:
+            index = None
+        if index is None or index.ntotal != ntotal or index.d != self.index.d:
+            self.index = self._new_index(np.ascontiguousarray(self.embeddings[:ntotal], dtype=np.float32))
+        else:
+            self._apply_search_params(index)
+            self.index = index
+        return self.index
+    
+    def _target_kind(self, count: int) -> str:
+        kind = select_index_type(count) if self.index_type == "auto" else self.index_type
+        if kind == "ivf" and count < 39:
+            kind = "flat"  # 樣本太少無法訓練
+        return kind
+    
+    def _target_quantization(self, count: int) -> str:
+        if self.quantization == "pq" and count < PQ_MIN_TRAIN:
+            return "none"  # 樣本太少無法訓練
+        return self.quantization
+    
+    def _needs_rebuild(self, count: int) -> bool:
+        if self._target_kind(count) != self.index_kind:
+            return True
+        if self._target_quantization(count) != self.index_quantization:
+            return True
+        trained = self.index_kind == "ivf" or self.index_quantization == "pq"
+        return trained and count >= IVF_RETRAIN_GROWTH * max(self._trained_on, 1)
+    
+    def _new_index(self, vectors: np.ndarray):
+        """建立（必要時訓練）索引並加入 vectors，全部使用內積相似度"""
+        faiss = _faiss()
+        dimension = vectors.shape[1]
+        kind = self._target_kind(len(vectors))
+        quantization = self._target_quantization(len(vectors))
+        
+        codec = {
+            "none": "Flat",
+            "fp16": "SQfp16",
+            "int8": "SQ8",
+            "pq": f"PQ{pq_subquantizers(dimension)}"
+        }[quantization]
+        if kind == "hnsw":
+            spec = f"HNSW{HNSW_M}" if quantization == "none" else f"HNSW{HNSW_M},{codec}"
+        elif kind == "ivf":
+            spec = f"IVF{ivf_nlist(len(vectors))},{codec}"
+        else:
+            spec = codec
+        index = faiss.index_factory(dimension, spec, faiss.METRIC_INNER_PRODUCT)
+        if kind == "hnsw":
+            index.hnsw.efConstruction = HNSW_EF_CONSTRUCTION
+        
+        if not index.is_trained:
+            limit = max(256 * ivf_nlist(len(vectors)), TRAIN_SAMPLE) if kind == "ivf" else TRAIN_SAMPLE
+            sample = vectors
+            if len(vectors) > limit:
+                rows = np.random.default_rng(0).choice(len(vectors), limit, replace=False)
+                sample = vectors[np.sort(rows)]
+            print(f"🧮 訓練索引 ({spec})...")
+            index.train(np.ascontiguousarray(sample))
+            self._trained_on = len(vectors)
+        
+        index.add(vectors)
+        self.index_kind = kind
+        self.index_quantization = quantization
+        self._index_path = None
+        self._apply_search_params(index)
+        return index
+    
+    def _apply_search_params(self, index):
+        """套用查詢參數（nprobe / efSearch）"""
+        faiss = _faiss()
+        if faiss is None or index is None:
+            return
+        if self.index_kind == "ivf":
+            faiss.extract_index_ivf(index).nprobe = self.nprobe
+        elif self.index_kind == "hnsw":
+            index.hnsw.efSearch = self.ef_search
+    
+    def set_search_params(self, nprobe: Optional[int] = None, ef_search: Optional[int] = None):
+        """調整查詢時的準確度 / 延遲取捨"""
+        if nprobe is not None:
+            self.nprobe = nprobe
+        if ef_search is not None:
+            self.ef_search = ef_search
+        self._apply_search_params(self.index)
+    
+    def index_info(self) -> Dict:
+        info = {"type": self.index_kind, "requested": self.index_type,
+                "quantization": self.index_quantization, "rerank": self.rerank}
+        if self.index_kind == "ivf":
+            info.update({"nlist": _faiss().extract_index_ivf(self.index).nlist,
+                         "nprobe": self.nprobe, "trained_on": self._trained_on})
+        elif self.index_kind == "hnsw":
+            info.update({"M": HNSW_M, "ef_search": self.ef_search})
+        return info
+    
+    def memory_report(self) -> Dict:
+        """索引實際佔用的記憶體（序列化大小）與每個向量的 bytes，對照未壓縮的 float32"""
+        faiss = _faiss()
+        if faiss is None or self.index is None or not self.index.ntotal:
+            return {}
+        index_bytes = faiss.serialize_index(self.index).nbytes
+        float32_bytes = 4 * self.index.d
+        per_vector = index_bytes / self.index.ntotal
+        return {
+            "vectors": self.index.ntotal,
+            "index_mb": round(index_bytes / 2 ** 20, 2),
+            "bytes_per_vector": round(per_vector, 1),
+            "float32_bytes_per_vector": float32_bytes,
+            "compression": round(float32_bytes / per_vector, 2)
+        }
+    
+    def _search_vectors(self, queries: np.ndarray, k: int, rerank: Optional[bool] = None):
+        """
+        以索引搜尋已正規化的查詢向量，回傳 (scores, ids)，找不到的位置 id 為 -1
+        索引經過壓縮時先多取候選，再以 float32 向量（載入時為 mmap）精確重新排序
+        """
+        if rerank is None:
+            rerank = self.rerank > 0 and self.index_quantization not in (None, "none")
+        fetch = min(k * max(self.rerank, 1), self.index.ntotal) if rerank else k
+        scores, ids = self.index.search(queries, fetch)
+        if self.index.metric_type == _faiss().METRIC_L2:
+            # HNSW + PQ 只支援 L2；向量已正規化，距離平方 = 2 - 2 * 內積
+            scores = 1 - scores / 2
+        if not rerank:
+            return scores, ids
+        
+        out_scores = np.full((len(queries), k), -np.inf, dtype=np.float32)
+        out_ids = np.full((len(queries), k), -1, dtype=np.int64)
+        for row, (query, candidates) in enumerate(zip(queries, ids)):
+            candidates = np.unique(candidates[candidates >= 0])  # 排序後讀取 mmap 較連續
+            if not len(candidates):
+                continue
+            exact = np.asarray(self.embeddings[candidates], dtype=np.float32) @ query
+            top = np.argsort(-exact)[:k]
+            out_scores[row, :len(top)] = exact[top]
+            out_ids[row, :len(top)] = candidates[top]
+        return out_scores, out_ids
+    
+    def recall_at_k(self, k: int = 10, queries: int = 200, seed: int = 0) -> Dict:
+        """
+        以庫中隨機向量為查詢，比較目前索引與精確搜尋 (flat) 的 recall@k 與每次查詢延遲
+        索引經過壓縮時另外回報重新排序前後的 recall 與索引的記憶體用量
+        """
+        faiss = _faiss()
+        if faiss is None or self.index is None or self.embeddings is None or not len(self.embeddings):
+            return {}
+        vectors = np.ascontiguousarray(self.embeddings, dtype=np.float32)
+        k = min(k, len(vectors))
+        rows = np.random.default_rng(seed).choice(len(vectors), min(queries, len(vectors)), replace=False)
+        sample = vectors[rows]
+        
+        exact = faiss.IndexFlatIP(vectors.shape[1])
+        exact.add(vectors)
+        started = time.perf_counter()
+        _, truth = exact.search(sample, k)
+        exact_ms = (time.perf_counter() - started) * 1000 / len(sample)
+        
+        started = time.perf_counter()
+        _, found = self._search_vectors(sample, k)
+        index_ms = (time.perf_counter() - started) * 1000 / len(sample)
+        
+        def recall(found):
+            hits = sum(len(set(t) & set(f[f >= 0])) for t, f in zip(truth, found))
+            return round(hits / (k * len(sample)), 4)
+        
+        report = {
+            "index": self.index_info(),
+            "memory": self.memory_report(),
+            "k": k,
+            "queries": len(sample),
+            "recall": recall(found),
+            "index_ms_per_query": round(index_ms, 4),
+            "exact_ms_per_query": round(exact_ms, 4)
+        }
+        if self.index_quantization not in (None, "none"):
+            _, raw = self._search_vectors(sample, k, rerank=False)
+            report["recall_without_rerank"] = recall(raw)
+        return report
+    
+    def _ensure_chunk_meta(self):
+        """載入（或為舊資料計算）每個文檔的內容雜湊與來源"""
+        if self.chunk_hashes is not None:
+            return
+        if self._chunks_path and os.path.exists(self._chunks_path):
+            with open(self._chunks_path, 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+            self.chunk_hashes, self.sources = meta["hashes"], meta["sources"]
+        else:
+            self.chunk_hashes = [chunk_hash(doc) for doc in self.documents]
+            self.sources = [''] * len(self.chunk_hashes)
+    
+    def chunk_source(self, idx: int) -> str:
+        """第 idx 個文檔的來源檔案（未追蹤時為空字串）"""
+        self._ensure_chunk_meta()
+        return self.sources[idx]
+    
+    def keep_rows(self, keep: np.ndarray):
+        """只保留 keep (bool) 為 True 的文檔，並由保留的向量重建索引（不重新編碼）"""
+        self._ensure_chunk_meta()
+        rows = np.flatnonzero(keep)
+        documents = DocumentTable()
+        documents.extend([self.documents[i] for i in rows])
+        self.documents = documents
+        self.chunk_hashes = [self.chunk_hashes[i] for i in rows]
+        self.sources = [self.sources[i] for i in rows]
+        
+        kept = np.ascontiguousarray(np.asarray(self.embeddings)[rows], dtype=np.float32) \
+            if self.embeddings is not None else None
+        self._buffer = None
+        self.embeddings = None
+        self.index = None
+        self.index_kind = None
+        self.index_quantization = None
+        if kept is not None and len(kept):
+            self._append_embeddings(kept)
+            self._add_to_index(self.embeddings)
+    
+    def _build_index(self):
+        """由全部向量重建 FAISS 索引（只在沒有可用的索引檔時使用）"""
+        self.index = None
+        self.index_kind = None
+        self.index_quantization = None
+        if _faiss() is None:
             print("⚠️ FAISS 未安裝，使用簡單的 numpy 搜尋")
-            self.index = None
+            return
+        self.embeddings = np.ascontiguousarray(self.embeddings, dtype=np.float32)
+        _normalize(self.embeddings)
+        self._add_to_index(self.embeddings)
+    
+    def enable_query_batching(self, **kwargs):
+        """併發的查詢編碼合併成批次呼叫（參數見 QueryBatcher，未指定時讀取環境變數）"""
+        from query_batcher import QueryBatcher
+        
+        def encode(texts):
+            return self.encoder.encode(texts, batch_size=len(texts), show_progress_bar=False)
+        
+        self.query_batcher = QueryBatcher(encode, **kwargs) if kwargs else QueryBatcher.from_env(encode)
+        return self.query_batcher
+    
+    def encode_query(self, query: str) -> np.ndarray:
+        """計算已正規化的查詢向量，形狀為 (1, dimension)"""
+        if self.query_batcher is not None:
+            query_embedding = self.query_batcher.encode(query).reshape(1, -1).copy()
+        else:
+            query_embedding = np.asarray(self.encoder.encode([query]), dtype=np.float32).reshape(1, -1)
+        _normalize(query_embedding)
+        return query_embedding
     
-    def search(self, query: str, k: int = 3) -> List[Dict]:
-        """搜尋相似文檔"""
+    def search(self, query: str, k: int = 3, query_embedding: Optional[np.ndarray] = None) -> List[Dict]:
+        """搜尋相似文檔（已有查詢向量時可直接傳入，不重新編碼）"""
         if len(self.documents) == 0:
             return []
         
         # 計算查詢向量
-        query_embedding = self.encoder.encode([query])
+        if query_embedding is None:
+            query_embedding = self.encode_query(query)
+        query_embedding = np.ascontiguousarray(query_embedding, dtype=np.float32).reshape(1, -1)
         
         if self.index is not None:
             # 使用 FAISS 搜尋
-            import faiss
-            faiss.normalize_L2(query_embedding)
-            scores, indices = self.index.search(query_embedding, k)
+            scores, indices = self._search_vectors(query_embedding, k)
             
             results = []
             for score, idx in zip(scores[0], indices[0]):
-                if idx < len(self.documents):
+                if 0 <= idx < len(self.documents):
                     results.append({
+                        'id': int(idx),
                         'content': self.documents[idx],
                         'score': float(score)
                     })
@@ -89,44 +585,170 @@ class SimpleVectorStore:
             results = []
             for idx in top_indices:
                 results.append({
+                    'id': int(idx),
                     'content': self.documents[idx],
                     'score': float(similarities[idx])
                 })
             return results
     
-    def save(self, path: str):
-        """儲存向量庫"""
-        data = {
-            'documents': self.documents,
-            'embeddings': self.embeddings,
-            'model_name': self.model_name
-        }
+    def save(self, path: str = DEFAULT_STORE_PATH):
+        """
+        儲存為目錄格式：先寫到暫存目錄，完成後再替換，
+        讀取中的程序仍使用舊檔案的 mmap，不會讀到寫到一半的內容
+        覆寫本身載入的目錄時，替換前先關閉自己的 mmap（Windows 無法更名開啟中的檔案），
+        替換後再以 mmap 開啟新檔案
+        """
+        path = os.path.abspath(path)
+        parent = os.path.dirname(path)
+        os.makedirs(parent, exist_ok=True)
         
-        # 修正路徑問題
-        dir_path = os.path.dirname(path)
-        if dir_path:  # 只有當目錄路徑不為空時才建立
-            os.makedirs(dir_path, exist_ok=True)
+        staging = os.path.join(parent, f".{os.path.basename(path)}.staging-{uuid.uuid4().hex[:8]}")
+        os.makedirs(staging)
+        try:
+            dimension = 0 if self.embeddings is None else int(self.embeddings.shape[1])
+            embeddings = self.embeddings if self.embeddings is not None else np.zeros((0, dimension), dtype=np.float32)
+            np.save(os.path.join(staging, "embeddings.npy"), np.ascontiguousarray(embeddings, dtype=np.float32))
+            self.documents.write(staging)
             
-        with open(path, 'wb') as f:
-            pickle.dump(data, f)
+            self._ensure_chunk_meta()
+            with open(os.path.join(staging, "chunks.json"), 'w', encoding='utf-8') as f:
+                json.dump({"hashes": self.chunk_hashes, "sources": self.sources}, f, ensure_ascii=False)
+            with open(os.path.join(staging, "sync.json"), 'w', encoding='utf-8') as f:
+                json.dump(self.files, f, ensure_ascii=False, indent=2)
+            
+            faiss = _faiss()
+            if faiss is not None and self.index is not None:
+                faiss.write_index(self.index, os.path.join(staging, "index.faiss"))
+            
+            manifest = {
+                "format": STORE_FORMAT,
+                "model_name": self.model_name,
+                "dimension": dimension,
+                "count": len(self.documents),
+                "version": self.version + 1,
+                "created": time.time(),
+                "index": self.index_info() if self.index is not None else None
+            }
+            with open(os.path.join(staging, "manifest.json"), 'w', encoding='utf-8') as f:
+                json.dump(manifest, f, ensure_ascii=False, indent=2)
+            
+        except Exception:
+            shutil.rmtree(staging, ignore_errors=True)
+            raise
+        
+        # 替換舊目錄
+        reopen = self._mapped_path == path
+        if reopen:
+            self._close_mapped()
+        previous = f"{staging}.old" if os.path.exists(path) else None
+        try:
+            if previous:
+                _rename(path, previous)
+            try:
+                _rename(staging, path)
+            except OSError:
+                if previous:
+                    _rename(previous, path)
+                raise
+        except OSError:
+            shutil.rmtree(staging, ignore_errors=True)
+            if reopen:
+                self.load(path)
+            raise
+        if previous:
+            shutil.rmtree(previous, ignore_errors=True)
+        
         print(f"💾 向量庫已儲存至: {path}")
+        if reopen:
+            self.load(path)
+        else:
+            self.version += 1
+            self._chunks_path = os.path.join(path, "chunks.json")
+    
+    def _close_mapped(self):
+        """釋放本程序對向量庫檔案的 mmap（重新開啟前向量庫為空）"""
+        self.index = None
+        self._index_path = None
+        self.embeddings = None
+        self._buffer = None
+        self.documents = DocumentTable()
+        self._mapped_path = None
+        gc.collect()
+    
+    def load(self, path: str = DEFAULT_STORE_PATH) -> bool:
+        """載入目錄格式的向量庫（以 mmap 開啟）；舊版 .pkl 需明確使用 load_pickle / migrate_pickle"""
+        if os.path.isfile(path):
+            print("❌ 這是舊版 pickle 向量庫，請用 migrate_pickle() 轉換成目錄格式")
+            return False
+        try:
+            with open(os.path.join(path, "manifest.json"), 'r', encoding='utf-8') as f:
+                manifest = json.load(f)
+            if manifest.get("format") != STORE_FORMAT:
+                raise ValueError(f"不支援的向量庫格式: {manifest.get('format')}")
+            
+            self.documents = DocumentTable.open(path)
+            self.embeddings = np.load(os.path.join(path, "embeddings.npy"), mmap_mode='r')
+            self._buffer = None
+            self.version = manifest.get("version", 0)
+            
+            # 內容雜湊在需要時才讀取（同步或新增文檔時）
+            self.chunk_hashes = self.sources = None
+            self._chunks_path = os.path.join(path, "chunks.json")
+            sync_path = os.path.join(path, "sync.json")
+            self.files = {}
+            if os.path.exists(sync_path):
+                with open(sync_path, 'r', encoding='utf-8') as f:
+                    self.files = json.load(f)
+            if len(self.documents) != len(self.embeddings):
+                raise ValueError("文檔數與向量數不一致")
+            self._mapped_path = os.path.abspath(path)
+            
+            self.model_name = manifest["model_name"]
+            
+            index_meta = manifest.get("index") or {}
+            self._trained_on = index_meta.get("trained_on", 0)
+            self.index = self._read_index(os.path.join(path, "index.faiss"))
+            if self.index is not None:
+                self.index_quantization = index_meta.get("quantization", "none")
+            if self.index is not None and self._needs_rebuild(self.index.ntotal):
+                # 要求的索引類型或壓縮方式與儲存的不同
+                self.index = None
+            if self.index is None and len(self.embeddings):
+                # 儲存的向量已正規化，直接加入
+                self._add_to_index(np.ascontiguousarray(self.embeddings))
+            
+            print(f"📂 向量庫已載入: {len(self.documents)} 個文檔 (版本 {self.version})")
+            return True
+            
+        except Exception as e:
+            print(f"❌ 載入失敗: {e}")
+            return False
     
-    def load(self, path: str) -> bool:
-        """載入向量庫"""
+    def load_pickle(self, path: str) -> bool:
+        """載入舊版 pickle 向量庫（只用於轉換，pickle 不可載入來源不明的檔案）"""
         try:
             with open(path, 'rb') as f:
                 data = pickle.load(f)
             
-            self.documents = data['documents']
+            self.documents = DocumentTable()
+            self.documents.extend(data['documents'])
             self.embeddings = data['embeddings']
-            self.model_name = data['model_name']
+            self._buffer = None
+            self._mapped_path = None
+            self.chunk_hashes = self.sources = None
+            self._chunks_path = None
+            self.files = {}
             
-            # 重新載入模型
-            self.encoder = SentenceTransformer(self.model_name)
+            self.model_name = data['model_name']
             
-            # 重建索引
+            self.index = None
+            self.index_kind = None
+            self.index_quantization = None
             if self.embeddings is not None:
-                self._build_index()
+                self.embeddings = np.asarray(self.embeddings, dtype=np.float32)
+                self.index = self._read_index(index_path_for(path))
+                if self.index is None:
+                    self._build_index()
             
             print(f"📂 向量庫已載入: {len(self.documents)} 個文檔")
             return True
@@ -134,12 +756,53 @@ class SimpleVectorStore:
         except Exception as e:
             print(f"❌ 載入失敗: {e}")
             return False
+    
+    def _read_index(self, index_path: str):
+        """
+        讀取已保存的索引（盡量以 mmap 唯讀開啟，加入向量前由 _writable_index 讀入記憶體）
+        不存在或與向量不一致時回傳 None
+        """
+        self._index_path = None
+        faiss = _faiss()
+        if faiss is None or not os.path.exists(index_path):
+            return None
+        try:
+            index = faiss.read_index(index_path, faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY)
+            mapped = True
+        except Exception:
+            index = faiss.read_index(index_path)
+            mapped = False
+        if index.ntotal != len(self.embeddings) or index.d != self.embeddings.shape[1]:
+            print("⚠️ 索引檔與向量庫不一致，重新建立索引")
+            return None
+        if mapped:
+            self._index_path = index_path
+        name = type(index).__name__
+        self.index_kind = "hnsw" if "HNSW" in name else "ivf" if "IVF" in name else "flat"
+        self.index_quantization = "none"  # 目錄格式由 manifest 覆寫
+        self._apply_search_params(index)
+        return index
+
+
+def migrate_pickle(pickle_path: str = LEGACY_PICKLE_PATH, store_path: str = DEFAULT_STORE_PATH,
+                   model_name: str = "all-MiniLM-L6-v2") -> bool:
+    """把舊版 vectorstore.pkl 轉換成目錄格式（不重新計算向量）"""
+    if not os.path.isfile(pickle_path):
+        print(f"❌ 找不到舊版向量庫: {pickle_path}")
+        return False
+    vectorstore = SimpleVectorStore(model_name)
+    if not vectorstore.load_pickle(pickle_path):
+        return False
+    vectorstore.save(store_path)
+    print(f"🔁 已將 {pickle_path} 轉換為 {store_path}/")
+    return True
 
 
 class DocumentProcessor:
     """文檔處理器"""
     
     def __init__(self):
+        from langchain_text_splitters import RecursiveCharacterTextSplitter
         self.text_splitter = RecursiveCharacterTextSplitter(
             chunk_size=500,
             chunk_overlap=50
@@ -152,6 +815,8 @@ class DocumentProcessor:
         for url in urls:
             try:
                 print(f"🌐 載入網頁: {url}")
+                import bs4
+                from langchain_community.document_loaders import WebBaseLoader
                 loader = WebBaseLoader(
                     web_paths=[url],
                     bs_kwargs=dict(
@@ -174,57 +839,66 @@ class DocumentProcessor:
     def process_text_files(self, file_paths: List[str]) -> List[str]:
         """處理文字檔案"""
         all_chunks = []
-        
         for file_path in file_paths:
-            try:
-                print(f"📄 載入檔案: {file_path}")
-                chunks = []
-                
-                if file_path.endswith('.pdf'):
-                    loader = PyPDFLoader(file_path)
-                    docs = loader.load()
-                    for doc in docs:
-                        chunks = self.text_splitter.split_text(doc.page_content)
-                        all_chunks.extend(chunks)
-                elif file_path.endswith(('.tsx', '.ts', '.jsx', '.js', '.py', '.html', '.css')):
-                    # 處理程式碼檔案，使用直接讀取方式
-                    with open(file_path, 'r', encoding='utf-8') as f:
-                        content = f.read()
-                    
-                    # 為程式碼檔案添加特殊處理
-                    file_info = f"檔案路徑: {file_path}\n檔案類型: {'React TypeScript組件' if file_path.endswith('.tsx') else '程式碼檔案'}\n\n"
-                    content = file_info + content
-                    
-                    chunks = self.text_splitter.split_text(content)
+            all_chunks.extend(self.split_file(file_path) or [])
+        return all_chunks
+    
+    def split_file(self, file_path: str) -> Optional[List[str]]:
+        """載入並切分單一檔案（可在多個執行緒中同時呼叫），無法讀取時回傳 None"""
+        all_chunks = []
+        
+        try:
+            print(f"📄 載入檔案: {file_path}")
+            chunks = []
+            
+            if file_path.endswith('.pdf'):
+                from langchain_community.document_loaders import PyPDFLoader
+                loader = PyPDFLoader(file_path)
+                docs = loader.load()
+                for doc in docs:
+                    chunks = self.text_splitter.split_text(doc.page_content)
                     all_chunks.extend(chunks)
-                else:
-                    # 處理一般文字檔案
-                    loader = TextLoader(file_path, encoding='utf-8')
-                    docs = loader.load()
-                    for doc in docs:
-                        chunks = self.text_splitter.split_text(doc.page_content)
-                        all_chunks.extend(chunks)
+            elif file_path.endswith(('.tsx', '.ts', '.jsx', '.js', '.py', '.html', '.css')):
+                # 處理程式碼檔案，使用直接讀取方式
+                with open(file_path, 'r', encoding='utf-8') as f:
+                    content = f.read()
                 
-                print(f"  ✅ 已處理，獲得 {len(chunks)} 個文字塊")
+                # 為程式碼檔案添加特殊處理
+                file_info = f"檔案路徑: {file_path}\n檔案類型: {'React TypeScript組件' if file_path.endswith('.tsx') else '程式碼檔案'}\n\n"
+                content = file_info + content
                 
-            except Exception as e:
-                print(f"  ❌ 處理失敗: {e}")
-                # 如果UTF-8失敗，嘗試其他編碼
-                try:
-                    with open(file_path, 'r', encoding='utf-8-sig') as f:
-                        content = f.read()
-                    file_info = f"檔案路徑: {file_path}\n\n"
-                    content = file_info + content
-                    chunks = self.text_splitter.split_text(content)
+                chunks = self.text_splitter.split_text(content)
+                all_chunks.extend(chunks)
+            else:
+                # 處理一般文字檔案
+                from langchain_community.document_loaders import TextLoader
+                loader = TextLoader(file_path, encoding='utf-8')
+                docs = loader.load()
+                for doc in docs:
+                    chunks = self.text_splitter.split_text(doc.page_content)
                     all_chunks.extend(chunks)
-                    print(f"  ✅ 重新處理成功，獲得 {len(chunks)} 個文字塊")
-                except Exception as e2:
-                    print(f"  ❌ 重新處理也失敗: {e2}")
+            
+            print(f"  ✅ 已處理，獲得 {len(chunks)} 個文字塊")
+            
+        except Exception as e:
+            print(f"  ❌ 處理失敗: {e}")
+            # 如果UTF-8失敗，嘗試其他編碼
+            try:
+                with open(file_path, 'r', encoding='utf-8-sig') as f:
+                    content = f.read()
+                file_info = f"檔案路徑: {file_path}\n\n"
+                content = file_info + content
+                chunks = self.text_splitter.split_text(content)
+                all_chunks.extend(chunks)
+                print(f"  ✅ 重新處理成功，獲得 {len(chunks)} 個文字塊")
+            except Exception as e2:
+                print(f"  ❌ 重新處理也失敗: {e2}")
+                return None
         
         return [chunk for chunk in all_chunks if len(chunk.strip()) > 50]
 
 
-def create_vectorstore_from_urls(urls: List[str], save_path: str = "vectorstore.pkl"):
+def create_vectorstore_from_urls(urls: List[str], save_path: str = DEFAULT_STORE_PATH):
     """從 URL 建立向量庫"""
     processor = DocumentProcessor()
     vectorstore = SimpleVectorStore()
@@ -241,6 +915,102 @@ def create_vectorstore_from_urls(urls: List[str], save_path: str = "vectorstore.
         return None
 
 
+def sync_directory(vectorstore: SimpleVectorStore, directory: str,
+                   processor: Optional["DocumentProcessor"] = None,
+                   extensions: List[str] = SUPPORTED_EXTENSIONS,
+                   pipeline_options: Optional[Dict] = None) -> Dict[str, int]:
+    """
+    依同步紀錄增量同步整個目錄：
+    - mtime 與大小都沒變的檔案直接略過（不讀取內容）
+    - 內容雜湊沒變的檔案只更新紀錄
+    - 新增或修改的檔案以 IngestPipeline 重新切塊，只編碼向量庫中還沒有的文檔內容
+    - 已刪除或已修改檔案的舊文檔從向量庫移除
+    - 讀取失敗的檔案保留舊文檔與舊紀錄，下次同步時重試
+    紀錄與文檔來源都以絕對路徑為鍵，從不同的工作目錄同步同一個目錄也能比對
+    """
+    processor = processor or DocumentProcessor()
+    vectorstore._ensure_chunk_meta()
+    stats = {"scanned": 0, "unchanged": 0, "changed": 0, "added": 0, "deleted": 0, "failed": 0,
+             "chunks_added": 0, "chunks_removed": 0, "encoded": 0, "reused": 0}
+    
+    # 舊版以相對路徑記錄，視為相對於目前的工作目錄
+    if any(not os.path.isabs(path) for path in vectorstore.files):
+        vectorstore.files = {os.path.abspath(path): record for path, record in vectorstore.files.items()}
+    
+    # 掃描目錄
+    root = os.path.abspath(directory)
+    found = {}
+    for ext in extensions:
+        for file_path in Path(root).glob(f"**/*{ext}"):
+            if file_path.is_file():
+                found[os.path.abspath(str(file_path))] = file_path.stat()
+    stats["scanned"] = len(found)
+    
+    changed = {}  # path -> 新的同步紀錄
+    for path, stat in sorted(found.items()):
+        record = vectorstore.files.get(path)
+        if record and record["mtime"] == stat.st_mtime and record["size"] == stat.st_size:
+            stats["unchanged"] += 1
+            continue
+        digest = file_hash(path)
+        new_record = {"hash": digest, "mtime": stat.st_mtime, "size": stat.st_size}
+        if record and record["hash"] == digest:
+            vectorstore.files[path] = new_record
+            stats["unchanged"] += 1
+            continue
+        stats["changed" if record else "added"] += 1
+        changed[path] = new_record
+    
+    prefix = os.path.join(root, '')
+    deleted = [path for path in vectorstore.files
+               if (path.startswith(prefix) or os.path.dirname(path) == root) and path not in found]
+    stats["deleted"] = len(deleted)
+    
+    if not changed and not deleted:
+        print(f"✅ 目錄已是最新狀態（{stats['scanned']} 個檔案）")
+        return stats
+    
+    # 現有向量的快取：內容雜湊 -> 列（新文檔附加在後面，舊列的位置不變）
+    old_count = len(vectorstore.documents)
+    cached_rows = {h: i for i, h in enumerate(vectorstore.chunk_hashes)}
+    
+    def lookup(h):
+        row = cached_rows.get(h)
+        return None if row is None else np.asarray(vectorstore.embeddings[row])
+    
+    # 新增或修改的檔案以管線匯入，只編碼快取中沒有的內容
+    from ingest_pipeline import IngestPipeline
+    pipeline = IngestPipeline.from_env(vectorstore, processor, lookup=lookup) if pipeline_options is None \
+        else IngestPipeline(vectorstore, processor, lookup=lookup, **pipeline_options)
+    run = pipeline.run(list(changed)) if changed else {"chunks": 0, "encoded": 0, "reused": 0}
+    stats["chunks_added"] = run["chunks"]
+    stats["encoded"] = run["encoded"]
+    stats["reused"] = run["reused"]
+    # 讀取失敗的檔案不更新紀錄也不移除舊文檔
+    for path in pipeline.failed:
+        changed.pop(path, None)
+    stats["failed"] = len(pipeline.failed)
+    
+    # 移除已刪除或已修改檔案的舊文檔；未追蹤來源但內容相同的文檔改由新的來源接手，避免重複
+    stale = set(changed) | set(deleted)
+    adopted = set(vectorstore.chunk_hashes[old_count:])
+    keep = np.ones(len(vectorstore.documents), dtype=bool)
+    keep[:old_count] = [
+        (not source or os.path.abspath(source) not in stale) and not (source == '' and h in adopted)
+        for source, h in zip(vectorstore.sources[:old_count], vectorstore.chunk_hashes[:old_count])
+    ]
+    stats["chunks_removed"] = int((~keep).sum())
+    if stats["chunks_removed"]:
+        vectorstore.keep_rows(keep)
+    
+    for path in deleted:
+        del vectorstore.files[path]
+    vectorstore.files.update(changed)
+    
+    print(f"✅ 同步完成: {stats}")
+    return stats
+
+
 # 簡單的命令列工具
 if __name__ == "__main__":
     print("🛠️ 簡化向量資料庫工具")
@@ -256,6 +1026,8 @@ if __name__ == "__main__":
         print("2. 載入本地檔案")
         print("3. 載入整個目錄")
         print("4. 測試搜尋")
+        print("5. 轉換舊版 vectorstore.pkl")
+        print("6. 檢查索引召回率 (recall@k)")
         print("0. 退出")
         
         choice = input("\n請輸入選項: ").strip()
@@ -269,50 +1041,37 @@ if __name__ == "__main__":
                 chunks = processor.process_web_urls([url])
                 if chunks:
                     vectorstore.add_documents(chunks)
-                    vectorstore.save("vectorstore.pkl")
+                    vectorstore.save(DEFAULT_STORE_PATH)
                     print("✅ 向量庫建立完成！")
                     
         elif choice == "2":
             files = input("請輸入檔案路徑 (用逗號分隔): ").strip()
             if files:
                 file_list = [f.strip() for f in files.split(",")]
-                chunks = processor.process_text_files(file_list)
-                if chunks:
-                    vectorstore.add_documents(chunks)
-                    vectorstore.save("vectorstore.pkl")
+                # 載入、編碼與寫入同時進行
+                from ingest_pipeline import IngestPipeline
+                stats = IngestPipeline.from_env(vectorstore, processor).run(file_list)
+                if stats["chunks"]:
+                    vectorstore.save(DEFAULT_STORE_PATH)
                     print("✅ 向量庫建立完成！")
                     
         elif choice == "3":
             directory = input("請輸入目錄路徑: ").strip()
             if os.path.exists(directory):
-                from pathlib import Path
-                file_paths = []
-                # 擴展支援的檔案格式
-                for ext in ['.txt', '.md', '.pdf', '.docx', '.tsx', '.ts', '.jsx', '.js', '.py', '.html', '.css', '.json']:
-                    files = list(Path(directory).glob(f"**/*{ext}"))
-                    file_paths.extend([str(f) for f in files])
-                
-                if file_paths:
-                    print(f"找到 {len(file_paths)} 個檔案")
-                    # 顯示找到的檔案類型
-                    file_types = {}
-                    for fp in file_paths:
-                        ext = Path(fp).suffix
-                        file_types[ext] = file_types.get(ext, 0) + 1
-                    print("檔案類型統計:", file_types)
-                    
-                    chunks = processor.process_text_files(file_paths)
-                    if chunks:
-                        vectorstore.add_documents(chunks)
-                        vectorstore.save("vectorstore.pkl")
-                        print("✅ 向量庫建立完成！")
-                else:
+                # 以現有向量庫為基礎增量同步，重複執行不會產生重複文檔
+                if os.path.isdir(DEFAULT_STORE_PATH):
+                    vectorstore.load(DEFAULT_STORE_PATH)
+                stats = sync_directory(vectorstore, directory, processor)
+                if stats["scanned"] == 0:
                     print("❌ 目錄中沒有找到支援的檔案")
+                elif stats["changed"] or stats["added"] or stats["deleted"]:
+                    vectorstore.save(DEFAULT_STORE_PATH)
+                    print("✅ 向量庫建立完成！")
             else:
                 print("❌ 目錄不存在")
                 
         elif choice == "4":
-            if vectorstore.load("vectorstore.pkl"):
+            if vectorstore.load(DEFAULT_STORE_PATH):
                 while True:
                     query = input("\n請輸入搜尋關鍵字 (或 'quit' 退出): ")
                     if query.lower() == 'quit':
@@ -326,5 +1085,25 @@ if __name__ == "__main__":
             else:
                 print("❌ 請先建立向量庫")
                 
+        elif choice == "5":
+            migrate_pickle(LEGACY_PICKLE_PATH, DEFAULT_STORE_PATH, vectorstore.model_name)
+                
+        elif choice == "6":
+            if vectorstore.load(DEFAULT_STORE_PATH):
+                report = vectorstore.recall_at_k(k=10)
+                if report:
+                    print(f"\n📏 索引: {report['index']}")
+                    print(f"   recall@{report['k']}: {report['recall']:.4f}（{report['queries']} 次查詢）")
+                    if "recall_without_rerank" in report:
+                        print(f"   未重新排序: {report['recall_without_rerank']:.4f}")
+                    memory = report["memory"]
+                    print(f"   每個向量 {memory['bytes_per_vector']} bytes（float32 為 {memory['float32_bytes_per_vector']}），"
+                          f"索引共 {memory['index_mb']} MB")
+                    print(f"   每次查詢: 索引 {report['index_ms_per_query']} ms / 精確 {report['exact_ms_per_query']} ms")
+                else:
+                    print("❌ 需要安裝 FAISS 並建立索引")
+            else:
+                print("❌ 請先建立向量庫")
+                
         else:
             print("❌ 無效選項")
\ No newline at end of file
@@ -0,0 +1,43 @@
+"""
+啟動計時 - 記錄聊天服務冷啟動各階段的耗時
+"""
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+
+class StartupTimer:
+    """依序記錄各階段耗時，啟動完成後印出報告"""
+
+    def __init__(self, started: Optional[float] = None):
+        self.started = started if started is not None else time.perf_counter()
+        self._last = self.started
+        self.phases: List[Dict] = []
+
+    def mark(self, name: str):
+        """記錄從上一個階段結束到現在的耗時"""
+        now = time.perf_counter()
+        self.phases.append({"phase": name, "ms": round((now - self._last) * 1000, 1)})
+        self._last = now
+
+    @contextmanager
+    def phase(self, name: str):
+        """with timer.phase("載入模型"): ..."""
+        self._last = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.mark(name)
+
+    @property
+    def total_ms(self) -> float:
+        return round((self._last - self.started) * 1000, 1)
+
+    def report(self):
+        print("\n⏱️  啟動耗時")
+        for item in self.phases:
+            print(f"   {item['phase']:<20} {item['ms']:>9.1f} ms")
+        print(f"   {'總計':<20} {self.total_ms:>9.1f} ms")
+
+    def as_dict(self) -> Dict:
+        return {"phases": self.phases, "total_ms": self.total_ms}
@@ -29,6 +29,11 @@ export type ClimatePayload = {
   metadata?: { id?: number; year?: number; month?: number; vegetation?: number; water_body?: number };
 };
 
+export type MapBundle = {
+  cells: [number, number][]; // [column_id, row_id]，所有 frame 共用同一順序
+  frames: { type: string; year?: number; month: number; vegetation?: number; values: (number | null)[] }[];
+};
+
 // 封裝你文件裡的 5 個端點
 export const ClimateAPI = {
   history: (y: number, m: number, col: number, row: number) =>
@@ -48,4 +53,12 @@ export const ClimateAPI = {
       "Apparent_Temperature"|"Apparent_Temperature_High"|"Apparent_Temperature_Low",
       y: number, m: number) =>
     fetchJSON<Record<string, Record<string, number>>>(`/formap/${type}/${y}/${m}`),
-};
+
+  // 一次取回多個 frame（例如整年 12 個月），避免動畫時連發請求
+  formapBundle: (y: number, types: string[] = ["Temperature"], months = "1-12") =>
+    fetchJSON<MapBundle>(`/formap/bundle/${y}?types=${types.join(",")}&months=${months}`),
+
+  // veg 可為 "0,0.3,0.6" 或 "start:stop:step"
+  ndviFormapBundle: (m: number, veg = "0:1:0.1", types: string[] = ["Temperature_Predicted"]) =>
+    fetchJSON<MapBundle>(`/formap/NDVI/bundle/${m}?types=${types.join(",")}&veg=${veg}`),
+};
\ No newline at end of file
@@ -122,6 +122,11 @@ export default function EducationSection() {
     setMessages(prev => prev.filter(msg => msg.id !== messageId));
   };
 
+  // 更新訊息內容（串流回答時逐段更新）
+  const updateMessage = (messageId: string | number, content: string): void => {
+    setMessages(prev => prev.map(msg => (msg.id === messageId ? { ...msg, content } : msg)));
+  };
+
   // 發送訊息
   const sendMessage = async () => {
     const message = inputMessage.trim();
@@ -143,7 +148,8 @@ export default function EducationSection() {
     const loadingMsgId = addMessage('正在思考中...', 'loading');
 
     try {
-      const response = await fetch('http://localhost:5001/chat', {
+      // 串流回應（Server-Sent Events）：先收到 meta，再逐段收到 token，最後是 done 或 error
+      const response = await fetch('http://localhost:5001/chat/stream', {
         method: 'POST',
         headers: {
           'Content-Type': 'application/json',
@@ -154,25 +160,73 @@ export default function EducationSection() {
         })
       });
 
-      const data = await response.json();
-      
-      // 移除載入訊息
-      removeMessage(loadingMsgId);
-
-      if (data.success) {
-        addMessage(data.response, 'bot');
-        const sources = data.sources || 0;
-        setSystemStatus(prev => ({
-          ...prev,
-          text: `已回應 (參考 ${sources} 個來源)`
-        }));
-      } else {
+      if (!response.ok || !response.body) {
+        const data = await response.json();
+        removeMessage(loadingMsgId);
         addMessage(`錯誤: ${data.error}`, 'error');
         setSystemStatus(prev => ({
           ...prev,
           status: 'error',
           text: '回應失敗'
         }));
+        return;
+      }
+
+      const reader = response.body.getReader();
+      const decoder = new TextDecoder();
+      let buffer = '';
+      let answer = '';
+      let botMsgId: string | number | null = null;
+
+      const handleEvent = (event: string, data: any) => {
+        if (event === 'token') {
+          answer += data.text;
+          if (botMsgId === null) {
+            // 收到第一段回答時移除載入訊息
+            removeMessage(loadingMsgId);
+            botMsgId = addMessage(answer, 'bot');
+          } else {
+            updateMessage(botMsgId, answer);
+          }
+        } else if (event === 'done') {
+          if (botMsgId === null) {
+            // 沒有收到任何 token（例如回答為空）時也要移除載入訊息
+            removeMessage(loadingMsgId);
+            if (data.response) botMsgId = addMessage(data.response, 'bot');
+          }
+          const sources = data.sources || 0;
+          setSystemStatus(prev => ({
+            ...prev,
+            text: `已回應 (參考 ${sources} 個來源)`
+          }));
+        } else if (event === 'error') {
+          removeMessage(loadingMsgId);
+          addMessage(`錯誤: ${data.error}`, 'error');
+          setSystemStatus(prev => ({
+            ...prev,
+            status: 'error',
+            text: '回應失敗'
+          }));
+        }
+      };
+
+      while (true) {
+        const { done, value } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+
+        // 事件之間以空行分隔，最後一段可能還沒收完
+        const events = buffer.split('\n\n');
+        buffer = events.pop() || '';
+        for (const raw of events) {
+          let event = 'message';
+          let data = '';
+          for (const line of raw.split('\n')) {
+            if (line.startsWith('event:')) event = line.slice(6).trim();
+            else if (line.startsWith('data:')) data += line.slice(5).trim();
+          }
+          if (data) handleEvent(event, JSON.parse(data));
+        }
       }
 
     } catch (error) {
@@ -5,6 +5,7 @@ import { motion, useInView, useScroll, useTransform } from 'framer-motion';
 import type { Feature, FeatureCollection, GeoJsonProperties, Polygon, MultiPolygon } from 'geojson';
 import L, { GeoJSON as LGeoJSON, LatLng } from 'leaflet';
 import 'leaflet/dist/leaflet.css';
+import type { MapBundle } from '@/lib/api';
 
 // === 批次地圖資料（時間模式）=== 
 type CellKey = string;
@@ -14,11 +15,16 @@ const makeCellKey = (r: number, c: number) => `${r}-${c}`;
 // 用 ref 是為了避免重新 render 造成 Map 重置
 const timeGridCacheRef = { current: new Map<string, Map<CellKey, number>>() };
 // 中央化管理未來可替換的端點路徑 —— 只改這裡就能換路徑
-const VEG_FORMAP_URL = (base: string, month: number, veg01: number) =>
-  `${base}/formap/NDVI/Temperature_Predicted/${veg01.toFixed(2)}/${String(month).padStart(2, '0')}`;
+// bundle 端點一次回傳多個 frame：時間模式一年 12 個月、植被模式一個月 0~100% 每 1% 一層
+const TIME_BUNDLE_URL = (base: string, year: number) =>
+  `${base}/formap/bundle/${year}?types=Temperature&months=1-12`;
+const VEG_BUNDLE_URL = (base: string, month: number) =>
+  `${base}/formap/NDVI/bundle/${month}?types=Temperature_Predicted&veg=0:1:0.01`;
 
 // 植被的批次結果快取：(month, veg01) → Map<"row-col", value>
 const vegGridCacheRef = { current: new Map<string, Map<CellKey, number>>() };
+// 進行中的 bundle 請求（同一包只發一次）
+const bundleRequestsRef = { current: new Map<string, Promise<void>>() };
 
 /* =================== 工具 & 型別 =================== */
 
@@ -67,6 +73,28 @@ async function fetchJSON<T = any>(url: string, init: RequestInit = {}): Promise<
   }
 }
 
+// bundle 的每個 frame 轉成 Map<"row-col", value>
+function bundleFrameToMap(cells: MapBundle['cells'], values: (number | null)[]) {
+  const map = new Map<CellKey, number>();
+  cells.forEach(([c, r], i) => {
+    const v = values[i];
+    if (typeof v === 'number') map.set(makeCellKey(r, c), v);
+  });
+  return map;
+}
+
+// 同一個 bundle 只請求一次，完成後由 store 把各 frame 放進快取
+function loadBundle(key: string, url: string, store: (bundle: MapBundle) => void) {
+  let pending = bundleRequestsRef.current.get(key);
+  if (!pending) {
+    pending = fetchJSON<MapBundle>(url)
+      .then(store)
+      .finally(() => { bundleRequestsRef.current.delete(key); });
+    bundleRequestsRef.current.set(key, pending);
+  }
+  return pending;
+}
+
 async function fetchVegFormapBatch(month: number, vegPercent: number) {
   // 若你的 UI "veg" 是 0~100，保留這行；若已是 0~1，改成 const veg01 = vegPercent;
   const veg01 = Math.max(0, Math.min(1, (typeof (vegPercent as any) === 'number' ? vegPercent : 0) / 100));
@@ -76,22 +104,16 @@ async function fetchVegFormapBatch(month: number, vegPercent: number) {
   const cached = vegGridCacheRef.current.get(cacheKey);
   if (cached) return cached;
 
+  // 一次取回該月份所有覆蓋率，之後拖動滑桿直接查快取
   const base = getBases()[0];
-  const url = VEG_FORMAP_URL(base, month, veg01); // ← 這裡自動套新路徑
-  const payload = await fetchJSON<Record<string, Record<string, number | null>>>(url);
-
-  const map = new Map<string, number>();
-  for (const cStr in payload) {
-    const rows = payload[cStr] || {};
-    for (const rStr in rows) {
-      const v = rows[rStr];
-      const r = Number(rStr), c = Number(cStr);
-      if (Number.isFinite(r) && Number.isFinite(c) && typeof v === 'number') {
-        map.set(makeCellKey(r, c), v);
-      }
+  await loadBundle(`veg:${month}`, VEG_BUNDLE_URL(base, month), (bundle) => {
+    for (const frame of bundle.frames) {
+      const key = `${(frame.vegetation ?? 0).toFixed(2)}:${String(month).padStart(2, '0')}`;
+      vegGridCacheRef.current.set(key, bundleFrameToMap(bundle.cells, frame.values));
     }
-  }
-  vegGridCacheRef.current.set(cacheKey, map);
+  });
+  const map = vegGridCacheRef.current.get(cacheKey);
+  if (!map) throw new NoDataError();
   return map;
 }
 
@@ -101,6 +123,8 @@ const USE_PROXY = process.env.NEXT_PUBLIC_USE_PROXY === '1';
 const API_BASE = process.env.NEXT_PUBLIC_API_BASE_URL || 'http://127.0.0.1:5000';
 const getBases = () => (USE_PROXY ? ['/api'] : [API_BASE]);
 const to01 = (percent: number) => Math.max(0, Math.min(100, percent)) / 100;
+// 區域類型著色所用的期間（與原本 area_types.csv 相同）
+const AREA_TYPES_PERIOD = { year: 2022, month: 7 };
 
 function getFeatureId(f: GridFeature) {
   const p = (f?.properties || {}) as any;
@@ -242,20 +266,34 @@ export default function MapSection() {
   const modeRef = useRef(mode);
   useEffect(() => { modeRef.current = mode; }, [mode]);
 
-  /* --- CSV 載入（和狀態都在元件內） --- */
+  /* --- 區域類型載入：優先使用後端分類 API，失敗時退回靜態 CSV --- */
   useEffect(() => {
     let aborted = false;
-    fetch('/data/area_types.csv')
-      .then(r => r.text())
-      .then(text => {
-        if (aborted) return;
-        const rows = parseAreaTypesCSV(text);
+    const applyTypes = (m: Map<string, string>) => {
+      if (aborted) return;
+      typeByCellRef.current = m;
+      if (enableAdvancedColor) applyLayerColorsRef.current();
+    };
+    const loadCSV = () =>
+      fetch('/data/area_types.csv')
+        .then(r => r.text())
+        .then(text => {
+          const m = new Map<string, string>();
+          for (const r of parseAreaTypesCSV(text)) m.set(`${r.row_id}-${r.column_id}`, r.type);
+          applyTypes(m);
+        });
+
+    // 後端格式：{ [column_id]: { [row_id]: "City" | "Coast" | ... } }
+    fetchJSON<Record<string, Record<string, string>>>(`${getBases()[0]}/climate_class/formap/${AREA_TYPES_PERIOD.year}/${AREA_TYPES_PERIOD.month}`)
+      .then(payload => {
         const m = new Map<string, string>();
-        for (const r of rows) m.set(`${r.row_id}-${r.column_id}`, r.type);
-        typeByCellRef.current = m;
-        if (enableAdvancedColor) applyLayerColorsRef.current();
+        for (const cStr in payload) {
+          const rows = payload[cStr] || {};
+          for (const rStr in rows) m.set(`${Number(rStr)}-${Number(cStr)}`, rows[rStr]);
+        }
+        applyTypes(m);
       })
-      .catch(() => { });
+      .catch(() => loadCSV().catch(() => { }));
     return () => { aborted = true; };
   }, [enableAdvancedColor]);
 
@@ -544,23 +582,15 @@ export default function MapSection() {
     const cached = timeGridCacheRef.current.get(cacheKey);
     if (cached) return cached;
 
+    // 一次取回整年 12 個月，切換月份時不再逐月請求
     const base = getBases()[0];
-    const url = `${base}/formap/Temperature/${y}/${pad2(m)}`;
-    // 後端回傳格式：{ [column_id]: { [row_id]: value } }
-    const payload = await fetchJSON<Record<string, Record<string, number | null>>>(url);
-
-    const map = new Map<CellKey, number>();
-    for (const cStr in payload) {
-      const rows = payload[cStr] || {};
-      for (const rStr in rows) {
-        const v = rows[rStr];
-        const r = Number(rStr), c = Number(cStr);
-        if (Number.isFinite(r) && Number.isFinite(c) && typeof v === 'number') {
-          map.set(makeCellKey(r, c), v);
-        }
+    await loadBundle(`time:${which}:${y}`, TIME_BUNDLE_URL(base, y), (bundle) => {
+      for (const frame of bundle.frames) {
+        timeGridCacheRef.current.set(`${which}:${y}:${frame.month}`, bundleFrameToMap(bundle.cells, frame.values));
       }
-    }
-    timeGridCacheRef.current.set(cacheKey, map);
+    });
+    const map = timeGridCacheRef.current.get(cacheKey);
+    if (!map) throw new NoDataError();
     return map;
   }
 